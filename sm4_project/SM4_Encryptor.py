@@ -6,16 +6,138 @@ CTR模式的优点：
 - 无需填充，数据长度不变
 - 加解密操作相同
 - 支持并行处理和随机访问（本实现是无状态的）
+
+后端（见 sm4_backends）：
+- openssl: cryptography/OpenSSL 的 sm4-ctr
+- numpy: 批量向量化引擎（sm4_vectorized）
+- python: 纯Python查表实现（sm4_core），作为兜底
+- gmssl: gmssl 逐块实现
+默认使用环境变量 SM4_BACKEND 指定的后端，否则自动选最快的可用后端；
+每个后端首次使用前都要通过已知答案自检。后端依赖（cryptography、NumPy、gmssl）
+和自检都推迟到第一次创建加密器时，导入本模块本身很快（短命令行和进程池子进程
+都受益）；DEFAULT_BACKEND 同样在第一次访问时才确定。
+
+并行：workers > 1 时，大于 parallel_threshold 的数据按计数器对齐切段，
+释放GIL的后端（numpy）用线程池，其余用进程池。
+
+低内存：传入 scratch_size 后CTR变换经由固定大小的暂存区分段进行（每个线程一块，
+同一线程的加密器共用），临时内存与数据长度无关，适合树莓派这类内存紧张的发送端；
+配合原地的 encrypt_into 或复用输出缓冲区的 encrypt_view，逐帧加密不再按帧长分配内存。
+
+统计：传入 stats=CipherStats()（见 sm4_stats）后记录各操作的调用次数、字节数、
+耗时分布和分阶段耗时；不传时热路径上只多一次 `is None` 判断。
 """
-from gmssl import sm4
-from typing import Union
+import functools
 import struct
+import threading
+import time
+
+import sm4_backends
+import sm4_core
+from sm4_ctrutil import counter_add
+from sm4_prefetch import PrefetchCTRContext
+from sm4_stats import record_call
+
+# 已注册的后端（按速度从快到慢）；默认后端 DEFAULT_BACKEND 见 __getattr__
+BACKENDS = sm4_backends.backend_names()
+
+# 并行模式下小于该长度的数据仍串行处理，避免小帧承担线程池/进程池的调度开销
+PARALLEL_THRESHOLD = 1024 * 1024
+
+# encrypt_stream 处理文件对象时每次读取的块大小（也是单次产出的上限）
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# 轮密钥缓存容量（按密钥字节缓存，超出后淘汰最久未使用的）
+KEY_CACHE_SIZE = 64
+
+_pools = {}
+_pools_lock = threading.Lock()
+_scratch = threading.local()
+
+
+def __getattr__(name: str):
+    # 确定默认后端要加载并自检后端，推迟到第一次访问 DEFAULT_BACKEND
+    if name == 'DEFAULT_BACKEND':
+        return sm4_backends.default_backend_name()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _get_pool(kind: str, workers: int):
+    """按 (类型, 并发数) 复用全局线程池/进程池"""
+    with _pools_lock:
+        pool = _pools.get((kind, workers))
+        if pool is None:
+            # concurrent.futures（尤其是进程池带的 multiprocessing）导入较慢，用到时才导入
+            if kind == 'thread':
+                from concurrent.futures import ThreadPoolExecutor as executor
+            else:
+                from concurrent.futures import ProcessPoolExecutor as executor
+            pool = _pools[(kind, workers)] = executor(max_workers=workers)
+        return pool
+
+
+def _get_scratch(size: int) -> memoryview:
+    """本线程复用的低内存暂存区（size+16 字节，见 CipherBackend.ctr_into）"""
+    buffers = getattr(_scratch, 'buffers', None)
+    if buffers is None:
+        buffers = _scratch.buffers = {}
+    buf = buffers.get(size)
+    if buf is None:
+        buf = buffers[size] = memoryview(bytearray(size + 16))
+    return buf
+
+
+@functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+def expand_key(key: bytes) -> tuple:
+    """
+    计算32个加密轮密钥（带LRU缓存，同一密钥只扩展一次）
+
+    Args:
+        key: 16字节密钥
+
+    Returns:
+        32个轮密钥组成的元组
+    """
+    return sm4_core.expand_key(key)
+
+
+def key_cache_info():
+    """
+    轮密钥缓存的统计信息，用于评估 KEY_CACHE_SIZE 是否合适
+
+    Returns:
+        (hits, misses, maxsize, currsize) 命名元组
+    """
+    return expand_key.cache_info()
+
+
+def clear_key_cache():
+    """清空轮密钥缓存及其统计"""
+    expand_key.cache_clear()
+
+
+def _ctr_segment(key: bytes, iv: bytes, backend: str, counter: int, data: bytes) -> bytes:
+    """进程池任务：在子进程中处理一个按块对齐的分段"""
+    return SM4Encryptor(key, iv, backend)._ctr_serial(counter, data)
+
+
+def _byte_views(src, dst):
+    """把 src/dst 转成一维字节 memoryview，并检查 dst 可写且足够长"""
+    src = memoryview(src).cast('B')
+    dst = memoryview(dst).cast('B')
+    if dst.readonly:
+        raise ValueError("输出缓冲区是只读的")
+    if len(dst) < len(src):
+        raise ValueError(f"输出缓冲区太小: 需要 {len(src)} 字节，只有 {len(dst)} 字节")
+    return src, dst
 
 
 class SM4Encryptor:
     """SM4加密器 - 仅支持CTR模式"""
 
-    def __init__(self, key: bytes, iv: bytes):
+    def __init__(self, key: bytes, iv: bytes, backend: str = None,
+                 workers: int = 1, parallel_threshold: int = PARALLEL_THRESHOLD,
+                 stats=None, scratch_size: int = None):
         """
         初始化SM4加密器（CTR模式）
 
@@ -23,9 +145,15 @@ class SM4Encryptor:
             key: 16字节密钥（128位）
             iv: 16字节初始化向量（Nonce）
                  - 建议每次加密使用不同的IV
+            backend: 'openssl'/'numpy'/'python'/'gmssl'，默认自动选择（见 DEFAULT_BACKEND）
+            workers: 并行处理的线程/进程数，1表示串行
+            parallel_threshold: 数据长度达到该值才启用并行
+            stats: sm4_stats.CipherStats，给出时记录统计（也可之后设置 self.stats）
+            scratch_size: 低内存模式的暂存区大小（16的正整数倍），None 表示关闭；
+                开启后不再并行，CTR变换按该大小分段进行
 
         Raises:
-            ValueError: 密钥或IV长度不正确
+            ValueError: 密钥或IV长度不正确，scratch_size 不合法，或后端不可用
         """
 
         if len(key) != 16:
@@ -34,9 +162,30 @@ class SM4Encryptor:
         if len(iv) != 16:
             raise ValueError(f"IV必须是16字节，但提供了 {len(iv)} 字节")
 
+        if backend is None:
+            backend = sm4_backends.default_backend_name()
+        self._backend = sm4_backends.get_backend(backend)
+
+        if workers < 1:
+            raise ValueError(f"workers必须大于等于1，但提供了 {workers}")
+
+        if scratch_size is not None and (scratch_size <= 0 or scratch_size % 16):
+            raise ValueError(f"scratch_size必须是16的正整数倍，但提供了 {scratch_size}")
+
         self.key = key
         self.iv = iv
-        self.cipher = sm4.CryptSM4()
+        self.backend = backend
+        self.workers = workers
+        self.parallel_threshold = parallel_threshold
+        self.stats = stats
+        self.scratch_size = scratch_size
+        self._out = threading.local()   # encrypt_view 的输出缓冲区（每个线程一个）
+        # 轮密钥只在构造时取一次（命中缓存时几乎零开销），之后每次加密直接复用
+        start = time.perf_counter_ns()
+        self._round_keys = expand_key(bytes(key))
+        self._state = self._backend.prepare(key, self._round_keys)
+        if stats is not None:
+            stats.add_stage('key_setup', time.perf_counter_ns() - start)
 
     def _ctr_encrypt_decrypt(self, data: bytes) -> bytes:
         """
@@ -54,33 +203,78 @@ class SM4Encryptor:
             密文或明文
         """
         # 将IV转换为计数器（大端序整数）
-        counter = int.from_bytes(self.iv, byteorder='big')
-
-        result = bytearray()
-        # 注意：CTR模式总是使用ENCRYPT模式的ECB来生成密钥流
-        self.cipher.set_key(self.key, sm4.SM4_ENCRYPT)
-
-        # 分块处理（每块16字节）
-        for i in range(0, len(data), 16):
-            # 获取当前块
-            block = data[i:i+16]
-
-            # 生成计数器块（16字节）
-            counter_block = counter.to_bytes(16, byteorder='big')
-
-            # 加密计数器块得到密钥流
-            keystream = self.cipher.crypt_ecb(counter_block)
-
-            # 密钥流与数据块XOR
-            # zip会停在较短的那个操作数上
-            # (如果最后一块数据不足16字节)
-            encrypted_block = bytes(a ^ b for a, b in zip(block, keystream))
-            result.extend(encrypted_block)
-
-            # 计数器递增
-            counter = (counter + 1) & ((1 << 128) - 1) # 防止溢出
-
-        return bytes(result)
+        return self._ctr_at(int.from_bytes(self.iv, byteorder='big'), data)
+
+    def _ctr_at(self, counter: int, data: bytes) -> bytes:
+        """从指定的计数器值开始做CTR变换（data按块对齐）"""
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter_ns()
+        if self.scratch_size is not None:
+            out = bytearray(len(data))
+            self._ctr_low_memory(counter, memoryview(data).cast('B'), memoryview(out))
+            result = bytes(out)
+        elif self.workers > 1 and len(data) >= self.parallel_threshold:
+            out = bytearray(len(data))
+            self._ctr_parallel(counter, memoryview(data).cast('B'), memoryview(out))
+            result = bytes(out)
+        else:
+            result = self._ctr_serial(counter, data)
+        if stats is not None:
+            stats.add_keystream(len(data), time.perf_counter_ns() - start)
+        return result
+
+    def _ctr_into(self, counter: int, src: memoryview, dst: memoryview):
+        """从指定的计数器值开始做CTR变换，结果写入 dst（可与 src 相同）"""
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter_ns()
+        if self.scratch_size is not None:
+            self._ctr_low_memory(counter, src, dst)
+        elif self.workers > 1 and len(src) >= self.parallel_threshold:
+            self._ctr_parallel(counter, src, dst)
+        else:
+            self._backend.ctr_xor(self._state, counter, src, dst)
+        if stats is not None:
+            stats.add_keystream(len(src), time.perf_counter_ns() - start)
+
+    def _ctr_low_memory(self, counter: int, src: memoryview, dst: memoryview):
+        """低内存模式：经由本线程的固定暂存区分段做CTR变换"""
+        self._backend.ctr_into(self._state, counter, src, dst, _get_scratch(self.scratch_size))
+
+    def _ctr_serial(self, counter: int, data: bytes) -> bytes:
+        """单线程CTR变换"""
+        return self._backend.ctr_xor(self._state, counter, data)
+
+    def _ctr_parallel(self, counter: int, src: memoryview, dst: memoryview):
+        """
+        并行CTR变换：按16字节对齐切成 workers 段，各段计数器为
+        counter + 段起点//16，结果写入预先分配的输出缓冲区 dst
+        """
+        n = len(src)
+        seg = -(-n // (self.workers * 16)) * 16
+
+        if self._backend.releases_gil:
+            # 各线程直接写入输出缓冲区的对应区间
+            pool = _get_pool('thread', self.workers)
+            futures = [
+                pool.submit(self._backend.ctr_xor, self._state,
+                            counter_add(counter, start // 16),
+                            src[start:start + seg], dst[start:start + seg])
+                for start in range(0, n, seg)
+            ]
+            for future in futures:
+                future.result()
+        else:
+            pool = _get_pool('process', self.workers)
+            futures = [
+                (start, pool.submit(_ctr_segment, self.key, self.iv, self.backend,
+                                    counter_add(counter, start // 16),
+                                    bytes(src[start:start + seg])))
+                for start in range(0, n, seg)
+            ]
+            for start, future in futures:
+                dst[start:start + seg] = future.result()
 
     def encrypt(self, data: bytes) -> bytes:
         """
@@ -92,6 +286,8 @@ class SM4Encryptor:
         Returns:
             密文字节流
         """
+        if self.stats is not None:
+            return record_call(self.stats, 'encrypt', len(data), self._ctr_encrypt_decrypt, data)
         return self._ctr_encrypt_decrypt(data)
 
     def decrypt(self, data: bytes) -> bytes:
@@ -104,8 +300,141 @@ class SM4Encryptor:
         Returns:
             明文字节流
         """
+        if self.stats is not None:
+            return record_call(self.stats, 'decrypt', len(data), self._ctr_encrypt_decrypt, data)
         return self._ctr_encrypt_decrypt(data)
 
+    def encrypt_at(self, data: bytes, offset: int) -> bytes:
+        """
+        随机访问加密：把 data 当作整个数据流中从 offset 开始的一段
+
+        计数器直接取 IV + offset//16，块内余数部分的密钥流丢弃，
+        因此耗时只与 len(data) 有关，与 offset 大小无关。
+
+        Args:
+            data: 明文字节流
+            offset: data 在整个数据流中的起始字节偏移
+
+        Returns:
+            密文字节流，等于 encrypt(整个流)[offset:offset+len(data)]
+
+        Raises:
+            ValueError: offset 为负数
+        """
+        if self.stats is not None:
+            return record_call(self.stats, 'encrypt_at', len(data), self._encrypt_at, data, offset)
+        return self._encrypt_at(data, offset)
+
+    def _encrypt_at(self, data: bytes, offset: int) -> bytes:
+        if offset < 0:
+            raise ValueError(f"偏移量不能为负数: {offset}")
+        counter = counter_add(int.from_bytes(self.iv, byteorder='big'), offset // 16)
+        skip = offset % 16
+        if not skip:
+            return self._ctr_at(counter, data)
+        return self._ctr_at(counter, bytes(skip) + bytes(data))[skip:]
+
+    def decrypt_at(self, data: bytes, offset: int) -> bytes:
+        """
+        随机访问解密：从大文件中间取出的一段密文直接解密
+
+        Args:
+            data: 密文字节流
+            offset: data 在整个密文中的起始字节偏移
+
+        Returns:
+            明文字节流
+        """
+        return self.encrypt_at(data, offset)
+
+    def encrypt_into(self, src, dst, offset: int = 0) -> int:
+        """
+        零拷贝加密：结果直接写入调用方提供的缓冲区
+
+        src/dst 可以是任何支持缓冲区协议的对象（bytes、bytearray、
+        memoryview、numpy数组、mmap等），dst 可以就是 src 本身（原地加密）。
+
+        Args:
+            src: 明文缓冲区
+            dst: 可写的输出缓冲区，长度不小于 src
+            offset: src 在整个数据流中的起始字节偏移（同 encrypt_at）
+
+        Returns:
+            写入的字节数
+
+        Raises:
+            ValueError: dst 太短或只读，或 offset 为负数
+        """
+        if self.stats is not None:
+            return record_call(self.stats, 'encrypt_into', memoryview(src).nbytes,
+                                self._encrypt_into, src, dst, offset)
+        return self._encrypt_into(src, dst, offset)
+
+    def _encrypt_into(self, src, dst, offset: int = 0) -> int:
+        src, dst = _byte_views(src, dst)
+        n = len(src)
+        if offset < 0:
+            raise ValueError(f"偏移量不能为负数: {offset}")
+
+        counter = counter_add(int.from_bytes(self.iv, byteorder='big'), offset // 16)
+        skip = offset % 16
+        done = 0
+        if skip and n:
+            # 先处理偏移落在块中间的那一小段，之后就是块对齐的
+            done = min(16 - skip, n)
+            dst[:done] = self._encrypt_at(src[:done], offset)
+            counter = counter_add(counter, 1)
+        if done < n:
+            self._ctr_into(counter, src[done:], dst[done:n])
+        return n
+
+    def decrypt_into(self, src, dst, offset: int = 0) -> int:
+        """
+        零拷贝解密：结果直接写入调用方提供的缓冲区
+
+        Args:
+            src: 密文缓冲区
+            dst: 可写的输出缓冲区，可与 src 相同
+            offset: src 在整个密文中的起始字节偏移
+
+        Returns:
+            写入的字节数
+        """
+        return self.encrypt_into(src, dst, offset)
+
+    def encrypt_view(self, data, offset: int = 0) -> memoryview:
+        """
+        加密数据，结果写入加密器复用的输出缓冲区（每个线程一个）
+
+        缓冲区只在遇到更长的数据时重新分配，逐帧加密只读的帧（如 bytes）时
+        不再为每一帧分配输出。
+
+        Args:
+            data: 明文缓冲区
+            offset: data 在整个数据流中的起始字节偏移（同 encrypt_at）
+
+        Returns:
+            指向密文的 memoryview，在本线程下一次 encrypt_view/decrypt_view 之前有效
+
+        Raises:
+            ValueError: offset 为负数
+        """
+        n = memoryview(data).nbytes
+        buf = getattr(self._out, 'buffer', None)
+        if buf is None or len(buf) < n:
+            buf = self._out.buffer = bytearray(n)
+        self.encrypt_into(data, buf, offset)
+        return memoryview(buf)[:n]
+
+    def decrypt_view(self, data, offset: int = 0) -> memoryview:
+        """
+        解密数据，结果写入复用的输出缓冲区（同 encrypt_view）
+
+        Returns:
+            指向明文的 memoryview，在本线程下一次 encrypt_view/decrypt_view 之前有效
+        """
+        return self.encrypt_view(data, offset)
+
     def encrypt_string(self, text: str, encoding: str = 'utf-8') -> bytes:
         """
         加密字符串（便捷方法）
@@ -132,10 +461,196 @@ class SM4Encryptor:
         """
         return self.decrypt(data).decode(encoding)
 
+    def encrypt_stream(self, source, chunk_size: int = STREAM_CHUNK_SIZE, offset: int = 0):
+        """
+        生成器：边读边加密，内存占用只与 chunk_size 有关
+
+        计数器在各块之间持续递增（基于流式上下文），输出拼起来等于
+        encrypt(整个输入)，适合接 socket、子进程管道、摄像头帧生成器等。
+
+        Args:
+            source: 文件对象（有 readinto 或 read），或产出字节块的可迭代对象
+            chunk_size: 文件对象每次读取的字节数；可迭代对象的大块也按它切开
+            offset: 输入在整个数据流中的起始字节偏移
+
+        Yields:
+            密文块（bytes），每块不超过 chunk_size
+
+        Raises:
+            ValueError: chunk_size 不是正数
+        """
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size必须大于0，但提供了 {chunk_size}")
+        ctx = self.stream_context(offset)
+        if hasattr(source, 'readinto'):
+            buf = bytearray(chunk_size)
+            view = memoryview(buf)
+            while True:
+                n = source.readinto(view)
+                if not n:
+                    break
+                ctx.update_into(view[:n], view[:n])
+                yield bytes(view[:n])
+        elif hasattr(source, 'read'):
+            while True:
+                data = source.read(chunk_size)
+                if not data:
+                    break
+                yield ctx.update(data)
+        else:
+            for data in source:
+                data = memoryview(data).cast('B')
+                for i in range(0, len(data), chunk_size):
+                    yield ctx.update(data[i:i + chunk_size])
+
+    def decrypt_stream(self, source, chunk_size: int = STREAM_CHUNK_SIZE, offset: int = 0):
+        """
+        生成器：边读边解密（同 encrypt_stream）
+
+        Yields:
+            明文块（bytes）
+        """
+        return self.encrypt_stream(source, chunk_size, offset)
+
+    def stream_context(self, offset: int = 0, prefetch: int = 0):
+        """
+        创建流式加解密上下文（计数器从IV开始）
+
+        与 encrypt() 不同，上下文会在多次调用之间保持计数器，
+        适合把一个长数据流（如摄像头视频）分块加密。
+
+        Args:
+            offset: 从数据流的哪个字节偏移开始（默认从头开始）
+            prefetch: 密钥流预取池大小（字节），大于0时由后台线程提前
+                      生成密钥流，update 只需做XOR（见 sm4_prefetch）
+
+        Returns:
+            SM4CTRContext 实例；prefetch > 0 时为 PrefetchCTRContext
+        """
+        if prefetch:
+            return PrefetchCTRContext(self, prefetch, offset)
+        return SM4CTRContext(self, offset)
+
+
+class SM4CTRContext:
+    """
+    CTR流式上下文 - update()/finalize() 风格
+
+    在多次 update() 之间保持128位计数器和上一块未用完的密钥流，
+    因此任意切分的数据块加密结果与整段一次性加密完全相同，
+    块边界处也不会重复生成或浪费密钥流。
+    """
+
+    def __init__(self, encryptor: SM4Encryptor, offset: int = 0):
+        """
+        Args:
+            encryptor: 提供密钥、IV和后端的 SM4Encryptor
+            offset: 起始字节偏移
+        """
+        self._encryptor = encryptor
+        self._finalized = False
+        self.seek(offset)
+
+    def seek(self, offset: int):
+        """
+        跳到数据流的指定字节偏移，之后的 update 从该位置继续
+
+        Args:
+            offset: 字节偏移
+
+        Raises:
+            ValueError: offset 为负数
+        """
+        if offset < 0:
+            raise ValueError(f"偏移量不能为负数: {offset}")
+        iv = int.from_bytes(self._encryptor.iv, byteorder='big')
+        self._counter = counter_add(iv, offset // 16)
+        self._leftover = b''      # 上一次剩下的密钥流字节（不足一块）
+        self.position = offset    # 当前在数据流中的字节偏移
+        skip = offset % 16
+        if skip:
+            self._leftover = self._encryptor._ctr_at(self._counter, bytes(16))[skip:]
+            self._counter = counter_add(self._counter, 1)
+
+    def update(self, data: bytes) -> bytes:
+        """
+        加密/解密下一段数据
+
+        Args:
+            data: 任意长度的明文或密文
+
+        Returns:
+            等长的密文或明文
+
+        Raises:
+            ValueError: 上下文已经 finalize
+        """
+        out = bytearray(len(data))
+        self.update_into(data, out)
+        return bytes(out)
+
+    def update_into(self, src, dst) -> int:
+        """
+        零拷贝版本的 update：结果写入 dst（可与 src 相同，即原地处理）
+
+        Args:
+            src: 明文或密文缓冲区
+            dst: 可写的输出缓冲区，长度不小于 src
+
+        Returns:
+            写入的字节数
+
+        Raises:
+            ValueError: 上下文已经 finalize，或 dst 太短/只读
+        """
+        stats = self._encryptor.stats
+        if stats is not None:
+            return record_call(stats, 'update', memoryview(src).nbytes, self._update_into, src, dst)
+        return self._update_into(src, dst)
+
+    def _update_into(self, src, dst) -> int:
+        if self._finalized:
+            raise ValueError("流式上下文已结束，不能继续 update")
+        src, dst = _byte_views(src, dst)
+        n = len(src)
+        self.position += n
+
+        # 1. 先消耗上次剩下的密钥流
+        k = min(len(self._leftover), n)
+        if k:
+            dst[:k] = bytes(a ^ b for a, b in zip(src[:k], self._leftover))
+            self._leftover = self._leftover[k:]
+
+        # 2. 中间的整块直接批量处理
+        full = (n - k) // 16 * 16
+        if full:
+            self._encryptor._ctr_into(self._counter, src[k:k + full], dst[k:k + full])
+            self._counter = counter_add(self._counter, full // 16)
+
+        # 3. 末尾不足一块的部分，多出来的密钥流留给下一次
+        tail = n - k - full
+        if tail:
+            ks = self._encryptor._ctr_at(self._counter, bytes(16))
+            self._counter = counter_add(self._counter, 1)
+            dst[n - tail:n] = bytes(a ^ b for a, b in zip(src[n - tail:], ks))
+            self._leftover = ks[tail:]
+        return n
+
+    def finalize(self) -> bytes:
+        """
+        结束上下文。CTR模式没有填充，总是返回空字节串
+
+        Returns:
+            b''
+        """
+        self._finalized = True
+        self._leftover = b''
+        return b''
+
 
 # --- 便捷函数 ---
 
-def encrypt(data: bytes, key: bytes, iv: bytes) -> bytes:
+def encrypt(data: bytes, key: bytes, iv: bytes, workers: int = 1) -> bytes:
     """
     快捷加密函数（CTR模式）
 
@@ -143,17 +658,18 @@ def encrypt(data: bytes, key: bytes, iv: bytes) -> bytes:
         data: 明文字节流
         key: 16字节密钥
         iv: 初始化向量（16字节）
+        workers: 并行处理的线程/进程数，1表示串行
 
     Returns:
         密文字节流
     """
     if iv is None:
         raise ValueError("必须提供16字节的IV")
-    encryptor = SM4Encryptor(key, iv)
+    encryptor = SM4Encryptor(key, iv, workers=workers)
     return encryptor.encrypt(data)
 
 
-def decrypt(data: bytes, key: bytes, iv: bytes) -> bytes:
+def decrypt(data: bytes, key: bytes, iv: bytes, workers: int = 1) -> bytes:
     """
     快捷解密函数（CTR模式）
 
@@ -161,16 +677,43 @@ def decrypt(data: bytes, key: bytes, iv: bytes) -> bytes:
         data: 密文字节流
         key: 16字节密钥
         iv: 初始化向量（16字节）
+        workers: 并行处理的线程/进程数，1表示串行
 
     Returns:
         明文字节流
     """
     if iv is None:
         raise ValueError("必须提供16字节的IV")
-    encryptor = SM4Encryptor(key, iv)
+    encryptor = SM4Encryptor(key, iv, workers=workers)
     return encryptor.decrypt(data)
 
 
+def encrypt_stream(source, key: bytes, iv: bytes, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    快捷流式加密（生成器，见 SM4Encryptor.encrypt_stream）
+
+    Args:
+        source: 文件对象或产出字节块的可迭代对象
+        key: 16字节密钥
+        iv: 初始化向量（16字节）
+        chunk_size: 每块的字节数上限
+
+    Yields:
+        密文块
+    """
+    return SM4Encryptor(key, iv).encrypt_stream(source, chunk_size)
+
+
+def decrypt_stream(source, key: bytes, iv: bytes, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    快捷流式解密（生成器，见 SM4Encryptor.decrypt_stream）
+
+    Yields:
+        明文块
+    """
+    return SM4Encryptor(key, iv).decrypt_stream(source, chunk_size)
+
+
 if __name__ == "__main__":
     # 简单测试
     key = b"0123456789abcdef"
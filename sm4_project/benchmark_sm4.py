@@ -0,0 +1,401 @@
+"""
+SM4-CTR 性能基准
+
+覆盖的场景：
+-   ctr/<模式>/<后端>/<大小>: 消息从16B到1GB，模式为
+        single    一次性 encrypt
+        into      encrypt_into 原地加密
+        stream    流式上下文，按64KB分块 update_into
+        parallel  多核并行（workers = CPU核数）
+-   aead/<方案>/<大小>: 认证加密，SM4-GCM（单遍）对比 CTR + HMAC-SM3（两遍）
+-   fanout/<方式>/<后端>/<会话数>: 同一帧加密给多个会话，SessionManager 对比每会话一个加密器
+-   many/<方式>/<大小>: 大量带各自IV的小消息，encrypt_many 批量 对比 逐条 encrypt
+-   keysetup/*: 密钥扩展、冷/热缓存下构造 SM4Encryptor 的开销
+-   video/loopback: 视频demo管线（帧协议收发，50KB帧）在本机回环上的端到端帧率
+
+计时使用 time.perf_counter_ns，每项先预热再重复多次取中位数。
+单项预计耗时超过 --budget 秒时跳过更大的尺寸（慢后端不会跑1GB）。
+
+结果输出为JSON，可与之前的结果对比，吞吐下降超过阈值时返回非0：
+    python benchmark_sm4.py --json new.json
+    python benchmark_sm4.py --json new.json --baseline old.json --threshold 0.15
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import platform
+import socket
+import statistics
+import sys
+import threading
+import time
+
+import sm4_backends
+import SM4_Encryptor as sm4_module
+from SM4_Encryptor import SM4Encryptor
+
+KEY = b'0123456789abcdef'
+IV = b'fedcba9876543210'
+
+DEFAULT_SIZES = [16, 64, 1024, 16 * 1024, 64 * 1024, 1 << 20, 16 << 20, 256 << 20, 1 << 30]
+MODES = ('single', 'into', 'stream', 'parallel')
+STREAM_CHUNK = 64 * 1024
+VIDEO_FRAME_SIZE = 50 * 1024
+MIN_SAMPLE_NS = 10_000_000   # 每个样本至少计时10ms
+
+
+def format_size(n: int) -> str:
+    """1024 → '1KiB'"""
+    for unit in ('GiB', 'MiB', 'KiB'):
+        scale = {'GiB': 1 << 30, 'MiB': 1 << 20, 'KiB': 1 << 10}[unit]
+        if n >= scale and n % scale == 0:
+            return f"{n // scale}{unit}"
+    return f"{n}B"
+
+
+def measure(func, repeat: int = 5, warmup: int = 1) -> list:
+    """预热 warmup 次后计时 repeat 次，返回每次耗时（纳秒）"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        func()
+        samples.append(time.perf_counter_ns() - start)
+    return samples
+
+
+def _record(name: str, samples: list, nbytes: int = 0, items: int = 0, **extra) -> dict:
+    """把一组计时整理成结果条目"""
+    median = statistics.median(samples)
+    result = {
+        'name': name,
+        'median_ns': median,
+        'min_ns': min(samples),
+        'repeat': len(samples),
+    }
+    if nbytes:
+        result['bytes'] = nbytes
+        result['mb_per_s'] = nbytes / (1 << 20) / (median / 1e9)
+    if items:
+        result['ops_per_s'] = items / (median / 1e9)
+    result.update(extra)
+    return result
+
+
+def _ctr_case(mode: str, backend: str, data: bytearray):
+    """构造某个模式下加密一次 data 的函数"""
+    if mode == 'single':
+        encryptor = SM4Encryptor(KEY, IV, backend=backend)
+        return lambda: encryptor.encrypt(data)
+    if mode == 'into':
+        encryptor = SM4Encryptor(KEY, IV, backend=backend)
+        return lambda: encryptor.encrypt_into(data, data)
+    if mode == 'stream':
+        encryptor = SM4Encryptor(KEY, IV, backend=backend)
+        view = memoryview(data)
+
+        def run():
+            ctx = encryptor.stream_context()
+            for i in range(0, len(view), STREAM_CHUNK):
+                ctx.update_into(view[i:i + STREAM_CHUNK], view[i:i + STREAM_CHUNK])
+        return run
+    encryptor = SM4Encryptor(KEY, IV, backend=backend, workers=os.cpu_count() or 2,
+                             parallel_threshold=0)
+    return lambda: encryptor.encrypt(data)
+
+
+def bench_ctr(backends, modes, sizes, repeat: int, warmup: int, budget: float) -> list:
+    """各后端、各模式、各消息大小的CTR吞吐"""
+    results = []
+    for backend in backends:
+        for mode in modes:
+            if mode == 'parallel' and (os.cpu_count() or 1) < 2:
+                continue
+            throughput = None  # 上一个尺寸的实测吞吐，用来估计下一个尺寸的耗时
+            for size in sizes:
+                if mode == 'parallel' and size < 1 << 20:
+                    continue
+                if throughput and size / throughput * (repeat + warmup) > budget:
+                    print(f"  跳过 ctr/{mode}/{backend}/{format_size(size)}（预计超过 {budget} 秒）")
+                    break
+                data = bytearray(size)
+                case = _ctr_case(mode, backend, data)
+                # 小消息单次太快，合并多次调用凑够 MIN_SAMPLE_NS 再计时
+                once = measure(case, 1, 0)[0]
+                inner = max(1, min(10000, MIN_SAMPLE_NS // max(once, 1)))
+                func = case if inner == 1 else (lambda: [case() for _ in range(inner)])
+                samples = [s / inner for s in measure(func, repeat, warmup)]
+                r = _record(f"ctr/{mode}/{backend}/{format_size(size)}", samples, size,
+                            backend=backend, mode=mode, size=size)
+                throughput = size / (r['median_ns'] / 1e9)
+                print(f"  {r['name']:<36} {r['mb_per_s']:10.2f} MB/s")
+                results.append(r)
+    return results
+
+
+def hmac_sm3(key: bytes, data) -> bytes:
+    """HMAC-SM3：OpenSSL 带 SM3 时用 hashlib，否则用 gmssl 的纯Python SM3"""
+    if 'sm3' in hashlib.algorithms_available:
+        return hmac.new(key, data, 'sm3').digest()
+    from gmssl import sm3, func
+
+    def h(msg):
+        return bytes.fromhex(sm3.sm3_hash(func.bytes_to_list(msg)))
+    key = key.ljust(64, b'\0')
+    inner = h(bytes(k ^ 0x36 for k in key) + bytes(data))
+    return h(bytes(k ^ 0x5c for k in key) + inner)
+
+
+def _aead_case(scheme: str, backend: str, data: bytearray):
+    """构造某个认证加密方案加密一次 data 并算出标签的函数"""
+    if scheme == 'sm4-gcm':
+        from sm4_gcm import SM4GCM
+        gcm = SM4GCM(KEY, backend)
+        nonce = IV[:12]
+
+        def run():
+            ctx = gcm.encryptor(nonce)
+            ctx.update_into(data, data)
+            return ctx.finalize()
+        return run
+    encryptor = SM4Encryptor(KEY, IV, backend=backend)
+    mac_key = IV * 2
+
+    def run():
+        encryptor.encrypt_into(data, data)
+        return hmac_sm3(mac_key, data)
+    return run
+
+
+def bench_aead(backend: str, sizes, repeat: int, warmup: int, budget: float) -> list:
+    """SM4-GCM 与 CTR + HMAC-SM3 的吞吐对比"""
+    results = []
+    for scheme in ('sm4-gcm', 'ctr+hmac-sm3'):
+        throughput = None
+        for size in sizes:
+            if throughput and size / throughput * (repeat + warmup) > budget:
+                print(f"  跳过 aead/{scheme}/{format_size(size)}（预计超过 {budget} 秒）")
+                break
+            case = _aead_case(scheme, backend, bytearray(size))
+            once = measure(case, 1, 0)[0]
+            inner = max(1, min(10000, MIN_SAMPLE_NS // max(once, 1)))
+            func = case if inner == 1 else (lambda: [case() for _ in range(inner)])
+            samples = [s / inner for s in measure(func, repeat, warmup)]
+            r = _record(f"aead/{scheme}/{format_size(size)}", samples, size,
+                        backend=backend, mode=scheme, size=size)
+            throughput = size / (r['median_ns'] / 1e9)
+            print(f"  {r['name']:<36} {r['mb_per_s']:10.2f} MB/s")
+            results.append(r)
+    return results
+
+
+def bench_fanout(backends, repeat: int, warmup: int, sessions=(1, 10, 50),
+                 frame_size: int = VIDEO_FRAME_SIZE) -> list:
+    """一帧分发给多个会话：SessionManager（共享密钥、numpy下跨会话批量）对比每会话一个流式上下文"""
+    from sm4_sessions import SessionManager
+    frame = os.urandom(frame_size)
+    results = []
+    for backend in backends:
+        for count in sessions:
+            specs = [(os.urandom(16), os.urandom(16)) for _ in range(count)]
+            manager = SessionManager(backend)
+            for i, (key, iv) in enumerate(specs):
+                manager.add(i, key, iv)
+            contexts = [SM4Encryptor(key, iv, backend=backend).stream_context() for key, iv in specs]
+            cases = {
+                'manager': lambda: manager.encrypt_frame(frame),
+                'encryptors': lambda: [ctx.update(frame) for ctx in contexts],
+            }
+            for way, case in cases.items():
+                samples = measure(case, repeat, warmup)
+                r = _record(f"fanout/{way}/{backend}/{count}", samples, frame_size * count, 1,
+                            backend=backend, mode=way, sessions=count)
+                r['fps'] = r.pop('ops_per_s')
+                print(f"  {r['name']:<36} {r['mb_per_s']:10.2f} MB/s  {r['fps']:8.1f} 帧/秒")
+                results.append(r)
+    return results
+
+
+def bench_many(repeat: int, warmup: int, sizes=(16, 64, 256), count: int = 2000) -> list:
+    """count 条带各自IV的小消息：sm4_batch.encrypt_many 对比逐条调用 encrypt"""
+    from sm4_batch import encrypt_many
+    results = []
+    for size in sizes:
+        items = [(os.urandom(16), os.urandom(size)) for _ in range(count)]
+        cases = {
+            'batch': lambda: encrypt_many(KEY, items),
+            'loop': lambda: [sm4_module.encrypt(data, KEY, iv) for iv, data in items],
+        }
+        for way, case in cases.items():
+            samples = measure(case, repeat, warmup)
+            r = _record(f"many/{way}/{format_size(size)}", samples, size * count, count,
+                        mode=way, size=size)
+            print(f"  {r['name']:<36} {r['ops_per_s']:12.0f} 条/秒")
+            results.append(r)
+    return results
+
+
+def bench_keysetup(repeat: int) -> list:
+    """密钥扩展和加密器构造的开销（每次操作的耗时）"""
+    import sm4_core
+    n = 200
+    keys = [i.to_bytes(16, 'big') for i in range(n)]
+    results = []
+
+    samples = [s / n for s in measure(lambda: [sm4_core.expand_key(k) for k in keys], repeat)]
+    results.append(_record('keysetup/expand_key', samples, items=1))
+
+    def cold():
+        sm4_module.clear_key_cache()
+        for k in keys:
+            SM4Encryptor(k, IV)
+    samples = [s / n for s in measure(cold, repeat)]
+    results.append(_record('keysetup/encryptor_cold', samples, items=1))
+
+    SM4Encryptor(KEY, IV)
+    samples = [s / n for s in measure(lambda: [SM4Encryptor(KEY, IV) for _ in range(n)], repeat)]
+    results.append(_record('keysetup/encryptor_warm', samples, items=1))
+
+    for r in results:
+        print(f"  {r['name']:<36} {r['median_ns'] / 1000:10.2f} µs/次")
+    return results
+
+
+def bench_video(repeat: int, warmup: int, frames: int = 300,
+                frame_size: int = VIDEO_FRAME_SIZE) -> dict:
+    """视频demo管线（FrameSender → TCP回环 → FrameReceiver）的端到端帧率，不限速；每个样本一条新连接"""
+    from sm4_framing import FrameSender, FrameReceiver
+
+    server = socket.create_server(('127.0.0.1', 0))
+    port = server.getsockname()[1]
+    payloads = [bytearray(os.urandom(frame_size)) for _ in range(8)]
+    received = []
+
+    def client():
+        with socket.create_connection(('127.0.0.1', port)) as s:
+            receiver = FrameReceiver(s, KEY)
+            count = 0
+            while receiver.recv() is not None:
+                count += 1
+            received.append(count)
+
+    def run():
+        thread = threading.Thread(target=client)
+        thread.start()
+        conn, _ = server.accept()
+        with conn:
+            sender = FrameSender(conn, SM4Encryptor(KEY, os.urandom(16)))
+            for i in range(frames):
+                sender.send(payloads[i % len(payloads)])
+            sender.close()
+        thread.join()
+
+    with server:
+        samples = measure(run, repeat, warmup)
+
+    r = _record('video/loopback', samples, frames * frame_size, frames,
+                frames=min(received[warmup:]), frame_size=frame_size)
+    r['fps'] = r.pop('ops_per_s')
+    print(f"  {r['name']:<36} {r['fps']:10.1f} 帧/秒  {r['mb_per_s']:.2f} MB/s")
+    return r
+
+
+def compare(results: list, baseline: list, threshold: float) -> list:
+    """
+    与基线对比吞吐
+
+    Returns:
+        吞吐下降超过 threshold（比例）的条目说明
+    """
+    old = {r['name']: r for r in baseline}
+    regressions = []
+    for r in results:
+        base = old.get(r['name'])
+        if base is None:
+            continue
+        # 有吞吐的比吞吐，没有的（如 keysetup）比耗时
+        if 'mb_per_s' in r and 'mb_per_s' in base:
+            ratio = r['mb_per_s'] / base['mb_per_s']
+        else:
+            ratio = base['median_ns'] / r['median_ns']
+        if ratio < 1 - threshold:
+            regressions.append(f"{r['name']}: 只有基线的 {ratio:.0%}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='SM4-CTR 性能基准')
+    parser.add_argument('--backends', default=','.join(sm4_backends.available_backends()),
+                        help='逗号分隔的后端，默认全部可用后端')
+    parser.add_argument('--modes', default=','.join(MODES), help='逗号分隔的模式')
+    parser.add_argument('--sizes', help='逗号分隔的消息大小（字节），默认16B到1GB')
+    parser.add_argument('--max-size', type=int, default=1 << 30, help='最大消息大小（字节）')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--budget', type=float, default=10.0, help='单项预计耗时上限（秒）')
+    parser.add_argument('--skip', default='', help='跳过的部分: ctr,aead,fanout,many,keysetup,video')
+    parser.add_argument('--json', help='把结果写入该JSON文件')
+    parser.add_argument('--baseline', help='对比的基线JSON文件')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='吞吐下降超过该比例视为退化（默认0.1）')
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(',')] if args.sizes else DEFAULT_SIZES
+    sizes = [s for s in sizes if s <= args.max_size]
+    skip = set(filter(None, args.skip.split(',')))
+
+    results = []
+    if 'ctr' not in skip:
+        print("== CTR 吞吐 ==")
+        results += bench_ctr(args.backends.split(','), args.modes.split(','), sizes,
+                             args.repeat, args.warmup, args.budget)
+    if 'aead' not in skip:
+        print("== 认证加密 ==")
+        results += bench_aead(args.backends.split(',')[0], sizes, args.repeat, args.warmup,
+                              args.budget)
+    if 'fanout' not in skip:
+        print("== 多会话分发 ==")
+        results += bench_fanout(args.backends.split(','), args.repeat, args.warmup)
+    if 'many' not in skip:
+        print("== 批量小消息 ==")
+        results += bench_many(args.repeat, args.warmup)
+    if 'keysetup' not in skip:
+        print("== 密钥设置 ==")
+        results += bench_keysetup(args.repeat)
+    if 'video' not in skip:
+        print("== 视频管线 ==")
+        results.append(bench_video(args.repeat, args.warmup))
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'default_backend': sm4_module.DEFAULT_BACKEND,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("性能退化：")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("与基线相比没有超过阈值的退化。")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
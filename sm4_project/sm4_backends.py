@@ -0,0 +1,311 @@
+"""
+SM4-CTR 后端注册表
+
+每个后端实现同一个CTR接口（从给定计数器开始生成密钥流并与数据XOR），
+SM4Encryptor 通过名字选用：
+
+    openssl  cryptography 包提供的 OpenSSL sm4-ctr（需 OpenSSL 编译时带 SM4）
+    numpy    批量向量化引擎（sm4_vectorized）
+    python   纯Python查表实现（sm4_core）
+    gmssl    gmssl 实现（最慢，保留作对照）
+
+不指定后端时，先看环境变量 SM4_BACKEND，否则按 priority（实测速度排序）
+选第一个可用的（只加载到找到为止，排在后面的后端不会被导入）。每个后端第一次被使用前都会跑一遍已知答案测试（含
+计数器低64位进位和128位回绕），没通过的后端不会被使用，
+保证快速路径不会悄悄算出错误的密文。
+
+可选的 encrypt_blocks（多块ECB）供 sm4_batch 一次算出许多条消息的密钥流，
+内置后端都实现了，同样经过自检。ctr_into 是低内存模式用的分段CTR变换
+（经由调用方提供的固定暂存区），默认实现按暂存区大小分段调用 ctr_xor。
+"""
+import os
+import threading
+
+import sm4_core
+from sm4_ctrutil import MASK128 as _MASK128, counter_add, counter_blocks, xor_bytes, xor_into
+
+# 通过环境变量指定默认后端，例如 SM4_BACKEND=python
+ENV_VAR = 'SM4_BACKEND'
+
+# 已知答案测试：(初始计数器, 长度, 全零数据的CTR输出)
+# 第一组即 GB/T 32907 的单块标准向量（以明文作计数器）
+_KAT_KEY = bytes.fromhex('0123456789abcdeffedcba9876543210')
+_KAT = (
+    (int.from_bytes(_KAT_KEY, 'big'), 16, '681edf34d206965e86b3e94f536e4246'),
+    ((1 << 64) - 2, 64,
+     '706b7d3d4d9129efc289ffa40adcd711632d9ea5dcd3779effe86ed84203be25'
+     '6e9790ed903d7fd29b20a3aaefa1a59701f24d152b21245f3d63b8ff4d54e22d'),
+    (_MASK128, 33,
+     '6811af7e097364e786fb45ce5d9a60f02677f46b09c122cc975533105bd4a22a4e'),
+)
+
+
+def _counters_for(counter: int, data) -> bytes:
+    """覆盖 data 所需的全部计数器块"""
+    return counter_blocks(counter, (memoryview(data).nbytes + 15) // 16)
+
+
+def _ecb_ctr_xor(keystream: bytes, data, out):
+    """密钥流与数据整段XOR（最后一块不足16字节时截断密钥流）"""
+    if out is None:
+        return xor_bytes(data, keystream)
+    xor_into(data, keystream, out)
+    return None
+
+
+class CipherBackend:
+    """CTR后端基类"""
+
+    name = None
+    priority = 0          # 自动选择时越大越优先（按实测速度排列）
+    releases_gil = False  # 为 True 时并行模式用线程池，否则用进程池
+
+    def load(self):
+        """导入依赖；不可用时抛出 ImportError"""
+
+    def prepare(self, key: bytes, round_keys: tuple):
+        """
+        返回该后端加密所需的密钥状态
+
+        Args:
+            key: 16字节密钥
+            round_keys: 32个加密轮密钥
+        """
+        return round_keys
+
+    def ctr_xor(self, state, counter: int, data, out=None):
+        """
+        从 counter 开始做CTR变换
+
+        Args:
+            state: prepare() 的返回值
+            counter: 初始计数器（128位整数）
+            data: 明文或密文（支持缓冲区协议的对象）
+            out: 可写缓冲区，给出时结果直接写入其中
+
+        Returns:
+            密文或明文；给出 out 时返回 None
+        """
+        raise NotImplementedError
+
+    def ctr_into(self, state, counter: int, src, dst, scratch):
+        """
+        低内存CTR变换：按暂存区大小分段处理，结果写入 dst（可与 src 相同）
+
+        每段的临时内存只与段长有关，与数据总长无关；暂存区由调用方复用。
+
+        Args:
+            state, counter: 同 ctr_xor
+            src: 明文或密文（字节 memoryview）
+            dst: 可写的字节 memoryview，至少 len(src) 字节
+            scratch: 可写的暂存区（字节 memoryview），长度为分段大小+16，分段大小是16的倍数
+        """
+        step = len(scratch) - 16
+        for start in range(0, len(src), step):
+            self.ctr_xor(state, counter_add(counter, start // 16),
+                         src[start:start + step], dst[start:start + step])
+
+    def encrypt_blocks(self, state, blocks) -> bytes:
+        """
+        多块ECB加密（可选，批量加密小消息时用来一次算出所有计数器块的密钥流）
+
+        Args:
+            state: prepare() 的返回值
+            blocks: 长度为16整数倍的数据（支持缓冲区协议的对象）
+
+        Returns:
+            等长的密文
+
+        Raises:
+            NotImplementedError: 后端不支持，调用方退回逐条 ctr_xor
+        """
+        raise NotImplementedError
+
+
+# OpenSSLBackend.ctr_xor 写入 out 时每个线程复用的暂存区大小
+OPENSSL_SCRATCH_SIZE = 64 * 1024
+_openssl_scratch = threading.local()
+
+
+class OpenSSLBackend(CipherBackend):
+    """cryptography / OpenSSL 的 sm4-ctr"""
+
+    name = 'openssl'
+    priority = 40
+
+    def load(self):
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        from cryptography.hazmat.backends import default_backend
+        if not hasattr(algorithms, 'SM4') or not default_backend().cipher_supported(
+                algorithms.SM4(_KAT_KEY), modes.CTR(bytes(16))):
+            raise ImportError("当前 OpenSSL 不支持 SM4")
+        self._cipher, self._sm4, self._ctr, self._ecb = Cipher, algorithms.SM4, modes.CTR, modes.ECB
+
+    def prepare(self, key: bytes, round_keys: tuple):
+        return self._sm4(bytes(key))
+
+    def ctr_xor(self, state, counter: int, data, out=None):
+        if out is None:
+            encryptor = self._cipher(state, self._ctr(counter.to_bytes(16, 'big'))).encryptor()
+            return encryptor.update(data)
+        # 写入 out 时走固定暂存区，不分配和整帧一样大的结果
+        scratch = getattr(_openssl_scratch, 'buf', None)
+        if scratch is None:
+            scratch = _openssl_scratch.buf = memoryview(bytearray(OPENSSL_SCRATCH_SIZE + 16))
+        self.ctr_into(state, counter, memoryview(data).cast('B'), memoryview(out).cast('B'), scratch)
+        return None
+
+    def ctr_into(self, state, counter: int, src, dst, scratch):
+        # update() 每次返回新的 bytes；update_into 写进暂存区，它要求输出比输入多留一个分组
+        encryptor = self._cipher(state, self._ctr(counter.to_bytes(16, 'big'))).encryptor()
+        step = len(scratch) - 16
+        for start in range(0, len(src), step):
+            n = encryptor.update_into(src[start:start + step], scratch)
+            dst[start:start + n] = scratch[:n]
+
+    def encrypt_blocks(self, state, blocks) -> bytes:
+        return self._cipher(state, self._ecb()).encryptor().update(blocks)
+
+
+class NumpyBackend(CipherBackend):
+    """NumPy 向量化批量引擎"""
+
+    name = 'numpy'
+    priority = 30
+    releases_gil = True   # 大数组运算时 NumPy 会释放GIL
+
+    def load(self):
+        import sm4_vectorized
+        self._engine = sm4_vectorized
+
+    def ctr_xor(self, state, counter: int, data, out=None):
+        return self._engine.ctr_xor(state, counter, data, out)
+
+    def encrypt_blocks(self, state, blocks) -> bytes:
+        return self._engine.encrypt_blocks(state, blocks)
+
+
+class PythonBackend(CipherBackend):
+    """纯Python查表实现"""
+
+    name = 'python'
+    priority = 20
+
+    def ctr_xor(self, state, counter: int, data, out=None):
+        return _ecb_ctr_xor(sm4_core.encrypt_blocks(state, _counters_for(counter, data)), data, out)
+
+    def encrypt_blocks(self, state, blocks) -> bytes:
+        return sm4_core.encrypt_blocks(state, bytes(blocks))
+
+
+class GmsslBackend(CipherBackend):
+    """gmssl 实现"""
+
+    name = 'gmssl'
+    priority = 10
+
+    def load(self):
+        from gmssl import sm4
+        self._sm4 = sm4
+
+    def prepare(self, key: bytes, round_keys: tuple):
+        cipher = self._sm4.CryptSM4()
+        cipher.sk = list(round_keys)   # 直接装入缓存的加密轮密钥，省去 set_key
+        return cipher
+
+    def ctr_xor(self, state, counter: int, data, out=None):
+        return _ecb_ctr_xor(self.encrypt_blocks(state, _counters_for(counter, data)), data, out)
+
+    def encrypt_blocks(self, state, blocks) -> bytes:
+        # crypt_ecb 会追加一个填充块，截掉
+        return bytes(state.crypt_ecb(bytes(blocks))[:len(blocks)])
+
+
+_registry = {}
+_status = {}    # 名字 -> None（可用）或不可用的原因
+_lock = threading.Lock()
+
+
+def register(backend: CipherBackend):
+    """注册一个后端（同名覆盖）"""
+    with _lock:
+        _registry[backend.name] = backend
+        _status.pop(backend.name, None)
+
+
+def backend_names() -> tuple:
+    """所有已注册后端的名字，按优先级从高到低"""
+    return tuple(sorted(_registry, key=lambda n: -_registry[n].priority))
+
+
+def self_test(backend: CipherBackend) -> bool:
+    """对后端跑已知答案测试，返回是否全部通过"""
+    rk = sm4_core.expand_key(_KAT_KEY)
+    state = backend.prepare(_KAT_KEY, rk)
+    for counter, length, expected in _KAT:
+        if backend.ctr_xor(state, counter, bytes(length)).hex() != expected:
+            return False
+        out = bytearray(length)
+        backend.ctr_xor(state, counter, bytes(length), out)
+        if out.hex() != expected:
+            return False
+        # 暂存区只够一块，强制 ctr_into 分段并跨过进位/回绕点
+        out = bytearray(length)
+        backend.ctr_into(state, counter, memoryview(bytes(length)), memoryview(out),
+                         memoryview(bytearray(32)))
+        if out.hex() != expected:
+            return False
+    # 第一组向量的计数器就是标准向量的明文，顺带检查可选的 encrypt_blocks
+    try:
+        block = backend.encrypt_blocks(state, _KAT_KEY)
+    except NotImplementedError:
+        return True
+    return block.hex() == _KAT[0][2]
+
+
+def _check(name: str):
+    """加载并自检后端（每个后端只做一次），返回不可用原因或 None"""
+    with _lock:
+        if name not in _status:
+            backend = _registry[name]
+            try:
+                backend.load()
+                _status[name] = None if self_test(backend) else "已知答案自检未通过"
+            except ImportError as e:
+                _status[name] = f"依赖不可用: {e}"
+        return _status[name]
+
+
+def available_backends() -> tuple:
+    """可用（依赖齐全且通过自检）的后端名字，按优先级从高到低"""
+    return tuple(name for name in backend_names() if _check(name) is None)
+
+
+def get_backend(name: str) -> CipherBackend:
+    """
+    按名字取后端
+
+    Raises:
+        ValueError: 未知后端，或依赖不可用/自检未通过
+    """
+    if name not in _registry:
+        raise ValueError(f"未知后端: {name}，可选: {', '.join(backend_names())}")
+    reason = _check(name)
+    if reason is not None:
+        raise ValueError(f"{name}后端不可用：{reason}")
+    return _registry[name]
+
+
+def default_backend_name() -> str:
+    """环境变量 SM4_BACKEND 指定的后端，否则为最快的可用后端"""
+    name = os.environ.get(ENV_VAR)
+    if name:
+        return name
+    for name in backend_names():
+        if _check(name) is None:
+            return name
+    raise ValueError("没有可用的后端")
+
+
+for _backend in (OpenSSLBackend(), NumpyBackend(), PythonBackend(), GmsslBackend()):
+    register(_backend)
@@ -0,0 +1,165 @@
+"""
+批量加密大量小消息（每条消息有自己的IV）
+
+遥测、控制消息通常只有一两块，逐条调用 encrypt() 时，创建加密器、准备后端
+密钥状态和大整数计数器运算的开销远大于真正的加密。encrypt_many 把这些开销摊掉：
+
+-   密钥只扩展、准备一次；
+-   所有消息的所有计数器块拼成一段连续数据，后端一次ECB加密（encrypt_blocks）
+    得到全部密钥流；
+-   所有消息拼接后整段XOR，再按长度切回各条消息。
+
+有 numpy 时计数器生成和XOR是向量化的，否则用纯Python（大整数XOR）。
+每批最多 BATCH_BLOCKS 块，限制中间数据的内存。
+后端没有实现 encrypt_blocks 时退回逐条 ctr_xor（仍共享密钥状态）。
+
+每条消息的结果与 encrypt(data, key, iv) 逐字节一致。
+"""
+from bisect import bisect_right
+from itertools import accumulate
+
+import sm4_backends
+from SM4_Encryptor import expand_key
+from sm4_ctrutil import counter_blocks, multi_counter_array, pack_counters
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 一批最多处理的块数（65536块 = 1MB 密钥流）
+BATCH_BLOCKS = 65536
+
+
+def _numpy_counters(ivs: bytes, nblocks: list):
+    """
+    每条消息从自己的IV开始生成计数器块，按消息顺序连成一段
+
+    Returns:
+        形状为 (总块数, 2) 的大端 uint64 数组（每行一个计数器块）
+    """
+    start = np.frombuffer(ivs, dtype='>u8').reshape(-1, 2).astype(np.uint64)
+    first = nblocks[0]
+    # 所有消息块数相同（最常见）时直接广播，不用 repeat
+    count = first if nblocks.count(first) == len(nblocks) else nblocks
+    return pack_counters(*multi_counter_array(start[:, 0], start[:, 1], count))
+
+
+def _numpy_xor(keystream: bytes, datas: list, lengths: list, nblocks: list) -> bytes:
+    """所有消息拼接后与密钥流整段XOR；消息不是整块时先去掉每条消息多出的密钥流"""
+    ks = np.frombuffer(keystream, dtype=np.uint8)
+    n = lengths[0]
+    if lengths.count(n) == len(lengths):
+        if n % 16:
+            ks = ks.reshape(len(lengths), -1)[:, :n].reshape(-1)
+    elif any(length % 16 for length in lengths):
+        counts = np.array(nblocks, dtype=np.int64) * 16
+        firsts = np.repeat(np.cumsum(counts) - counts, counts)
+        ks = ks[np.arange(ks.size) - firsts < np.repeat(lengths, counts)]
+    data = np.frombuffer(b''.join(datas), dtype=np.uint8)
+    return np.bitwise_xor(data, ks).tobytes()
+
+
+def _python_counters(ivs: bytes, nblocks: list) -> bytes:
+    return b''.join([counter_blocks(int.from_bytes(ivs[i * 16:i * 16 + 16], 'big'), count)
+                     for i, count in enumerate(nblocks)])
+
+
+def _python_xor(keystream: bytes, datas: list, lengths: list, nblocks: list) -> bytes:
+    out = []
+    pos = 0
+    for data, n, count in zip(datas, lengths, nblocks):
+        ks = keystream[pos:pos + n]
+        out.append((int.from_bytes(data, 'big') ^ int.from_bytes(ks, 'big')).to_bytes(n, 'big'))
+        pos += count * 16
+    return b''.join(out)
+
+
+if np is not None:
+    _counters, _xor = _numpy_counters, _numpy_xor
+else:
+    _counters, _xor = _python_counters, _python_xor
+
+
+def _encrypt_batch(backend, state, ivs: bytes, datas: list, lengths: list, nblocks: list) -> list:
+    """一批消息：一次ECB算出所有密钥流，整段XOR后按长度切开"""
+    if not any(nblocks):
+        return [b''] * len(datas)
+    counters = _counters(ivs, nblocks)
+    keystream = backend.encrypt_blocks(state, memoryview(counters).cast('B'))
+    out = _xor(keystream, datas, lengths, nblocks)
+    n = lengths[0]
+    if lengths.count(n) == len(lengths):
+        return [out[i:i + n] for i in range(0, len(out), n)]
+    return [out[a - b:a] for a, b in zip(accumulate(lengths), lengths)]
+
+
+def _batches(lengths: list, nblocks: list):
+    """按累计块数切批，每批不超过 BATCH_BLOCKS 块（单条超长消息独占一批），产出 (起, 止)"""
+    count = len(lengths)
+    if lengths.count(lengths[0]) == count:
+        step = max(1, BATCH_BLOCKS // max(nblocks[0], 1))
+        for begin in range(0, count, step):
+            yield begin, min(begin + step, count)
+        return
+    ends = list(accumulate(nblocks))
+    begin = 0
+    while begin < count:
+        base = ends[begin - 1] if begin else 0
+        end = max(bisect_right(ends, base + BATCH_BLOCKS), begin + 1)
+        yield begin, end
+        begin = end
+
+
+def encrypt_many(key: bytes, items, backend: str = None) -> list:
+    """
+    批量加密多条消息，每条消息用自己的IV
+
+    Args:
+        key: 16字节密钥（所有消息共用）
+        items: [(iv, data), ...]，iv 为16字节，data 为 bytes/bytearray
+        backend: 同 SM4Encryptor，默认自动选择
+
+    Returns:
+        与 items 顺序一致的密文列表，第 i 条等于 encrypt(data_i, key, iv_i)
+
+    Raises:
+        ValueError: 密钥或某条消息的IV长度不正确，或后端不可用
+    """
+    if len(key) != 16:
+        raise ValueError(f"SM4密钥必须是16字节(128位)，但提供了 {len(key)} 字节")
+    items = list(items)
+    # 逐条检查：只比总长度时，15字节和17字节的IV会凑成32字节蒙混过关
+    for i, (iv, _) in enumerate(items):
+        if len(iv) != 16:
+            raise ValueError(f"第 {i} 条消息的IV必须是16字节，但提供了 {len(iv)} 字节")
+    ivs = b''.join([item[0] for item in items])
+    datas = [item[1] for item in items]
+    if not datas:
+        return []
+    impl = sm4_backends.get_backend(backend or sm4_backends.default_backend_name())
+    rk = expand_key(bytes(key))
+    state = impl.prepare(key, rk)
+    if type(impl).encrypt_blocks is sm4_backends.CipherBackend.encrypt_blocks:
+        return [impl.ctr_xor(state, int.from_bytes(iv, 'big'), data) for iv, data in items]
+
+    lengths = list(map(len, datas))
+    if lengths.count(lengths[0]) == len(lengths):
+        nblocks = [(lengths[0] + 15) // 16] * len(lengths)
+    else:
+        nblocks = [(n + 15) // 16 for n in lengths]
+    results = []
+    for begin, end in _batches(lengths, nblocks):
+        results += _encrypt_batch(impl, state, ivs[begin * 16:end * 16], datas[begin:end],
+                                  lengths[begin:end], nblocks[begin:end])
+    return results
+
+
+def decrypt_many(key: bytes, items, backend: str = None) -> list:
+    """
+    批量解密（CTR模式加解密相同），参数同 encrypt_many
+
+    Returns:
+        与 items 顺序一致的明文列表
+    """
+    return encrypt_many(key, items, backend)
@@ -0,0 +1,284 @@
+"""
+SM4-CTR 加密容器文件格式
+
+以前录下来的加密数据只是裸密文，离开原会话就不知道IV、分块和帧的位置。
+容器文件把这些信息和密文放在一起（整数均为大端序）：
+
+    文件头（HEADER，32字节）
+        magic       4字节   b'SM4C'
+        version     1字节   格式版本（当前为1）
+        flags       1字节   保留，置0
+        reserved    2字节   保留，置0
+        chunk_size  4字节   分块大小（16的倍数）
+        iv          16字节  CTR流的IV（密钥不写入文件）
+        reserved    4字节   保留，置0
+    密文
+        整个文件是一条从IV开始的CTR流，流偏移 = 文件偏移 - 文件头长度
+    索引
+        每个分块（CHUNK_ENTRY，28字节）: offset 8字节, length 4字节, counter 16字节
+        每一帧  （FRAME_ENTRY，12字节）: offset 8字节, length 4字节
+        offset 都是流偏移，counter 是分块第一块的计数器
+    文件尾（FOOTER，20字节）
+        index_offset 8字节, 分块数 4字节, 帧数 4字节, magic 4字节 b'SM4I'
+
+SM4ContainerWriter 边写边加密，只在内存里攒索引，close() 时把索引和文件尾
+追加到末尾，所以可以写到管道或不能 seek 的流里。SM4ContainerReader 从文件尾
+找到索引，mmap 整个文件，按索引直接解密任意帧或分块范围，不用扫描文件；
+workers > 1 时大范围按 SM4Encryptor 的并行模式多核解密。
+"""
+import mmap
+import os
+import struct
+from typing import NamedTuple
+
+from SM4_Encryptor import SM4Encryptor
+from sm4_io import SM4CTRWriter
+
+MAGIC = b'SM4C'
+INDEX_MAGIC = b'SM4I'
+VERSION = 1
+HEADER = struct.Struct('>4sBBHI16sI')
+CHUNK_ENTRY = struct.Struct('>QI16s')
+FRAME_ENTRY = struct.Struct('>QI')
+FOOTER = struct.Struct('>QII4s')
+
+# 默认分块大小（1MB），也是写入时加密缓冲区的大小
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+_MASK128 = (1 << 128) - 1
+
+
+class Chunk(NamedTuple):
+    """索引中的一个分块"""
+    offset: int        # 流偏移
+    length: int        # 明文/密文长度
+    counter: int       # 分块第一块的CTR计数器
+
+
+class FrameEntry(NamedTuple):
+    """索引中的一帧"""
+    offset: int        # 流偏移
+    length: int
+
+
+class SM4ContainerWriter:
+    """边加密边写容器文件，close() 时写入索引"""
+
+    def __init__(self, file, encryptor: SM4Encryptor, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        Args:
+            file: 文件路径，或可写的二进制文件对象（从当前位置开始写；不会被关闭）
+            encryptor: SM4Encryptor，其IV写入文件头，流从IV开始
+            chunk_size: 分块大小，必须是16的正整数倍
+
+        Raises:
+            ValueError: chunk_size 不合法
+        """
+        if chunk_size <= 0 or chunk_size % 16 or chunk_size >= 1 << 32:
+            raise ValueError(f"分块大小必须是16的正整数倍（小于4GB），但提供了 {chunk_size}")
+        self._owns = isinstance(file, (str, bytes, os.PathLike))
+        self._raw = open(file, 'wb') if self._owns else file
+        self.encryptor = encryptor
+        self.chunk_size = chunk_size
+        self._iv = int.from_bytes(encryptor.iv, 'big')
+        self._raw.write(HEADER.pack(MAGIC, VERSION, 0, 0, chunk_size, bytes(encryptor.iv), 0))
+        self._stream = SM4CTRWriter(self._raw, encryptor, chunk_size)
+        self.chunks = []
+        self.frames = []
+        self.closed = False
+
+    @property
+    def size(self) -> int:
+        """已写入的明文字节数"""
+        return self._stream.tell()
+
+    def write(self, data) -> int:
+        """
+        加密并追加数据（不记为帧）
+
+        Returns:
+            写入的字节数
+
+        Raises:
+            ValueError: 已关闭
+        """
+        if self.closed:
+            raise ValueError("容器已关闭")
+        n = self._stream.write(data)
+        self._add_chunks(self.size // self.chunk_size)
+        return n
+
+    def write_frame(self, frame) -> int:
+        """
+        加密并追加一帧，记入帧索引
+
+        Returns:
+            帧序号（从0开始）
+        """
+        offset = self.size
+        length = self.write(frame)
+        self.frames.append(FrameEntry(offset, length))
+        return len(self.frames) - 1
+
+    def _add_chunks(self, count: int):
+        """把已写满的分块（以及 close 时最后不满的一块）记入索引"""
+        while len(self.chunks) < count:
+            offset = len(self.chunks) * self.chunk_size
+            length = min(self.chunk_size, self.size - offset)
+            self.chunks.append(Chunk(offset, length, (self._iv + offset // 16) & _MASK128))
+
+    def close(self):
+        """写入索引和文件尾；由本对象打开的文件随之关闭"""
+        if self.closed:
+            return
+        self.closed = True
+        self._add_chunks(-(-self.size // self.chunk_size))
+        index = bytearray()
+        for chunk in self.chunks:
+            index += CHUNK_ENTRY.pack(chunk.offset, chunk.length, chunk.counter.to_bytes(16, 'big'))
+        for frame in self.frames:
+            index += FRAME_ENTRY.pack(frame.offset, frame.length)
+        index += FOOTER.pack(HEADER.size + self.size, len(self.chunks), len(self.frames), INDEX_MAGIC)
+        self._stream.close()   # 只结束包装层（会 flush），不关闭 _raw
+        self._raw.write(index)
+        self._raw.flush()
+        if self._owns:
+            self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SM4ContainerReader:
+    """按索引随机访问容器文件（mmap）"""
+
+    def __init__(self, path, key: bytes, backend: str = None, workers: int = 1):
+        """
+        Args:
+            path: 容器文件路径
+            key: 16字节密钥
+            backend: 同 SM4Encryptor
+            workers: 大范围解密的并行线程/进程数
+
+        Raises:
+            ValueError: 不是容器文件、版本不支持、索引缺失或损坏，或密钥不合法
+        """
+        with open(path, 'rb') as f:
+            file_size = f.seek(0, 2)
+            if file_size < HEADER.size + FOOTER.size:
+                raise ValueError("文件太短，不是SM4容器文件")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse(file_size)
+            self.encryptor = SM4Encryptor(key, self.iv, backend, workers=workers)
+        except ValueError:
+            self._mm.close()
+            raise
+        self._view = memoryview(self._mm)
+
+    def _parse(self, file_size: int):
+        """读取文件头、文件尾和索引，并检查它们彼此一致"""
+        magic, version, _, _, chunk_size, iv, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError("不是SM4容器文件")
+        if version != VERSION:
+            raise ValueError(f"不支持的容器版本: {version}")
+        index_offset, nchunks, nframes, magic = FOOTER.unpack_from(self._mm, file_size - FOOTER.size)
+        if magic != INDEX_MAGIC:
+            raise ValueError("缺少索引（文件没有正常关闭或被截断）")
+        index_size = nchunks * CHUNK_ENTRY.size + nframes * FRAME_ENTRY.size
+        if index_offset < HEADER.size or index_offset + index_size + FOOTER.size != file_size:
+            raise ValueError("索引损坏：长度与文件大小不符")
+
+        self.version = version
+        self.iv = iv
+        self.chunk_size = chunk_size
+        self.size = index_offset - HEADER.size
+        base = int.from_bytes(iv, 'big')
+        self.chunks = []
+        pos = index_offset
+        for _ in range(nchunks):
+            offset, length, counter = CHUNK_ENTRY.unpack_from(self._mm, pos)
+            chunk = Chunk(offset, length, int.from_bytes(counter, 'big'))
+            if (offset != len(self.chunks) * chunk_size or offset % 16
+                    or chunk.counter != (base + offset // 16) & _MASK128):
+                raise ValueError(f"索引损坏：第 {len(self.chunks)} 个分块的偏移或计数器不正确")
+            self.chunks.append(chunk)
+            pos += CHUNK_ENTRY.size
+        if sum(c.length for c in self.chunks) != self.size:
+            raise ValueError("索引损坏：分块总长度与密文长度不符")
+        self.frames = [FrameEntry(*FRAME_ENTRY.unpack_from(self._mm, pos + i * FRAME_ENTRY.size))
+                       for i in range(nframes)]
+        if any(f.offset + f.length > self.size for f in self.frames):
+            raise ValueError("索引损坏：帧超出密文范围")
+
+    def read(self, offset: int, length: int) -> bytes:
+        """
+        解密流中 [offset, offset + length) 这一段
+
+        Raises:
+            ValueError: 范围越界
+        """
+        if offset < 0 or length < 0 or offset + length > self.size:
+            raise ValueError(f"读取范围越界: [{offset}, {offset + length})，密文长度 {self.size}")
+        out = bytearray(length)
+        start = HEADER.size + offset
+        self.encryptor.decrypt_into(self._view[start:start + length], out, offset)
+        return bytes(out)
+
+    def read_chunks(self, start: int, stop: int = None) -> bytes:
+        """
+        解密第 start 到 stop-1 个分块（连续范围一次解密，够大时多核并行）
+
+        Raises:
+            IndexError: 分块序号越界
+        """
+        stop = start + 1 if stop is None else stop
+        if not 0 <= start < stop <= len(self.chunks):
+            raise IndexError(f"分块范围越界: [{start}, {stop})，共 {len(self.chunks)} 块")
+        first, last = self.chunks[start], self.chunks[stop - 1]
+        return self.read(first.offset, last.offset + last.length - first.offset)
+
+    def read_frame(self, index: int) -> bytes:
+        """解密第 index 帧"""
+        frame = self.frames[index]
+        return self.read(frame.offset, frame.length)
+
+    def read_frames(self, start: int, stop: int) -> list:
+        """
+        解密第 start 到 stop-1 帧：覆盖这些帧的范围一次解密，再按帧切开
+
+        Returns:
+            每帧的明文
+        """
+        frames = self.frames[start:stop]
+        if not frames:
+            return []
+        begin = min(f.offset for f in frames)
+        end = max(f.offset + f.length for f in frames)
+        data = self.read(begin, end - begin)
+        return [data[f.offset - begin:f.offset - begin + f.length] for f in frames]
+
+    def chunk_of(self, offset: int) -> int:
+        """
+        流偏移 offset 所在的分块序号
+
+        Raises:
+            ValueError: 偏移越界
+        """
+        if not 0 <= offset < self.size:
+            raise ValueError(f"偏移越界: {offset}，密文长度 {self.size}")
+        return offset // self.chunk_size
+
+    def close(self):
+        self._view.release()
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
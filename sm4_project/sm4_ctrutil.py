@@ -0,0 +1,160 @@
+"""
+CTR 计数器块生成和整段XOR（内部工具）
+
+计数器是128位大端整数，每块加1，低64位溢出时向高64位进位，整体对 2^128 取模。
+这里把“逐块 counter.to_bytes(16, 'big')、逐字节XOR”换成整段运算：
+
+-   counter_blocks: 连续计数器块一次 struct.pack 生成（按低64位的回绕点分段）；
+-   counter_array / multi_counter_array: NumPy 版，得到高/低64位两个 uint64 数组，
+    进位用一次比较完成，供向量化引擎和批量加密使用；
+-   xor_into / xor_bytes: 有 NumPy 时按 uint64 视图整段XOR，否则转成大整数一次XOR。
+
+NumPy 是可选的，没有时 counter_array 系列不可用（调用方本来就依赖 NumPy）。
+导入 NumPy 要几十毫秒，所以第一次真正需要时才导入（见 load_numpy），
+短XOR和纯计数器运算不会触发。
+"""
+import struct
+
+np = None
+_numpy_checked = False
+
+MASK64 = (1 << 64) - 1
+MASK128 = (1 << 128) - 1
+
+# 短于该长度的XOR直接用大整数，创建数组的固定开销反而更大
+NUMPY_XOR_MIN = 256
+
+
+def load_numpy():
+    """第一次调用时导入 NumPy，返回模块；不可用时返回 None"""
+    global np, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            pass
+        _numpy_checked = True
+    return np
+
+
+def counter_add(counter: int, blocks: int) -> int:
+    """计数器前进 blocks 块（对 2^128 取模）"""
+    return (counter + blocks) & MASK128
+
+
+def counter_blocks(counter: int, nblocks: int) -> bytes:
+    """
+    从 counter 开始的 nblocks 个连续计数器块
+
+    Returns:
+        nblocks*16 字节，每块是大端序的128位计数器
+    """
+    hi, lo = counter >> 64 & MASK64, counter & MASK64
+    parts = []
+    while nblocks > 0:
+        # 低64位回绕之前的这一段高64位不变
+        m = min(nblocks, (1 << 64) - lo)
+        words = [hi] * (2 * m)
+        words[1::2] = range(lo, lo + m)
+        parts.append(struct.pack(f'>{2 * m}Q', *words))
+        nblocks -= m
+        hi, lo = (hi + 1) & MASK64, 0
+    return b''.join(parts)
+
+
+def counter_array(counter: int, nblocks: int):
+    """
+    NumPy 版 counter_blocks
+
+    Returns:
+        (hi, lo)：长度为 nblocks 的 uint64 数组，分别是每块计数器的高/低64位
+    """
+    np = load_numpy()
+    lo0 = np.uint64(counter & MASK64)
+    lo = lo0 + np.arange(nblocks, dtype=np.uint64)   # uint64 运算自动模 2^64
+    hi = np.uint64(counter >> 64 & MASK64) + (lo < lo0).astype(np.uint64)   # 回绕的块进位
+    return hi, lo
+
+
+def split_counters(counters):
+    """128位计数器列表 → (高64位, 低64位) 两个 uint64 数组"""
+    np = load_numpy()
+    hi = np.array([c >> 64 & MASK64 for c in counters], dtype=np.uint64)
+    lo = np.array([c & MASK64 for c in counters], dtype=np.uint64)
+    return hi, lo
+
+
+def multi_counter_array(hi0, lo0, nblocks):
+    """
+    多条计数器流：第 i 条从 (hi0[i], lo0[i]) 开始
+
+    Args:
+        hi0, lo0: 各条起始计数器的高/低64位（uint64 数组，见 split_counters）
+        nblocks: 每条的块数；为整数时各条相同，结果为二维；为列表时各条依次连成一维
+
+    Returns:
+        (hi, lo)：uint64 数组，形状为 (条数, nblocks) 或 (总块数,)
+    """
+    np = load_numpy()
+    if isinstance(nblocks, int):
+        lo0, hi0 = lo0[:, None], hi0[:, None]
+        lo = lo0 + np.arange(nblocks, dtype=np.uint64)
+    else:
+        counts = np.asarray(nblocks, dtype=np.int64)
+        lo0, hi0 = np.repeat(lo0, counts), np.repeat(hi0, counts)
+        firsts = np.repeat(np.cumsum(counts) - counts, counts)
+        lo = lo0 + (np.arange(len(lo0)) - firsts).astype(np.uint64)
+    return hi0 + (lo < lo0).astype(np.uint64), lo
+
+
+def pack_counters(hi, lo):
+    """
+    把 counter_array 系列的结果排成连续的大端计数器块
+
+    Returns:
+        形状为 (总块数, 2) 的大端 uint64 数组（支持缓冲区协议，可直接交给 encrypt_blocks）
+    """
+    np = load_numpy()
+    out = np.empty(lo.shape + (2,), dtype='>u8')
+    out[..., 0] = hi
+    out[..., 1] = lo
+    return out.reshape(-1, 2)
+
+
+def xor_into(a, b, out):
+    """
+    out[:len(a)] = a XOR b（整段运算；out 可以就是 a 或 b）
+
+    Args:
+        a, b: 支持缓冲区协议的对象，b 可以比 a 长（只用前 len(a) 字节）
+        out: 可写缓冲区，至少 len(a) 字节
+    """
+    a = memoryview(a).cast('B')
+    n = len(a)
+    out = memoryview(out).cast('B')
+    np = None if n < NUMPY_XOR_MIN else load_numpy()
+    if np is None:
+        out[:n] = (int.from_bytes(a, 'little')
+                   ^ int.from_bytes(memoryview(b).cast('B')[:n], 'little')).to_bytes(n, 'little')
+        return
+    x = np.frombuffer(a, dtype=np.uint8)
+    y = np.frombuffer(b, dtype=np.uint8, count=n)
+    z = np.frombuffer(out, dtype=np.uint8, count=n)
+    # 前面按 uint64 一次处理8字节，剩下不足8字节的尾巴按字节
+    m = n & ~7
+    np.bitwise_xor(x[:m].view(np.uint64), y[:m].view(np.uint64), out=z[:m].view(np.uint64))
+    np.bitwise_xor(x[m:], y[m:], out=z[m:])
+
+
+def xor_bytes(a, b) -> bytes:
+    """
+    两段数据按字节XOR，返回新的 bytes（参数同 xor_into）
+    """
+    n = memoryview(a).nbytes
+    if n < NUMPY_XOR_MIN or load_numpy() is None:
+        return (int.from_bytes(a, 'little')
+                ^ int.from_bytes(memoryview(b).cast('B')[:n], 'little')).to_bytes(n, 'little')
+    out = bytearray(n)
+    xor_into(a, b, out)
+    return bytes(out)
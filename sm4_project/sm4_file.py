@@ -0,0 +1,139 @@
+"""
+SM4-CTR 文件加解密工具（基于 mmap）
+
+按计数器对齐的大窗口逐段处理：每次只把当前窗口内存映射进来，结果直接
+写进输出文件对应窗口的映射；CTR模式不改变长度，所以也支持原地加解密。
+处理完的窗口写回并解除映射，峰值内存和占用的地址空间都与文件大小无关
+（32位系统上也能处理几GB的录像）。
+
+用法:
+    python -m sm4_file encrypt video.mp4 -o video.enc --key <32位hex> [--iv <32位hex>]
+    python -m sm4_file decrypt video.enc -o video.mp4 --key <hex> --iv <hex>
+    python -m sm4_file decrypt video.enc --in-place --key <hex> --iv <hex>
+"""
+import argparse
+import mmap
+import os
+import sys
+import time
+
+from SM4_Encryptor import SM4Encryptor
+
+# 默认窗口大小（16MB，必须是16的倍数以保证计数器对齐）
+DEFAULT_WINDOW = 16 * 1024 * 1024
+
+
+def _map_window(f, start: int, end: int, write: bool = False):
+    """
+    只映射文件的 [start, end) 这一段（映射起点按 ALLOCATIONGRANULARITY 向下对齐）
+
+    Returns:
+        (mmap对象, start 在映射中的偏移)
+    """
+    base = start - start % mmap.ALLOCATIONGRANULARITY
+    access = mmap.ACCESS_WRITE if write else mmap.ACCESS_READ
+    return mmap.mmap(f.fileno(), end - base, access=access, offset=base), start - base
+
+
+def crypt_file(src_path: str, dst_path: str, encryptor: SM4Encryptor,
+               window: int = DEFAULT_WINDOW) -> int:
+    """
+    加密/解密整个文件（CTR模式两者相同）
+
+    Args:
+        src_path: 输入文件路径
+        dst_path: 输出文件路径；为 None 或与输入相同时原地处理
+        encryptor: SM4Encryptor 实例
+        window: 每次处理的字节数，必须是16的倍数
+
+    Returns:
+        处理的字节数
+
+    Raises:
+        ValueError: window 不是16的正整数倍
+    """
+    if window <= 0 or window % 16:
+        raise ValueError(f"窗口大小必须是16的正整数倍，但提供了 {window}")
+
+    in_place = dst_path is None or (
+        os.path.exists(dst_path) and os.path.samefile(src_path, dst_path))
+    size = os.path.getsize(src_path)
+
+    if in_place:
+        if size == 0:
+            return 0
+        with open(src_path, 'r+b') as f:
+            for start in range(0, size, window):
+                end = min(start + window, size)
+                mm, skip = _map_window(f, start, end, write=True)
+                with mm:
+                    with memoryview(mm) as view:
+                        encryptor.encrypt_into(view[skip:], view[skip:], start)
+                    mm.flush()
+        return size
+
+    with open(src_path, 'rb') as fin, open(dst_path, 'w+b') as fout:
+        fout.truncate(size)
+        if size == 0:
+            return 0
+        for start in range(0, size, window):
+            end = min(start + window, size)
+            src, skip = _map_window(fin, start, end)
+            dst, _ = _map_window(fout, start, end, write=True)
+            with src, dst:
+                with memoryview(src) as src_view, memoryview(dst) as dst_view:
+                    encryptor.encrypt_into(src_view[skip:], dst_view[skip:], start)
+                dst.flush()
+    return size
+
+
+def main(argv=None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(
+        prog='python -m sm4_file', description='SM4-CTR 文件加解密（mmap）')
+    parser.add_argument('mode', choices=['encrypt', 'decrypt'])
+    parser.add_argument('input', help='输入文件')
+    parser.add_argument('-o', '--output', help='输出文件')
+    parser.add_argument('--in-place', action='store_true', help='原地加解密输入文件')
+    parser.add_argument('--key', required=True, help='16字节密钥（32位十六进制）')
+    parser.add_argument('--iv', help='16字节IV（32位十六进制）；加密时省略则随机生成')
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW // (1024 * 1024),
+                        help='每次处理的窗口大小（MB，默认16）')
+    parser.add_argument('--workers', type=int, default=1, help='并行线程/进程数')
+    args = parser.parse_args(argv)
+
+    if args.in_place == bool(args.output):
+        parser.error('必须且只能指定 -o/--output 或 --in-place 之一')
+    if args.iv is None and args.mode == 'decrypt':
+        parser.error('解密必须提供 --iv')
+    if args.window <= 0:
+        parser.error(f'--window 必须是正整数（MB），但提供了 {args.window}')
+
+    try:
+        key = bytes.fromhex(args.key)
+        iv = bytes.fromhex(args.iv) if args.iv else os.urandom(16)
+        encryptor = SM4Encryptor(key, iv, workers=args.workers)
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+
+    if args.iv is None:
+        print(f"IV: {iv.hex()}  （解密时需要）")
+
+    start = time.perf_counter()
+    try:
+        size = crypt_file(args.input, None if args.in_place else args.output,
+                          encryptor, window=args.window * 1024 * 1024)
+    except OSError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - start
+
+    mb = size / (1024 * 1024)
+    speed = mb / elapsed if elapsed > 0 else float('inf')
+    print(f"完成: {mb:.2f} MB, 耗时 {elapsed:.3f} 秒, 吞吐 {speed:.2f} MB/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+"""
+SM4-CTR 加密帧协议
+
+每一帧 = 固定长度帧头 + 密文，帧头明文传输：
+
+    magic    2字节   b'S4'
+    version  1字节   协议版本（当前为1）
+    flags    1字节   FLAG_GCM 表示认证帧，其余位保留置0
+    seq      4字节   帧序号（从0开始，按帧递增）
+    offset   8字节   本帧在整个加密流中的字节偏移（即CTR计数器位置）
+    iv       16字节  会话IV
+    length   4字节   密文长度
+
+帧头自带IV和偏移，接收方不依赖“从第一帧开始按顺序解密”：
+中途丢帧或中途加入，都能从下一帧直接恢复（随机访问解密）。
+
+发送方用 sendmsg 把帧头和密文一次交给内核（分散/聚集写，一次系统调用），
+接收方用 recv_into 收进可复用的预分配缓冲区，并在缓冲区上原地解密。
+
+认证帧（authenticate=True）改用 SM4-GCM（见 sm4_gcm.py）：整个帧头作为AAD，
+密文后面跟16字节标签（不计入 length），nonce = IV前12字节 + 帧序号。
+篡改密文或帧头都会被接收方发现；同一会话里序号不前进的认证帧按重放拒收。
+"""
+import socket
+import struct
+import time
+from typing import NamedTuple
+
+from SM4_Encryptor import SM4Encryptor
+from sm4_gcm import SM4GCM, InvalidTag, TAG_SIZE
+
+MAGIC = b'S4'
+VERSION = 1
+HEADER = struct.Struct('>2sBBIQ16sI')
+
+# flags 位：本帧为 SM4-GCM 认证帧，密文后跟 TAG_SIZE 字节标签
+FLAG_GCM = 0x01
+
+# 认证帧的 nonce 由帧序号（32位）派生，同一IV下最多发送这么多帧
+MAX_GCM_FRAMES = 1 << 32
+
+# 单帧最大长度，防止错误的帧头导致分配超大缓冲区
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+class ReplayedFrame(ValueError):
+    """认证帧校验通过，但序号不在当前会话的期望序号之后（重放或乱序的旧帧）"""
+
+
+class Frame(NamedTuple):
+    """接收到的一帧"""
+    seq: int           # 帧序号
+    offset: int        # 在加密流中的字节偏移
+    payload: memoryview  # 明文，指向接收缓冲区，下一次 recv 前有效
+
+
+def _recv_exact_into(sock: socket.socket, view: memoryview) -> bool:
+    """把 view 收满；对端在帧开头正常关闭返回 False，帧中途断开抛 ConnectionError"""
+    got = 0
+    while got < len(view):
+        n = sock.recv_into(view[got:])
+        if not n:
+            if got == 0:
+                return False
+            raise ConnectionError("连接在帧中途断开")
+        got += n
+    return True
+
+
+def frame_nonce(iv: bytes, seq: int) -> bytes:
+    """认证帧的GCM nonce：IV前12字节（作为整数）加上帧序号，同一会话内各帧互不相同"""
+    return ((int.from_bytes(iv[:12], 'big') + seq) % (1 << 96)).to_bytes(12, 'big')
+
+
+class FrameSender:
+    """加密并发送帧"""
+
+    def __init__(self, sock: socket.socket, encryptor: SM4Encryptor, prefetch: int = 0,
+                 authenticate: bool = False):
+        """
+        Args:
+            sock: 已连接的TCP套接字
+            encryptor: SM4Encryptor（决定密钥和会话IV）
+            prefetch: 密钥流预取池大小，见 SM4Encryptor.stream_context（仅CTR帧）
+            authenticate: 为 True 时发送 SM4-GCM 认证帧
+        """
+        self._sock = sock
+        self._iv = encryptor.iv
+        self._encryptor = encryptor
+        self.stats = encryptor.stats   # 给加密器传了 stats 时记录 frame_encrypt
+        self._header = bytearray(HEADER.size)
+        self.seq = 0
+        self.position = 0   # 已发送的明文字节数，即下一帧的偏移
+        if authenticate:
+            self.context = None
+            self._gcm = SM4GCM(encryptor.key, encryptor.backend, encryptor.workers,
+                               stats=encryptor.stats, scratch_size=encryptor.scratch_size)
+        else:
+            self.context = encryptor.stream_context(prefetch=prefetch)  # 会话的流式加密上下文
+            self._gcm = None
+
+    def send(self, payload) -> int:
+        """
+        原地加密 payload 并作为一帧发送
+
+        Args:
+            payload: 可写缓冲区（如 bytearray），发送后内容变为密文
+
+        Returns:
+            本帧序号
+
+        Raises:
+            ValueError: 认证帧数量达到 MAX_GCM_FRAMES（需换新IV重新建立会话）
+        """
+        payload = memoryview(payload).cast('B')
+        seq = self.seq
+        header = memoryview(self._header)
+        start = time.perf_counter_ns()
+        if self._gcm is None:
+            HEADER.pack_into(self._header, 0, MAGIC, VERSION, 0, seq & 0xFFFFFFFF,
+                             self.position, self._iv, len(payload))
+            self.context.update_into(payload, payload)
+            parts = [header, payload]
+        else:
+            if seq >= MAX_GCM_FRAMES:
+                raise ValueError("同一IV下的认证帧数已达上限，请换新IV")
+            HEADER.pack_into(self._header, 0, MAGIC, VERSION, FLAG_GCM, seq,
+                             self.position, self._iv, len(payload))
+            ctx = self._gcm.encryptor(frame_nonce(self._iv, seq), aad=self._header)
+            ctx.update_into(payload, payload)
+            parts = [header, payload, ctx.finalize()]
+        if self.stats is not None:
+            self.stats.record('frame_encrypt', len(payload), time.perf_counter_ns() - start)
+        self.transmit(parts)
+        self.position += len(payload)
+        self.seq += 1
+        return seq
+
+    def seal(self, payload, seq: int, offset: int) -> list:
+        """
+        原地加密 payload 并组装成帧，但不发送
+
+        与 send 不同，帧序号和流偏移由调用方指定，不依赖发送顺序，
+        可以在多个线程里并行调用（见 sm4_pipeline），再按序号顺序 transmit。
+
+        Args:
+            payload: 可写缓冲区，加密后内容变为密文
+            seq: 帧序号
+            offset: 本帧在加密流中的字节偏移
+
+        Returns:
+            帧的各部分 [帧头, 密文] 或 [帧头, 密文, 标签]
+
+        Raises:
+            ValueError: 认证帧序号达到 MAX_GCM_FRAMES
+        """
+        payload = memoryview(payload).cast('B')
+        header = bytearray(HEADER.size)
+        start = time.perf_counter_ns()
+        if self._gcm is None:
+            HEADER.pack_into(header, 0, MAGIC, VERSION, 0, seq & 0xFFFFFFFF,
+                             offset, self._iv, len(payload))
+            self._encryptor.encrypt_into(payload, payload, offset)
+            parts = [header, payload]
+        else:
+            if seq >= MAX_GCM_FRAMES:
+                raise ValueError("同一IV下的认证帧数已达上限，请换新IV")
+            HEADER.pack_into(header, 0, MAGIC, VERSION, FLAG_GCM, seq,
+                             offset, self._iv, len(payload))
+            ctx = self._gcm.encryptor(frame_nonce(self._iv, seq), aad=header)
+            ctx.update_into(payload, payload)
+            parts = [header, payload, ctx.finalize()]
+        if self.stats is not None:
+            self.stats.record('frame_encrypt', len(payload), time.perf_counter_ns() - start)
+        return parts
+
+    def transmit(self, parts: list):
+        """发送 seal 组装好的帧：各部分一次系统调用发出，只有内核缓冲区满时才补发剩余部分"""
+        if not hasattr(self._sock, 'sendmsg'):  # Windows 没有 sendmsg
+            self._sock.sendall(b''.join(parts))
+            return
+        sent = self._sock.sendmsg(parts)
+        for part in parts:
+            if sent >= len(part):
+                sent -= len(part)
+                continue
+            self._sock.sendall(part[sent:])
+            sent = 0
+
+    def close(self):
+        """结束加密上下文（停止预取线程）"""
+        if self.context is not None:
+            self.context.finalize()
+
+
+class FrameReceiver:
+    """接收并原地解密帧"""
+
+    def __init__(self, sock: socket.socket, key: bytes, buffer_size: int = 64 * 1024,
+                 require_auth: bool = False, stats=None, scratch_size: int = None):
+        """
+        Args:
+            sock: 已连接的TCP套接字
+            key: 16字节密钥
+            buffer_size: 初始接收缓冲区大小，遇到更大的帧会自动扩大
+            require_auth: 为 True 时拒绝未认证的CTR帧（防止被降级）
+            stats: sm4_stats.CipherStats，记录 frame_decrypt 等操作
+            scratch_size: 低内存模式的暂存区大小，同 SM4Encryptor
+        """
+        self._sock = sock
+        self._key = key
+        self._require_auth = require_auth
+        self.stats = stats
+        self.scratch_size = scratch_size
+        self._header = bytearray(HEADER.size)
+        self._buffer = bytearray(buffer_size)
+        self._tag = bytearray(TAG_SIZE)
+        self._encryptor = None
+        self._gcm = None
+        self.expected_seq = 0
+        self.dropped = 0     # 通过序号间隔发现的丢帧数
+
+    @property
+    def iv(self):
+        """当前会话的IV，收到第一帧之前为 None"""
+        return None if self._encryptor is None else self._encryptor.iv
+
+    def recv(self):
+        """
+        接收下一帧
+
+        Returns:
+            Frame；对端关闭连接时返回 None
+
+        Raises:
+            ValueError: 帧头非法（magic/版本不对或长度超限），或要求认证时收到CTR帧
+            InvalidTag: 认证帧校验失败（整帧已读完，可以继续 recv 下一帧）
+            ReplayedFrame: 同一会话里序号小于期望序号的认证帧（同上，可以继续 recv）
+            ConnectionError: 帧中途断开
+        """
+        if not _recv_exact_into(self._sock, memoryview(self._header)):
+            return None
+        magic, version, flags, seq, offset, iv, length = HEADER.unpack(self._header)
+        if magic != MAGIC:
+            raise ValueError(f"帧头标识错误: {magic!r}")
+        if version != VERSION:
+            raise ValueError(f"不支持的协议版本: {version}")
+        if length > MAX_FRAME_SIZE:
+            raise ValueError(f"帧长度超过上限: {length}")
+        authenticated = bool(flags & FLAG_GCM)
+        if self._require_auth and not authenticated:
+            raise ValueError("收到未认证的帧")
+
+        if length > len(self._buffer):
+            self._buffer = bytearray(length)
+        view = memoryview(self._buffer)[:length]
+        if not _recv_exact_into(self._sock, view):
+            raise ConnectionError("连接在帧中途断开")
+        if authenticated and not _recv_exact_into(self._sock, memoryview(self._tag)):
+            raise ConnectionError("连接在帧中途断开")
+
+        start = time.perf_counter_ns()
+        if authenticated:
+            # 先认证（帧头作AAD）再交出明文、更新会话状态：校验失败时
+            # 不更新序号统计，换了IV的伪造帧也不能重置会话
+            if self._gcm is None:
+                self._gcm = SM4GCM(self._key, stats=self.stats, scratch_size=self.scratch_size)
+            ctx = self._gcm.decryptor(frame_nonce(iv, seq), aad=self._header)
+            ctx.update_into(view, view)
+            ctx.finalize(self._tag)
+            if self._encryptor is not None and self._encryptor.iv == iv and seq < self.expected_seq:
+                # 同一IV下认证帧最多 MAX_GCM_FRAMES 帧，序号不会回绕
+                raise ReplayedFrame(f"重放的认证帧: 序号 {seq}，期望不小于 {self.expected_seq}")
+        if self._encryptor is None or self._encryptor.iv != iv:
+            # 新会话（或中途加入），从这一帧开始计序号
+            self._encryptor = SM4Encryptor(self._key, iv, stats=self.stats,
+                                           scratch_size=self.scratch_size)
+            self.expected_seq = seq
+        if not authenticated:
+            # 按帧头中的偏移解密，不依赖之前的帧
+            self._encryptor.decrypt_into(view, view, offset)
+        if self.stats is not None:
+            self.stats.record('frame_decrypt', length, time.perf_counter_ns() - start)
+
+        # 只有序号前进时才计丢帧；落后的（乱序到达的CTR帧）不回退期望序号
+        gap = (seq - self.expected_seq) & 0xFFFFFFFF
+        if gap < 0x80000000:
+            self.dropped += gap
+            self.expected_seq = (seq + 1) & 0xFFFFFFFF
+        return Frame(seq, offset, view)
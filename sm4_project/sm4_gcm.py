@@ -0,0 +1,438 @@
+"""
+SM4-GCM 认证加密（RFC 8998 中的 SM4_GCM，即 NIST SP 800-38D 的GCM套在SM4上）
+
+CTR模式只保证机密性，密文被篡改接收方无从发现；GCM在CTR之上加了
+GHASH认证标签，还能把不加密的数据（如帧头）作为AAD一起认证。
+
+OpenSSL 带 SM4-GCM 时（cryptography 的 modes.GCM，首次使用前跑一遍
+RFC 8998 测试向量），后端为 openssl 的 SM4GCM 直接交给它，比下面的纯Python
+GHASH 快一个数量级；否则用自己的实现：
+
+-   密钥流复用 SM4Encryptor 的CTR后端（openssl/numpy/...），计数器从 J0+1 开始；
+-   GHASH 用每个密钥预计算的 8 位查表：H 乘以 16 个字节位置上的 256 种取值，
+    共 16×256 项，乘一次 H 只需 16 次查表和异或，不用逐位移位约简；
+-   单遍处理：数据按 CHUNK 分段，每段做完CTR立刻对这一段做GHASH，
+    数据还在缓存里，不用像 CTR+HMAC 那样整段再读一遍；
+-   支持流式 update / update_into 和 AAD，密文与一次性加密完全相同。
+
+nonce 固定为12字节（RFC 8998 的要求），标签16字节。
+"""
+import functools
+import hmac
+import struct
+import time
+
+from SM4_Encryptor import SM4Encryptor, _byte_views, _get_scratch
+
+NONCE_SIZE = 12
+TAG_SIZE = 16
+
+# 单条消息的最大明文长度：2^39-256 位
+MAX_DATA_SIZE = (1 << 36) - 32
+
+# 单遍处理的分段大小：每段先CTR再GHASH
+CHUNK = 64 * 1024
+
+# GHASH 查表缓存容量（按 H 缓存，每个密钥一份约 4096 项）
+GHASH_CACHE_SIZE = 16
+
+# GF(2^128) 约简多项式 x^128 + x^7 + x^2 + x + 1（GCM位序）
+_R = 0xE1 << 120
+
+
+# OpenSSL SM4-GCM 的已知答案测试：RFC 8998 附录A.1
+_KAT_KEY = bytes.fromhex('0123456789abcdeffedcba9876543210')
+_KAT_NONCE = bytes.fromhex('00001234567800000000abcd')
+_KAT_AAD = bytes.fromhex('feedfacedeadbeeffeedfacedeadbeefabaddad2')
+_KAT_PLAINTEXT = bytes.fromhex(
+    'aaaaaaaaaaaaaaaabbbbbbbbbbbbbbbbccccccccccccccccdddddddddddddddd'
+    'eeeeeeeeeeeeeeeeffffffffffffffffeeeeeeeeeeeeeeeeaaaaaaaaaaaaaaaa')
+_KAT_OUTPUT = bytes.fromhex(
+    '17f399f08c67d5ee19d0dc9969c4bb7d5fd46fd3756489069157b282bb200735'
+    'd82710ca5c22f0ccfa7cbf93d496ac15a56834cbcf98c397b4024a2691233b8d'
+    '83de3541e4c2b58177e065a9bf7b62ec')
+
+
+class InvalidTag(ValueError):
+    """认证标签校验失败：密文、AAD、nonce或标签被篡改"""
+
+
+@functools.lru_cache(maxsize=None)
+def _openssl_gcm():
+    """
+    加载并自检 OpenSSL 的 SM4-GCM（只做一次）
+
+    Returns:
+        (Cipher, algorithms.SM4, modes.GCM, cryptography 的 InvalidTag)；不可用时为 None
+    """
+    try:
+        from cryptography.exceptions import InvalidTag as OpenSSLInvalidTag
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        from cryptography.hazmat.backends import default_backend
+    except ImportError:
+        return None
+    if not hasattr(algorithms, 'SM4') or not default_backend().cipher_supported(
+            algorithms.SM4(_KAT_KEY), modes.GCM(_KAT_NONCE)):
+        return None
+    ctx = Cipher(algorithms.SM4(_KAT_KEY), modes.GCM(_KAT_NONCE)).encryptor()
+    ctx.authenticate_additional_data(_KAT_AAD)
+    if ctx.update(_KAT_PLAINTEXT) + ctx.finalize() + ctx.tag != _KAT_OUTPUT:
+        return None
+    return Cipher, algorithms.SM4, modes.GCM, OpenSSLInvalidTag
+
+
+@functools.lru_cache(maxsize=GHASH_CACHE_SIZE)
+def ghash_tables(h: int) -> tuple:
+    """
+    预计算 GHASH 乘法表
+
+    GCM位序下，分组的第 i 个字节的最高位是 x^(8i) 的系数，
+    因此 X·H = M[0][X0] ^ M[1][X1] ^ ... ^ M[15][X15]，
+    其中 M[i][b] 是“只有第 i 个字节为 b 的分组”乘以 H。
+
+    Args:
+        h: 哈希子密钥 H = E_K(0^128)（大端整数）
+
+    Returns:
+        16 张 256 项的表
+    """
+    # p[j] = x^j · H，乘 x 在GCM位序下是右移一位再约简
+    p = []
+    v = h
+    for _ in range(128):
+        p.append(v)
+        v = (v >> 1) ^ _R if v & 1 else v >> 1
+
+    tables = []
+    for i in range(16):
+        t = [0] * 256
+        # 从字节的最低位开始填，t[bit | m] 只依赖已经填好的 t[m]
+        for k in reversed(range(8)):
+            bit = 0x80 >> k
+            pk = p[8 * i + k]
+            for m in range(bit):
+                t[bit | m] = t[m] ^ pk
+        tables.append(tuple(t))
+    return tuple(tables)
+
+
+def _ghash(tables: tuple, y: int, data) -> int:
+    """
+    把若干完整分组吸收进GHASH状态
+
+    Args:
+        tables: ghash_tables 的返回值
+        y: 当前状态
+        data: 长度为16整数倍的数据
+
+    Returns:
+        新状态
+    """
+    (m0, m1, m2, m3, m4, m5, m6, m7,
+     m8, m9, m10, m11, m12, m13, m14, m15) = tables
+    data = bytes(data)
+    from_bytes = int.from_bytes
+    for i in range(0, len(data), 16):
+        x = (y ^ from_bytes(data[i:i + 16], 'big')).to_bytes(16, 'big')
+        y = (m0[x[0]] ^ m1[x[1]] ^ m2[x[2]] ^ m3[x[3]] ^
+             m4[x[4]] ^ m5[x[5]] ^ m6[x[6]] ^ m7[x[7]] ^
+             m8[x[8]] ^ m9[x[9]] ^ m10[x[10]] ^ m11[x[11]] ^
+             m12[x[12]] ^ m13[x[13]] ^ m14[x[14]] ^ m15[x[15]])
+    return y
+
+
+class SM4GCM:
+    """SM4-GCM 认证加密器（一个密钥，每条消息用不同的 nonce）"""
+
+    def __init__(self, key: bytes, backend: str = None, workers: int = 1, stats=None,
+                 scratch_size: int = None):
+        """
+        Args:
+            key: 16字节密钥
+            backend: CTR后端，同 SM4Encryptor；为 openssl（或自动选到 openssl）且 OpenSSL
+                支持 SM4-GCM 时整个GCM交给 OpenSSL（见 self.native）
+            workers: CTR部分的并行数，同 SM4Encryptor（OpenSSL GCM 不并行）
+            stats: sm4_stats.CipherStats，记录 gcm_encrypt/gcm_decrypt 操作和 ghash 阶段
+            scratch_size: CTR部分的低内存暂存区大小，同 SM4Encryptor
+
+        Raises:
+            ValueError: 密钥长度不正确，scratch_size 不合法，或后端不可用
+        """
+        self.key = key
+        self.backend = backend
+        self.workers = workers
+        self.stats = stats
+        self.scratch_size = scratch_size
+        # H = E_K(0^128)：IV为0时CTR的第一块密钥流就是它（顺带检查密钥和后端）
+        ctr = SM4Encryptor(key, bytes(16), backend, scratch_size=scratch_size)
+        self._openssl = _openssl_gcm() if ctr.backend == 'openssl' else None
+        self.native = self._openssl is not None   # True 表示用 OpenSSL 的 SM4-GCM
+        if self.native:
+            self._tables = None
+            self._state = self._openssl[1](bytes(key))
+        else:
+            h = ctr.encrypt(bytes(16))
+            self._tables = ghash_tables(int.from_bytes(h, 'big'))
+
+    def encryptor(self, nonce: bytes, aad: bytes = b'') -> 'SM4GCMContext':
+        """
+        创建流式加密上下文，finalize() 返回标签
+
+        Args:
+            nonce: 12字节，同一密钥下绝不能重复
+            aad: 只认证不加密的附加数据
+        """
+        return SM4GCMContext(self, nonce, aad, decrypting=False)
+
+    def decryptor(self, nonce: bytes, aad: bytes = b'') -> 'SM4GCMContext':
+        """
+        创建流式解密上下文，finalize(tag) 校验标签
+
+        注意：update 返回的明文在 finalize 校验通过之前都不可信。
+        """
+        return SM4GCMContext(self, nonce, aad, decrypting=True)
+
+    def encrypt(self, nonce: bytes, data: bytes, aad: bytes = b'') -> bytes:
+        """
+        一次性加密
+
+        Args:
+            nonce: 12字节
+            data: 明文
+            aad: 附加认证数据
+
+        Returns:
+            密文 + 16字节标签
+        """
+        ctx = self.encryptor(nonce, aad)
+        out = bytearray(len(data) + TAG_SIZE)
+        ctx.update_into(data, out)
+        out[len(data):] = ctx.finalize()
+        return bytes(out)
+
+    def decrypt(self, nonce: bytes, data: bytes, aad: bytes = b'') -> bytes:
+        """
+        一次性解密并校验
+
+        Args:
+            nonce: 12字节
+            data: 密文 + 16字节标签
+            aad: 附加认证数据
+
+        Returns:
+            明文
+
+        Raises:
+            InvalidTag: 标签校验失败（不返回任何明文）
+            ValueError: data 比标签还短
+        """
+        if len(data) < TAG_SIZE:
+            raise ValueError(f"密文太短，至少要包含 {TAG_SIZE} 字节标签")
+        view = memoryview(data).cast('B')
+        body, tag = view[:-TAG_SIZE], view[-TAG_SIZE:]
+        ctx = self.decryptor(nonce, aad)
+        out = bytearray(len(body))
+        ctx.update_into(body, out)
+        ctx.finalize(tag)
+        return bytes(out)
+
+
+class SM4GCMContext:
+    """
+    SM4-GCM 流式上下文
+
+    用法：
+        ctx = gcm.encryptor(nonce, aad=header)
+        ct = ctx.update(part1) + ctx.update(part2)
+        tag = ctx.finalize()
+
+        ctx = gcm.decryptor(nonce, aad=header)
+        pt = ctx.update(ct)
+        ctx.finalize(tag)      # 不通过抛 InvalidTag
+    """
+
+    def __init__(self, gcm: SM4GCM, nonce: bytes, aad: bytes = b'', decrypting: bool = False):
+        if len(nonce) != NONCE_SIZE:
+            raise ValueError(f"GCM nonce必须是{NONCE_SIZE}字节，但提供了 {len(nonce)} 字节")
+        self._tables = gcm._tables
+        self._decrypting = decrypting
+        self._stats = gcm.stats
+        self._aad_len = 0
+        self._data_len = 0
+        self._finalized = False
+        self.tag = None           # 加密 finalize 后的标签
+        self._native = None
+        if gcm.native:
+            cipher, _, mode, self._native_invalid = gcm._openssl
+            ctx = cipher(gcm._state, mode(bytes(nonce)))
+            self._native = ctx.decryptor() if decrypting else ctx.encryptor()
+            if aad:
+                self.authenticate_additional_data(aad)
+            return
+        # J0 = nonce || 0x00000001；E(J0) 用来加密标签，数据从 J0+1 开始。
+        # 长度上限保证计数器低32位不会溢出，所以128位递增与GCM的inc32一致
+        encryptor = SM4Encryptor(gcm.key, bytes(nonce) + b'\x00\x00\x00\x01',
+                                 gcm.backend, gcm.workers, stats=gcm.stats,
+                                 scratch_size=gcm.scratch_size)
+        self._tag_mask = int.from_bytes(encryptor.encrypt(bytes(16)), 'big')
+        self._ctr = encryptor.stream_context(offset=16)
+        self._y = 0
+        self._buf = bytearray()   # 不足一个分组、还没吸收进GHASH的数据
+        if aad:
+            self.authenticate_additional_data(aad)
+
+    def _absorb(self, data):
+        """把任意长度的数据吸收进GHASH，不足一组的部分留在缓冲区"""
+        buf = self._buf
+        if buf:
+            k = min(16 - len(buf), len(data))
+            buf += data[:k]
+            data = data[k:]
+            if len(buf) < 16:
+                return
+            self._y = _ghash(self._tables, self._y, buf)
+            buf.clear()
+        full = len(data) // 16 * 16
+        if full:
+            self._y = _ghash(self._tables, self._y, data[:full])
+        buf += data[full:]
+
+    def _hash(self, data):
+        """_absorb，开启统计时把耗时计入 ghash 阶段"""
+        if self._stats is None:
+            return self._absorb(data)
+        start = time.perf_counter_ns()
+        self._absorb(data)
+        self._stats.add_stage('ghash', time.perf_counter_ns() - start)
+
+    def _pad(self):
+        """AAD/密文结束时把残余部分补零吸收"""
+        if self._buf:
+            self._buf += bytes(16 - len(self._buf))
+            self._y = _ghash(self._tables, self._y, self._buf)
+            self._buf.clear()
+
+    def authenticate_additional_data(self, data: bytes):
+        """
+        追加附加认证数据（必须在第一次 update 之前）
+
+        Raises:
+            ValueError: 已经开始处理数据或已经 finalize
+        """
+        if self._finalized:
+            raise ValueError("GCM上下文已结束")
+        if self._data_len:
+            raise ValueError("AAD必须在加密数据之前提供")
+        data = memoryview(data).cast('B')
+        self._aad_len += len(data)
+        if self._native is not None:
+            self._native.authenticate_additional_data(bytes(data))
+            return
+        self._absorb(data)
+
+    def update(self, data: bytes) -> bytes:
+        """
+        加密/解密下一段数据
+
+        Args:
+            data: 任意长度的明文或密文
+
+        Returns:
+            等长的密文或明文
+        """
+        out = bytearray(len(data))
+        self.update_into(data, out)
+        return bytes(out)
+
+    def update_into(self, src, dst) -> int:
+        """
+        零拷贝版本的 update，dst 可以就是 src（原地处理）
+
+        Returns:
+            写入的字节数
+
+        Raises:
+            ValueError: 上下文已结束、dst 太短/只读，或累计长度超过 MAX_DATA_SIZE
+        """
+        if self._finalized:
+            raise ValueError("GCM上下文已结束，不能继续 update")
+        src, dst = _byte_views(src, dst)
+        n = len(src)
+        dst = dst[:n]
+        if self._data_len + n > MAX_DATA_SIZE:
+            raise ValueError(f"单条GCM消息不能超过 {MAX_DATA_SIZE} 字节")
+        if not self._data_len and n and self._native is None:
+            self._pad()   # AAD 结束
+        self._data_len += n
+
+        start = time.perf_counter_ns()
+        if self._native is not None:
+            # 各版本 cryptography 的 update_into 对输出长度要求不一，经由暂存区再复制
+            scratch = _get_scratch(CHUNK)
+            for i in range(0, n, CHUNK):
+                m = self._native.update_into(src[i:i + CHUNK], scratch)
+                dst[i:i + m] = scratch[:m]
+        else:
+            for i in range(0, n, CHUNK):
+                s, d = src[i:i + CHUNK], dst[i:i + CHUNK]
+                # GHASH 总是作用在密文上：解密时先认证再变换（src 可能就是 dst）
+                if self._decrypting:
+                    self._hash(s)
+                    self._ctr.update_into(s, d)
+                else:
+                    self._ctr.update_into(s, d)
+                    self._hash(d)
+        if self._stats is not None:
+            op = 'gcm_decrypt' if self._decrypting else 'gcm_encrypt'
+            self._stats.record(op, n, time.perf_counter_ns() - start)
+        return n
+
+    def finalize(self, tag: bytes = None) -> bytes:
+        """
+        结束上下文
+
+        Args:
+            tag: 解密时必须提供收到的16字节标签；加密时不传
+
+        Returns:
+            加密：16字节标签（同时保存在 self.tag）；解密：b''
+
+        Raises:
+            InvalidTag: 解密时标签不匹配
+            ValueError: 已经 finalize，或加解密时 tag 参数用法不对
+        """
+        if self._finalized:
+            raise ValueError("GCM上下文已结束")
+        if self._decrypting and tag is None:
+            raise ValueError("解密时必须提供标签")
+        if not self._decrypting and tag is not None:
+            raise ValueError("加密时不需要提供标签")
+        self._finalized = True
+        if self._native is not None:
+            return self._finalize_native(tag)
+        self._ctr.finalize()
+
+        self._pad()
+        lengths = struct.pack('>QQ', self._aad_len * 8, self._data_len * 8)
+        self._y = _ghash(self._tables, self._y, lengths)
+        expected = (self._y ^ self._tag_mask).to_bytes(16, 'big')
+        if not self._decrypting:
+            self.tag = expected
+            return expected
+        if not hmac.compare_digest(expected, bytes(tag)):
+            raise InvalidTag("SM4-GCM 认证标签校验失败")
+        return b''
+
+    def _finalize_native(self, tag) -> bytes:
+        """OpenSSL 版 finalize：只接受完整的16字节标签（OpenSSL 允许截短的标签）"""
+        if not self._decrypting:
+            self._native.finalize()
+            self.tag = self._native.tag
+            return self.tag
+        if len(tag) != TAG_SIZE:
+            raise InvalidTag("SM4-GCM 认证标签校验失败")
+        try:
+            self._native.finalize_with_tag(bytes(tag))
+        except self._native_invalid:
+            raise InvalidTag("SM4-GCM 认证标签校验失败") from None
+        return b''
@@ -0,0 +1,136 @@
+"""
+SM4-CTR 文件对象封装
+
+SM4CTRReader 包装一个已打开的二进制文件（或任意带 readinto 的流），
+读出的数据自动做CTR变换：包装密文得到明文，包装明文得到密文。
+SM4CTRWriter 反过来，写进去的数据做CTR变换后写入底层流。
+
+两者都是 io.RawIOBase，可以直接用在 shutil.copyfileobj、子进程管道等
+需要文件对象的地方；数据按块流过，内存占用与总长度无关。
+
+底层流可 seek 时，读写者也可以 seek：计数器按偏移直接算出来，
+在多GB的录像中间拖动进度条只解密实际读到的那一段。
+关闭读写者不会关闭底层流。
+"""
+import io
+
+from SM4_Encryptor import SM4Encryptor, STREAM_CHUNK_SIZE
+
+
+class _CTRStream(io.RawIOBase):
+    """读写者共用的位置管理：数据流偏移 = 底层流位置 - 起始位置"""
+
+    def __init__(self, raw, encryptor: SM4Encryptor):
+        super().__init__()
+        self._raw = raw
+        self._encryptor = encryptor
+        self._base = raw.tell() if raw.seekable() else 0
+        self._pos = 0
+
+    def seekable(self) -> bool:
+        return self._raw.seekable()
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        """
+        定位到明文（数据流）中的字节偏移
+
+        Args:
+            offset: 偏移量
+            whence: io.SEEK_SET / io.SEEK_CUR / io.SEEK_END
+
+        Returns:
+            新的位置
+        """
+        if not self.seekable():
+            raise io.UnsupportedOperation("底层流不支持 seek")
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._raw.seek(0, io.SEEK_END) - self._base + offset
+        else:
+            raise ValueError(f"不支持的 whence: {whence}")
+        if pos < 0:
+            raise ValueError(f"偏移量不能为负数: {pos}")
+        self._raw.seek(self._base + pos)
+        self._pos = pos
+        return pos
+
+
+class SM4CTRReader(_CTRStream):
+    """可随机访问的CTR解密读取器"""
+
+    def __init__(self, raw, encryptor: SM4Encryptor):
+        """
+        Args:
+            raw: 底层二进制流，当前位置视为数据流的第0字节
+            encryptor: 与写入方相同密钥/IV的 SM4Encryptor
+        """
+        super().__init__(raw, encryptor)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        """读取并就地解密到 b 中，返回读到的字节数"""
+        view = memoryview(b).cast('B')
+        n = self._raw.readinto(view)
+        if not n:
+            return 0
+        self._encryptor.decrypt_into(view[:n], view[:n], self._pos)
+        self._pos += n
+        return n
+
+
+class SM4CTRWriter(_CTRStream):
+    """CTR加密写入器：写入明文，底层流得到密文"""
+
+    def __init__(self, raw, encryptor: SM4Encryptor, chunk_size: int = STREAM_CHUNK_SIZE):
+        """
+        Args:
+            raw: 底层二进制流，当前位置视为数据流的第0字节
+            encryptor: SM4Encryptor（决定密钥和IV）
+            chunk_size: 加密缓冲区大小，大块写入按它分段，内存占用不超过它
+
+        Raises:
+            ValueError: chunk_size 不是正数
+        """
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size必须大于0，但提供了 {chunk_size}")
+        super().__init__(raw, encryptor)
+        self._buf = bytearray(chunk_size)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        """加密 b 并全部写入底层流，返回写入的字节数"""
+        view = memoryview(b).cast('B')
+        n = len(view)
+        out = memoryview(self._buf)
+        step = len(out)
+        for i in range(0, n, step):
+            part = view[i:i + step]
+            chunk = out[:len(part)]
+            self._encryptor.encrypt_into(part, chunk, self._pos)
+            self._write_all(chunk)
+            self._pos += len(part)
+        return n
+
+    def _write_all(self, data: memoryview):
+        """底层流可能只写入一部分（如原始管道），写满为止"""
+        while data:
+            written = self._raw.write(data)
+            if written is None:
+                raise BlockingIOError("底层流暂时不可写")
+            data = data[written:]
+
+    def flush(self):
+        super().flush()
+        # 底层流可能先被关闭（不归本对象管），这时析构里的 flush 不能再碰它
+        if hasattr(self._raw, 'flush') and not getattr(self._raw, 'closed', False):
+            self._raw.flush()
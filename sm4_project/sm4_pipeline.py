@@ -0,0 +1,264 @@
+"""
+三级流水线发送：采集 → 加密 → 发送
+
+逐帧“采集、加密、发送、sleep(1/30)”时，加密耗时直接吃掉帧间隔，
+一帧慢了后面全部被拖住。PipelinedSender 把三步拆开重叠执行：
+
+    采集（调用 run 的线程）  按截止时间节拍调用 capture()，给帧分配序号和流偏移
+        │  加密队列（有界）
+    加密线程池（workers 个）  FrameSender.seal 原地加密，各帧互不依赖，可并行
+        │  发送队列（有界）
+    发送线程               按序号重新排好顺序后 transmit
+
+-   节拍按截止时间计算（第 i 帧在 start + i/fps 采集），不是固定 sleep，
+    加密和发送的耗时不会累积成帧率下降；落后超过一帧时不补发，直接对齐到当前时间。
+-   队列有界：网络慢时发送队列满，加密线程阻塞，加密队列随之变满（背压）。
+-   加密队列满时按 drop 策略处理：
+        'newest'  丢掉刚采集的这一帧（默认）
+        'oldest'  丢掉队列里最老的一帧，给新帧腾位置（延迟优先）
+        'block'   不丢帧，采集等待（帧率下降）
+    被丢掉的帧如果已经分配了序号，接收方会从序号间隔看出丢帧，帧头里的偏移
+    保证后面的帧照常解密。
+
+report() 给出采集/发送/丢弃的帧数、实际帧率、两个队列的当前和最大深度，
+以及从采集到发出的端到端延迟（p50/p99，用 CipherStats 的直方图）。
+"""
+import queue
+import threading
+import time
+
+from sm4_framing import FrameSender
+from sm4_stats import CipherStats
+
+DROP_POLICIES = ('newest', 'oldest', 'block')
+
+# 阻塞的队列操作每隔这么久检查一次是否要停止
+_POLL = 0.1
+
+
+class _Stop(Exception):
+    """流水线因为其他线程出错而停止"""
+
+
+class PipelinedSender:
+    """采集、加密、发送三级流水线"""
+
+    def __init__(self, sender: FrameSender, fps: float = 30.0, workers: int = 2,
+                 queue_size: int = 8, drop: str = 'newest'):
+        """
+        Args:
+            sender: FrameSender（决定密钥、IV、是否认证帧；预取池在流水线里用不上）
+            fps: 目标帧率
+            workers: 加密线程数
+            queue_size: 加密队列和发送队列的容量（帧）
+            drop: 加密跟不上时的丢帧策略，见 DROP_POLICIES
+
+        Raises:
+            ValueError: 参数不合法
+        """
+        if fps <= 0:
+            raise ValueError(f"fps必须大于0，但提供了 {fps}")
+        if workers < 1:
+            raise ValueError(f"workers必须大于等于1，但提供了 {workers}")
+        if queue_size < 1:
+            raise ValueError(f"queue_size必须大于等于1，但提供了 {queue_size}")
+        if drop not in DROP_POLICIES:
+            raise ValueError(f"未知的丢帧策略: {drop}，可选: {', '.join(DROP_POLICIES)}")
+        self.sender = sender
+        self.fps = fps
+        self.workers = workers
+        self.drop = drop
+        self._encrypt_q = queue.Queue(queue_size)
+        self._send_q = queue.Queue(queue_size)
+        self._stop = threading.Event()
+        self._error = None
+        self.latency = CipherStats()   # 'frame' 操作：采集 → 发出的端到端耗时
+        self.captured = 0
+        self.sent = 0
+        self.dropped = 0
+        self._max_depth = {'encrypt': 0, 'send': 0}
+        self._started = None
+        self._finished = None
+
+    def run(self, capture, frames: int = None, on_frame=None) -> dict:
+        """
+        运行流水线直到 capture() 返回 None 或采集满 frames 帧，所有帧发完后返回
+
+        Args:
+            capture: 无参函数，返回下一帧（可写缓冲区，会被原地加密）或 None 表示结束
+            frames: 最多采集的帧数，None 表示不限
+            on_frame: 每发出一帧在发送线程里调用 on_frame(seq, latency_ns)
+
+        Returns:
+            report() 的结果
+
+        Raises:
+            加密或发送线程里的异常（其余线程随之停止）
+        """
+        threads = [threading.Thread(target=self._guard, args=(self._encrypt_loop,), daemon=True)
+                   for _ in range(self.workers)]
+        threads.append(threading.Thread(target=self._guard, args=(self._send_loop, on_frame),
+                                        daemon=True))
+        self._started = time.perf_counter()
+        self.latency.reset()
+        for t in threads:
+            t.start()
+        try:
+            self._capture_loop(capture, frames)
+        except _Stop:
+            pass
+        finally:
+            for _ in range(self.workers):
+                self._put(self._encrypt_q, None, force=True)
+            for t in threads:
+                t.join()
+            self._finished = time.perf_counter()
+        if self._error is not None:
+            raise self._error
+        return self.report()
+
+    def _capture_loop(self, capture, frames):
+        """按截止时间节拍采集，分配序号和偏移后放进加密队列"""
+        interval = 1.0 / self.fps
+        deadline = time.perf_counter()
+        seq = self.sender.seq
+        offset = self.sender.position
+        while frames is None or self.captured < frames:
+            if self._stop.is_set():
+                raise _Stop
+            now = time.perf_counter()
+            if now < deadline:
+                time.sleep(deadline - now)
+            elif now - deadline > interval:
+                deadline = now   # 落后超过一帧：不补发，从现在重新计时
+            deadline += interval
+
+            frame = capture()
+            if frame is None:
+                break
+            captured_at = time.perf_counter_ns()
+            self.captured += 1
+            item = (seq, offset, frame, captured_at)
+            if self.drop == 'block':
+                self._put(self._encrypt_q, item)
+            else:
+                try:
+                    self._encrypt_q.put_nowait(item)
+                except queue.Full:
+                    if self.drop == 'newest':
+                        self.dropped += 1
+                        continue
+                    self._drop_oldest(item)
+            seq += 1
+            offset += memoryview(frame).nbytes
+            self._track('encrypt', self._encrypt_q)
+        self.sender.seq, self.sender.position = seq, offset
+
+    def _drop_oldest(self, item):
+        """丢掉加密队列里最老的一帧，换成新帧；被丢的序号通知发送线程跳过"""
+        try:
+            old = self._encrypt_q.get_nowait()
+        except queue.Empty:
+            old = None
+        if old is not None:
+            self.dropped += 1
+            self._put(self._send_q, (old[0], None, old[3]))
+        self._put(self._encrypt_q, item)
+
+    def _encrypt_loop(self):
+        while True:
+            item = self._get(self._encrypt_q)
+            if item is None:
+                break
+            seq, offset, frame, captured_at = item
+            parts = self.sender.seal(frame, seq, offset)
+            self._put(self._send_q, (seq, parts, captured_at))
+            self._track('send', self._send_q)
+        self._put(self._send_q, None, force=True)
+
+    def _send_loop(self, on_frame):
+        """按序号顺序发送；乱序到达的帧先暂存，被丢弃的序号直接跳过"""
+        pending = {}
+        next_seq = self.sender.seq
+        finished = 0
+        while finished < self.workers:
+            item = self._get(self._send_q)
+            if item is None:
+                finished += 1
+                continue
+            pending[item[0]] = item
+            while next_seq in pending:
+                seq, parts, captured_at = pending.pop(next_seq)
+                next_seq += 1
+                if parts is None:
+                    continue
+                self.sender.transmit(parts)
+                latency = time.perf_counter_ns() - captured_at
+                self.sent += 1
+                self.latency.record('frame', len(parts[1]), latency)
+                if on_frame is not None:
+                    on_frame(seq, latency)
+
+    def _guard(self, target, *args):
+        """线程入口：出错时记下异常并让整条流水线停下"""
+        try:
+            target(*args)
+        except _Stop:
+            pass
+        except BaseException as e:
+            if self._error is None:
+                self._error = e
+            self._stop.set()
+
+    def _put(self, q: queue.Queue, item, force: bool = False):
+        """阻塞放入；流水线停止时放弃（force 为 True 时仍尽量放入，用于结束标记）"""
+        while True:
+            if self._stop.is_set() and not force:
+                raise _Stop
+            try:
+                q.put(item, timeout=_POLL)
+                return
+            except queue.Full:
+                if force and self._stop.is_set():
+                    return
+
+    def _get(self, q: queue.Queue):
+        """阻塞取出；流水线停止时结束"""
+        while True:
+            if self._stop.is_set():
+                raise _Stop
+            try:
+                return q.get(timeout=_POLL)
+            except queue.Empty:
+                pass
+
+    def _track(self, name: str, q: queue.Queue):
+        depth = q.qsize()
+        if depth > self._max_depth[name]:
+            self._max_depth[name] = depth
+
+    def report(self) -> dict:
+        """
+        运行统计
+
+        Returns:
+            {'captured', 'sent', 'dropped', 'elapsed', 'fps',
+             'queues': {'encrypt'/'send': {'depth', 'max_depth', 'capacity'}},
+             'latency': {'p50_us', 'p99_us', 'max_us'}}
+        """
+        end = self._finished or time.perf_counter()
+        elapsed = end - self._started if self._started else 0.0
+        latency = self.latency.summary('frame')
+        return {
+            'captured': self.captured,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'elapsed': elapsed,
+            'fps': self.sent / elapsed if elapsed else 0.0,
+            'queues': {
+                name: {'depth': q.qsize(), 'max_depth': self._max_depth[name],
+                       'capacity': q.maxsize}
+                for name, q in (('encrypt', self._encrypt_q), ('send', self._send_q))
+            },
+            'latency': {k: latency[k] for k in ('p50_us', 'p99_us', 'max_us')},
+        }
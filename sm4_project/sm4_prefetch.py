@@ -0,0 +1,225 @@
+"""
+SM4-CTR 密钥流预取
+
+CTR模式的密钥流只取决于计数器，和明文无关，所以可以提前算好。
+PrefetchCTRContext 用一个后台线程把运行中计数器之后的 N 字节密钥流
+预先算进环形缓冲区，加密一帧时只剩一次XOR，把分组加密移出
+“采集 → 发送”的关键路径。
+
+预取跟不上时（欠载）当前调用会自己补算缺的那段，结果始终正确，
+只是这一帧没有享受到预取；hits/underflows 统计用来调整池大小。
+
+后台线程只引用共享的 _Pool，不引用上下文本身：忘了 finalize 的上下文被回收时，
+weakref.finalize 会通知线程退出，线程和环形缓冲区随之释放。
+"""
+import threading
+import weakref
+
+from sm4_ctrutil import xor_into
+from sm4_stats import record_call
+
+# 后台线程每次生成的最大字节数
+FILL_CHUNK = 64 * 1024
+
+
+class _Pool:
+    """上下文和后台线程共享的状态：环形缓冲区和生成/消费位置"""
+
+    def __init__(self, encryptor, size: int, offset: int):
+        self.encryptor = encryptor
+        self.size = size
+        self.chunk = max(16, min(size // 4, FILL_CHUNK) // 16 * 16)
+        self.ring = bytearray(size)
+        self.zeros = memoryview(bytes(self.chunk))
+        # 数据流中的字节位置：[use, gen) 是已生成、未消费的密钥流
+        self.gen = offset
+        self.use = offset
+        self.cond = threading.Condition()
+        self.closed = False
+
+    def stop(self):
+        """通知后台线程退出（不等待，可能在任意线程的垃圾回收中被调用）"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+def _fill(pool: _Pool):
+    """后台线程：有空位就往环形缓冲区里生成下一段密钥流"""
+    ring = memoryview(pool.ring)
+    size, chunk = pool.size, pool.chunk
+    while True:
+        with pool.cond:
+            while not pool.closed and pool.gen - pool.use > size - chunk:
+                pool.cond.wait()
+            if pool.closed:
+                return
+            # 调用方欠载时会越过 gen，直接从它消费到的位置继续
+            start = pool.gen = max(pool.gen, pool.use)
+
+        # 在锁外生成：[start, start+chunk) 在环中对应的位置没有未消费的数据
+        idx = start % size
+        first = min(chunk, size - idx)
+        # 用内部接口：后台生成只计入 keystream 阶段，不算作一次调用
+        pool.encryptor._encrypt_into(pool.zeros[:first], ring[idx:idx + first], start)
+        if first < chunk:
+            pool.encryptor._encrypt_into(pool.zeros[first:], ring[:chunk - first], start + first)
+
+        with pool.cond:
+            pool.gen = max(start + chunk, pool.use)
+            pool.cond.notify_all()
+
+
+class PrefetchCTRContext:
+    """
+    带密钥流预取池的CTR流式上下文
+
+    接口与 SM4CTRContext 相同（update / update_into / finalize / position），
+    通常通过 SM4Encryptor.stream_context(prefetch=...) 创建。
+    """
+
+    def __init__(self, encryptor, pool_size: int, offset: int = 0):
+        """
+        Args:
+            encryptor: 提供密钥、IV和后端的 SM4Encryptor
+            pool_size: 预取池大小（字节），向下取整到16的倍数
+            offset: 起始字节偏移
+
+        Raises:
+            ValueError: 池太小或 offset 为负数
+        """
+        if pool_size < 16:
+            raise ValueError(f"预取池至少16字节，但提供了 {pool_size}")
+        if offset < 0:
+            raise ValueError(f"偏移量不能为负数: {offset}")
+
+        self._encryptor = encryptor
+        self.pool_size = pool_size // 16 * 16
+        self._pool = _Pool(encryptor, self.pool_size, offset)
+        self._finalized = False
+
+        self.hits = 0              # 密钥流全部来自预取池的调用次数
+        self.underflows = 0        # 预取不足、需要当场补算的调用次数
+        self.underflow_bytes = 0   # 当场补算的字节数
+
+        self._worker = threading.Thread(target=_fill, args=(self._pool,),
+                                        name='sm4-prefetch', daemon=True)
+        self._worker.start()
+        self._stop = weakref.finalize(self, self._pool.stop)
+
+    @property
+    def position(self) -> int:
+        """当前在数据流中的字节偏移"""
+        return self._pool.use
+
+    @property
+    def available(self) -> int:
+        """预取池中可以直接使用的密钥流字节数"""
+        pool = self._pool
+        with pool.cond:
+            return max(pool.gen - pool.use, 0)
+
+    def metrics(self) -> dict:
+        """
+        预取统计
+
+        Returns:
+            包含 pool_size、available、hits、underflows、underflow_bytes 的字典
+        """
+        pool = self._pool
+        with pool.cond:
+            return {
+                'pool_size': self.pool_size,
+                'available': max(pool.gen - pool.use, 0),
+                'hits': self.hits,
+                'underflows': self.underflows,
+                'underflow_bytes': self.underflow_bytes,
+            }
+
+    def update(self, data: bytes) -> bytes:
+        """
+        加密/解密下一段数据
+
+        Args:
+            data: 任意长度的明文或密文
+
+        Returns:
+            等长的密文或明文
+        """
+        out = bytearray(len(data))
+        self.update_into(data, out)
+        return bytes(out)
+
+    def update_into(self, src, dst) -> int:
+        """
+        加密/解密下一段数据并写入 dst（可与 src 相同）
+
+        Args:
+            src: 明文或密文缓冲区
+            dst: 可写的输出缓冲区，长度不小于 src
+
+        Returns:
+            写入的字节数
+
+        Raises:
+            ValueError: 上下文已经 finalize，或 dst 太短/只读
+        """
+        stats = self._encryptor.stats
+        if stats is not None:
+            return record_call(stats, 'update', memoryview(src).nbytes, self._update_into, src, dst)
+        return self._update_into(src, dst)
+
+    def _update_into(self, src, dst) -> int:
+        if self._finalized:
+            raise ValueError("流式上下文已结束，不能继续 update")
+        src = memoryview(src).cast('B')
+        dst = memoryview(dst).cast('B')
+        n = len(src)
+        if dst.readonly or len(dst) < n:
+            raise ValueError("输出缓冲区只读或太小")
+
+        pool = self._pool
+        with pool.cond:
+            start = pool.use
+            take = min(max(pool.gen - start, 0), n)
+            # 池中已有的部分：持锁XOR，防止后台线程覆盖正在读的区域
+            ring = memoryview(pool.ring)
+            done = 0
+            while done < take:
+                idx = (start + done) % pool.size
+                m = min(take - done, pool.size - idx)
+                xor_into(src[done:done + m], ring[idx:idx + m], dst[done:done + m])
+                done += m
+            pool.use = start + n
+            if take == n:
+                self.hits += 1
+            else:
+                self.underflows += 1
+                self.underflow_bytes += n - take
+            pool.cond.notify_all()
+
+        if take < n:
+            self._encryptor._encrypt_into(src[take:], dst[take:n], start + take)
+        return n
+
+    def finalize(self) -> bytes:
+        """
+        结束上下文并停止后台线程
+
+        Returns:
+            b''
+        """
+        self._finalized = True
+        self.close()
+        return b''
+
+    def close(self):
+        """停止后台预取线程"""
+        self._stop()
+        self._worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finalize()
@@ -0,0 +1,212 @@
+"""
+多会话加密管理（一路视频分发给多个接收方）
+
+每个接收方有自己的密钥/IV，语义与 video_encrypt_demo 相同：每个会话是一条
+独立的CTR流，帧按顺序接在流的后面。SessionManager 把同一帧一次加密给所有会话：
+
+-   Session 用 __slots__，只保存IV、流位置和统计，几十上百个会话也很紧凑；
+-   轮密钥/后端密钥状态按密钥共享，同一密钥的多个会话只扩展一次；
+-   numpy 后端下，所有会话的密钥流在一次向量化计算中生成
+    （sm4_vectorized.multi_keystream），再分别与帧XOR；
+    其他后端按会话逐个调用，但共享密钥状态、不创建 SM4Encryptor。
+
+stats() 给出每个会话和总体的字节数、帧数和吞吐。
+"""
+import time
+
+import sm4_backends
+from SM4_Encryptor import expand_key
+
+_MASK128 = (1 << 128) - 1
+
+# 批量计算时一次处理的总块数上限（会话数 × 每会话块数），限制中间数组内存
+BATCH_BLOCKS = 65536
+
+
+class Session:
+    """一个接收方的加密会话"""
+
+    __slots__ = ('session_id', 'key', 'iv', 'position', 'frames', 'bytes', 'seconds', '_counter')
+
+    def __init__(self, session_id, key: bytes, iv: bytes):
+        self.session_id = session_id
+        self.key = key
+        self.iv = iv
+        self.position = 0     # 会话流中的字节偏移（下一帧从这里开始）
+        self.frames = 0
+        self.bytes = 0
+        self.seconds = 0.0    # 分摊到本会话的加密耗时
+        self._counter = int.from_bytes(iv, 'big')
+
+    def counter_at(self, position: int) -> int:
+        """流中 position 所在块的计数器"""
+        return (self._counter + position // 16) & _MASK128
+
+
+class SessionManager:
+    """管理多个会话，把一帧一次加密给所有会话"""
+
+    def __init__(self, backend: str = None):
+        """
+        Args:
+            backend: 同 SM4Encryptor；为 'numpy' 时跨会话批量生成密钥流
+
+        Raises:
+            ValueError: 后端不可用
+        """
+        self.backend = backend or sm4_backends.default_backend_name()
+        self._backend = sm4_backends.get_backend(self.backend)
+        self.batched = self.backend == 'numpy'
+        self._sessions = {}
+        self._keys = {}       # 密钥 -> [轮密钥, 后端状态, 引用的会话数]
+        self.frames = 0
+        self.bytes = 0        # 所有会话累计加密的字节数（含已移除的会话）
+        self.seconds = 0.0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def get(self, session_id) -> Session:
+        """按ID取会话，不存在返回 None"""
+        return self._sessions.get(session_id)
+
+    def add(self, session_id, key: bytes, iv: bytes) -> Session:
+        """
+        加入一个会话
+
+        Args:
+            session_id: 会话ID（可哈希）
+            key: 16字节密钥
+            iv: 16字节IV
+
+        Returns:
+            新建的 Session
+
+        Raises:
+            ValueError: ID重复，或密钥/IV长度不正确
+        """
+        if session_id in self._sessions:
+            raise ValueError(f"会话已存在: {session_id!r}")
+        if len(key) != 16:
+            raise ValueError(f"SM4密钥必须是16字节(128位)，但提供了 {len(key)} 字节")
+        if len(iv) != 16:
+            raise ValueError(f"IV必须是16字节，但提供了 {len(iv)} 字节")
+        key = bytes(key)
+        entry = self._keys.get(key)
+        if entry is None:
+            rk = expand_key(key)
+            entry = self._keys[key] = [rk, self._backend.prepare(key, rk), 0]
+        entry[2] += 1
+        session = self._sessions[session_id] = Session(session_id, key, bytes(iv))
+        return session
+
+    def remove(self, session_id):
+        """
+        移除会话，最后一个使用某密钥的会话移除时释放该密钥的状态
+
+        Raises:
+            KeyError: 会话不存在
+        """
+        session = self._sessions.pop(session_id)
+        entry = self._keys[session.key]
+        entry[2] -= 1
+        if not entry[2]:
+            del self._keys[session.key]
+
+    def encrypt_frame(self, frame) -> dict:
+        """
+        把同一帧加密给所有会话，每个会话的流位置前进 len(frame)
+
+        Args:
+            frame: 明文帧（支持缓冲区协议的对象）
+
+        Returns:
+            {会话ID: 密文}；没有会话时为空字典
+        """
+        data = memoryview(frame).cast('B')
+        n = len(data)
+        sessions = list(self._sessions.values())
+        if not sessions:
+            return {}
+        start = time.perf_counter()
+        if self.batched:
+            outputs = self._encrypt_batched(sessions, data)
+        else:
+            outputs = {}
+            for s in sessions:
+                skip = s.position % 16
+                state = self._keys[s.key][1]
+                if skip:
+                    out = self._backend.ctr_xor(state, s.counter_at(s.position),
+                                                bytes(skip) + bytes(data))[skip:]
+                else:
+                    out = self._backend.ctr_xor(state, s.counter_at(s.position), data)
+                outputs[s.session_id] = out
+        elapsed = time.perf_counter() - start
+
+        self.frames += 1
+        self.bytes += n * len(sessions)
+        self.seconds += elapsed
+        share = elapsed / len(sessions) if sessions else 0.0
+        for s in sessions:
+            s.position += n
+            s.frames += 1
+            s.bytes += n
+            s.seconds += share
+        return outputs
+
+    def _encrypt_batched(self, sessions: list, data: memoryview) -> dict:
+        """所有会话的密钥流一次向量化生成，按块对齐分段以限制内存"""
+        import numpy as np
+        import sm4_vectorized
+        n = len(data)
+        out = np.empty((len(sessions), n), dtype=np.uint8)
+        src = np.frombuffer(data, dtype=np.uint8)
+        rks = [self._keys[s.key][0] for s in sessions]
+        step = max(1, BATCH_BLOCKS // max(len(sessions), 1)) * 16
+        for begin in range(0, n, step):
+            end = min(begin + step, n)
+            # 各会话的流位置可能不在块边界上，多算一块再按各自的块内偏移截取
+            skips = [(s.position + begin) % 16 for s in sessions]
+            nblocks = (max(skips) + end - begin + 15) // 16
+            ks = sm4_vectorized.multi_keystream(
+                rks, [s.counter_at(s.position + begin) for s in sessions], nblocks)
+            for i, skip in enumerate(skips):
+                np.bitwise_xor(src[begin:end], ks[i, skip:skip + end - begin],
+                               out=out[i, begin:end])
+        return {s.session_id: out[i].tobytes() for i, s in enumerate(sessions)}
+
+    def stats(self) -> dict:
+        """
+        吞吐统计
+
+        Returns:
+            {'sessions': {会话ID: {frames, bytes, seconds, mb_per_s}},
+             'aggregate': {sessions, frames, bytes, seconds, mb_per_s}}
+            其中会话的 seconds 是分摊的加密耗时，总体 seconds 是 encrypt_frame 的总耗时
+        """
+        def rate(nbytes, seconds):
+            return nbytes / (1024 * 1024) / seconds if seconds else 0.0
+
+        per_session = {
+            s.session_id: {
+                'frames': s.frames,
+                'bytes': s.bytes,
+                'seconds': s.seconds,
+                'mb_per_s': rate(s.bytes, s.seconds),
+            }
+            for s in self._sessions.values()
+        }
+        return {
+            'sessions': per_session,
+            'aggregate': {
+                'sessions': len(self._sessions),
+                'frames': self.frames,
+                'bytes': self.bytes,
+                'seconds': self.seconds,
+                'mb_per_s': rate(self.bytes, self.seconds),
+            },
+        }
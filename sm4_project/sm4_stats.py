@@ -0,0 +1,189 @@
+"""
+SM4 热路径统计（可选）
+
+给 SM4Encryptor(..., stats=CipherStats()) 传入统计对象后，加解密会记录：
+
+-   按操作（encrypt / encrypt_at / encrypt_into / update / frame_encrypt ...）分别统计
+    调用次数、字节数，以及每次调用耗时的直方图（可求 p50/p99）；
+-   按阶段累计耗时：
+        key_setup   构造加密器（密钥扩展 + 后端准备）
+        keystream   后端CTR调用（计数器生成、分组加密和XOR在后端内部一次完成）
+        overhead    调用总耗时减去后端耗时：缓冲区转换、块内偏移处理、拷贝等
+        ghash       GCM 的 GHASH
+-   后端生成的密钥流字节数和分组数（keystream_bytes / keystream_blocks）。块内偏移
+    和不足一块的尾部按整块计，可能比调用方传入的字节数多；调用方的字节数看
+    summary(op)['bytes']。
+
+不传 stats 时每次调用只多一次 `is None` 判断。add_callback 注册的回调会在
+每次记录操作时被调用，可用于实时上报。
+"""
+import threading
+import time
+
+# 直方图：每个2的幂区间再分成 2^_SUB_BITS 个子桶（相对误差约 25%）
+_SUB_BITS = 2
+_SUB = 1 << _SUB_BITS
+
+
+def _bucket(ns: int) -> int:
+    """耗时（纳秒）所在的直方图桶"""
+    if ns < 2 * _SUB:
+        return max(ns, 0)
+    shift = ns.bit_length() - _SUB_BITS - 1
+    return ((shift + 1) << _SUB_BITS) | ((ns >> shift) & (_SUB - 1))
+
+
+def _bucket_upper(index: int) -> int:
+    """桶内的最大耗时（纳秒）"""
+    if index < 2 * _SUB:
+        return index
+    shift = (index >> _SUB_BITS) - 1
+    return ((_SUB | (index & (_SUB - 1))) << shift) + (1 << shift) - 1
+
+
+def record_call(stats: 'CipherStats', op: str, nbytes: int, func, *args):
+    """调用 func(*args)，把耗时记入 stats 的 op 操作，并算出其中非后端部分的耗时"""
+    inner = stats.keystream_ns()
+    start = time.perf_counter_ns()
+    result = func(*args)
+    stats.record(op, nbytes, time.perf_counter_ns() - start, stats.keystream_ns() - inner)
+    return result
+
+
+class _OpStats:
+    """单个操作的计数和耗时直方图"""
+
+    __slots__ = ('calls', 'bytes', 'ns', 'histogram')
+
+    def __init__(self):
+        self.calls = 0
+        self.bytes = 0
+        self.ns = 0
+        self.histogram = {}   # 桶 -> 次数
+
+    def percentile(self, p: float) -> int:
+        """耗时的第 p 百分位（纳秒，按桶上界估计）"""
+        if not self.calls:
+            return 0
+        rank = p / 100 * self.calls
+        seen = 0
+        for index in sorted(self.histogram):
+            seen += self.histogram[index]
+            if seen >= rank:
+                return _bucket_upper(index)
+        return _bucket_upper(max(self.histogram))
+
+
+class CipherStats:
+    """加解密统计，可在多个加密器/线程之间共享"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()   # 本线程累计的后端耗时，用来算 overhead
+        self._callbacks = []
+        self.reset()
+
+    def reset(self):
+        """清零所有统计，重新开始计时"""
+        with self._lock:
+            self.started = time.perf_counter()
+            self.keystream_bytes = 0
+            self.keystream_blocks = 0
+            self.stages = {}
+            self._ops = {}
+
+    def add_callback(self, callback):
+        """
+        注册回调，每次记录操作后调用 callback(op, nbytes, ns)
+
+        回调在加解密所在的线程里同步执行，应尽量轻量。
+        """
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        """注销回调"""
+        self._callbacks.remove(callback)
+
+    def add_stage(self, stage: str, ns: int):
+        """累计某个阶段的耗时（纳秒）"""
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0) + ns
+
+    def add_keystream(self, nbytes: int, ns: int):
+        """记录一次后端CTR调用，nbytes 是这次生成的密钥流字节数"""
+        self._local.keystream_ns = getattr(self._local, 'keystream_ns', 0) + ns
+        with self._lock:
+            self.stages['keystream'] = self.stages.get('keystream', 0) + ns
+            self.keystream_bytes += nbytes
+            self.keystream_blocks += (nbytes + 15) // 16
+
+    def keystream_ns(self) -> int:
+        """本线程到目前为止的后端耗时，配合 record 的 inner_ns 计算 overhead"""
+        return getattr(self._local, 'keystream_ns', 0)
+
+    def record(self, op: str, nbytes: int, ns: int, inner_ns: int = None):
+        """
+        记录一次操作
+
+        Args:
+            op: 操作名
+            nbytes: 处理的字节数
+            ns: 调用耗时（纳秒）
+            inner_ns: 其中后端CTR的耗时；给出时差值计入 overhead 阶段
+        """
+        with self._lock:
+            s = self._ops.get(op)
+            if s is None:
+                s = self._ops[op] = _OpStats()
+            s.calls += 1
+            s.bytes += nbytes
+            s.ns += ns
+            index = _bucket(ns)
+            s.histogram[index] = s.histogram.get(index, 0) + 1
+            if inner_ns is not None:
+                self.stages['overhead'] = self.stages.get('overhead', 0) + max(ns - inner_ns, 0)
+        for callback in self._callbacks:
+            callback(op, nbytes, ns)
+
+    def ops(self) -> tuple:
+        """记录过的操作名"""
+        with self._lock:
+            return tuple(self._ops)
+
+    def summary(self, op: str) -> dict:
+        """
+        某个操作的汇总
+
+        Returns:
+            calls、bytes、calls_per_s / mb_per_s（按统计开始以来的墙钟时间）、
+            busy_mb_per_s（按调用耗时）、p50_us、p99_us、max_us
+        """
+        with self._lock:
+            s = self._ops.get(op) or _OpStats()
+            elapsed = time.perf_counter() - self.started
+            return {
+                'calls': s.calls,
+                'bytes': s.bytes,
+                'calls_per_s': s.calls / elapsed if elapsed else 0.0,
+                'mb_per_s': s.bytes / (1024 * 1024) / elapsed if elapsed else 0.0,
+                'busy_mb_per_s': s.bytes / (1024 * 1024) / (s.ns / 1e9) if s.ns else 0.0,
+                'p50_us': s.percentile(50) / 1000,
+                'p99_us': s.percentile(99) / 1000,
+                'max_us': _bucket_upper(max(s.histogram)) / 1000 if s.histogram else 0.0,
+            }
+
+    def snapshot(self) -> dict:
+        """
+        全部统计
+
+        Returns:
+            {'keystream_bytes', 'keystream_blocks', 'elapsed', 'stages': {阶段: 纳秒}, 'ops': {操作: summary}}
+        """
+        result = {
+            'keystream_bytes': self.keystream_bytes,
+            'keystream_blocks': self.keystream_blocks,
+            'elapsed': time.perf_counter() - self.started,
+            'stages': dict(self.stages),
+        }
+        result['ops'] = {op: self.summary(op) for op in self.ops()}
+        return result
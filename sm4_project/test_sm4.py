@@ -1,10 +1,16 @@
 """SM4加密模块测试类
 (仅测试CTR模式)
 """
+import sys
 import unittest
+import contextlib
+import io
 import os
+import tempfile
 import time
 from SM4_Encryptor import SM4Encryptor, encrypt, decrypt
+import SM4_Encryptor as sm4_module
+import sm4_backends
 
 class TestSM4Encryptor(unittest.TestCase):
     """SM4加密器测试用例 (CTR模式)"""
@@ -95,26 +101,17 @@ class TestSM4Encryptor(unittest.TestCase):
         self.assertEqual(plaintext, decrypted_bytes, "快捷函数解密应正确")
         print("✓ 验证成功：明文与解密后的文本一致。")
 
-    def test_large_data_performance(self):
-        """[测试5] 大数据加密性能（10MB）"""
-        print("\n[测试5] 大数据性能测试（10MB）- CTR模式")
+    def test_large_data(self):
+        """[测试5] 大数据加解密（10MB，性能测量见 benchmark_sm4.py）"""
+        print("\n[测试5] 大数据加解密（10MB）- CTR模式")
         large_data = os.urandom(10 * 1024 * 1024)  # 10MB
 
-        # CTR模式
         encryptor_ctr = SM4Encryptor(self.key, iv=self.iv)
-
-        start = time.time()
         encrypted_ctr = encryptor_ctr.encrypt(large_data)
-        ctr_encrypt_time = time.time() - start
-
-        start = time.time()
         decrypted_ctr = encryptor_ctr.decrypt(encrypted_ctr)
-        ctr_decrypt_time = time.time() - start
-
-        print(f"  加密: {ctr_encrypt_time:.3f}秒 ({len(large_data)/(1024*1024)/ctr_encrypt_time:.2f} MB/s)")
-        print(f"  解密: {ctr_decrypt_time:.3f}秒 ({len(large_data)/(1024*1024)/ctr_decrypt_time:.2f} MB/s)")
 
-        self.assertEqual(large_data[:1000], decrypted_ctr[:1000], "CTR大数据验证")
+        self.assertEqual(len(encrypted_ctr), len(large_data))
+        self.assertEqual(large_data, decrypted_ctr, "CTR大数据验证")
 
     def test_different_iv_same_data(self):
         """[测试6] 相同数据 + 不同IV = 不同密文"""
@@ -153,6 +150,1284 @@ class TestSM4Encryptor(unittest.TestCase):
             SM4Encryptor(self.key, iv=b"short")
         print("✓ 正确拒绝了短IV")
 
+
+class TestSM4Core(unittest.TestCase):
+    """纯Python查表SM4核心测试用例"""
+
+    def test_standard_vector(self):
+        """[测试35] GB/T 32907 标准测试向量（单块加解密）"""
+        print("\n[测试35] SM4核心 - 标准测试向量")
+        import sm4_core
+        key = bytes.fromhex("0123456789abcdeffedcba9876543210")
+        cipher = bytes.fromhex("681edf34d206965e86b3e94f536e4246")
+        self.assertEqual(cipher, sm4_core.encrypt_block(key, key))
+        self.assertEqual(key, sm4_core.decrypt_block(key, cipher))
+
+    def test_multi_block(self):
+        """[测试36] 多块接口与逐块结果一致"""
+        print("\n[测试36] SM4核心 - 多块接口")
+        import sm4_core
+        key = os.urandom(16)
+        rk = sm4_core.expand_key(key)
+        data = os.urandom(16 * 20)
+        out = sm4_core.encrypt_blocks(rk, data)
+        for i in range(0, len(data), 16):
+            self.assertEqual(sm4_core.encrypt_block(key, data[i:i + 16]), out[i:i + 16])
+        self.assertEqual(data, sm4_core.decrypt_blocks(rk, out))
+        with self.assertRaises(ValueError):
+            sm4_core.encrypt_blocks(rk, b"not a block")
+
+    def test_matches_gmssl(self):
+        """[测试37] 与 gmssl 的实现交叉验证"""
+        print("\n[测试37] SM4核心 - 与gmssl交叉验证")
+        import sm4_core
+        try:
+            from gmssl import sm4
+        except ImportError:
+            self.skipTest("未安装gmssl")
+        for _ in range(10):
+            key, block = os.urandom(16), os.urandom(16)
+            reference = sm4.CryptSM4()
+            reference.set_key(key, sm4.SM4_ENCRYPT)
+            self.assertEqual(tuple(reference.sk), sm4_core.expand_key(key))
+            self.assertEqual(reference.crypt_ecb(block)[:16], sm4_core.encrypt_block(key, block))
+
+
+class TestStreamContext(unittest.TestCase):
+    """流式CTR上下文测试用例"""
+
+    def setUp(self):
+        self.key = b"0123456789abcdef"
+        self.iv = b"fedcba9876543210"
+
+    def test_chunked_equals_one_shot(self):
+        """[测试12] 任意切分的流式加密与一次性加密结果相同"""
+        print("\n[测试12] 流式上下文 - 任意切分")
+        data = os.urandom(5000)
+        encryptor = SM4Encryptor(self.key, self.iv)
+        expected = encryptor.encrypt(data)
+
+        for sizes in ([1] * 40, [15, 1, 16, 17, 3], [7, 100, 33, 1000]):
+            ctx = encryptor.stream_context()
+            out, pos = bytearray(), 0
+            while pos < len(data):
+                for size in sizes:
+                    out += ctx.update(data[pos:pos + size])
+                    pos += size
+            out += ctx.finalize()
+            self.assertEqual(expected, bytes(out), f"切分方式 {sizes}")
+
+    def test_decrypt_across_frames(self):
+        """[测试13] 连续帧使用不同密钥流，接收方按序解密"""
+        print("\n[测试13] 流式上下文 - 连续帧")
+        frames = [os.urandom(50) for _ in range(5)]
+        sender = SM4Encryptor(self.key, self.iv).stream_context()
+        receiver = SM4Encryptor(self.key, self.iv).stream_context()
+        encrypted = [sender.update(f) for f in frames]
+        self.assertNotEqual(encrypted[0][:16], encrypted[1][:16])
+        self.assertEqual(frames, [receiver.update(e) for e in encrypted])
+        self.assertEqual(receiver.position, 250)
+
+    def test_update_after_finalize(self):
+        """[测试14] finalize 之后不能继续 update"""
+        print("\n[测试14] 流式上下文 - finalize")
+        ctx = SM4Encryptor(self.key, self.iv).stream_context()
+        self.assertEqual(b'', ctx.finalize())
+        with self.assertRaises(ValueError):
+            ctx.update(b"more")
+
+
+class TestRandomAccess(unittest.TestCase):
+    """随机访问（按偏移加解密）测试用例"""
+
+    def setUp(self):
+        self.key = b"0123456789abcdef"
+        self.iv = b"fedcba9876543210"
+        self.encryptor = SM4Encryptor(self.key, self.iv)
+        self.plain = os.urandom(3000)
+        self.cipher = self.encryptor.encrypt(self.plain)
+
+    def test_decrypt_at(self):
+        """[测试15] 从任意偏移解密一段密文"""
+        print("\n[测试15] 随机访问 - decrypt_at")
+        for offset, length in ((0, 10), (5, 11), (16, 16), (17, 100), (2999, 1), (1234, 1766)):
+            piece = self.cipher[offset:offset + length]
+            self.assertEqual(self.plain[offset:offset + length],
+                             self.encryptor.decrypt_at(piece, offset), f"偏移 {offset}")
+        with self.assertRaises(ValueError):
+            self.encryptor.decrypt_at(b"x", -1)
+
+    def test_context_with_offset(self):
+        """[测试16] 流式上下文从中间偏移开始"""
+        print("\n[测试16] 随机访问 - 上下文偏移")
+        ctx = self.encryptor.stream_context(offset=1001)
+        out = ctx.update(self.cipher[1001:1010]) + ctx.update(self.cipher[1010:2000])
+        self.assertEqual(self.plain[1001:2000], out)
+
+    def test_seekable_reader(self):
+        """[测试17] 可 seek 的解密读取器"""
+        print("\n[测试17] 随机访问 - SM4CTRReader")
+        from sm4_io import SM4CTRReader
+        raw = io.BytesIO(b"HEADER" + self.cipher)
+        raw.seek(6)
+        reader = SM4CTRReader(raw, self.encryptor)
+        self.assertEqual(self.plain[:100], reader.read(100))
+        reader.seek(2500)
+        self.assertEqual(self.plain[2500:2600], reader.read(100))
+        reader.seek(-50, io.SEEK_END)
+        self.assertEqual(self.plain[-50:], reader.read())
+        self.assertEqual(3000, reader.tell())
+
+
+class TestParallel(unittest.TestCase):
+    """并行CTR测试用例"""
+
+    def setUp(self):
+        self.key = b"0123456789abcdef"
+        self.iv = b"\xff" * 15 + b"\xfa"  # 段之间跨越128位回绕
+
+    def test_parallel_matches_serial(self):
+        """[测试18] 并行结果与串行完全一致"""
+        print("\n[测试18] 并行CTR - 与串行一致")
+        data = os.urandom(5000)
+        for backend in sm4_backends.available_backends():
+            expected = SM4Encryptor(self.key, self.iv, backend=backend).encrypt(data)
+            for workers in (2, 3, 7):
+                encryptor = SM4Encryptor(self.key, self.iv, backend=backend,
+                                         workers=workers, parallel_threshold=100)
+                self.assertEqual(expected, encryptor.encrypt(data), f"{backend} x{workers}")
+                self.assertEqual(expected[:17], encryptor.encrypt(data[:17]))
+
+    def test_quick_functions_parallel(self):
+        """[测试19] 快捷函数的并行参数"""
+        print("\n[测试19] 并行CTR - 快捷函数")
+        data = os.urandom(sm4_module.PARALLEL_THRESHOLD + 100)
+        encrypted = encrypt(data, self.key, self.iv, workers=2)
+        self.assertEqual(encrypt(data, self.key, self.iv), encrypted)
+        self.assertEqual(data, decrypt(encrypted, self.key, self.iv, workers=2))
+
+    def test_invalid_workers(self):
+        """[测试20] 非法并发数"""
+        print("\n[测试20] 并行CTR - 非法并发数")
+        with self.assertRaises(ValueError):
+            SM4Encryptor(self.key, self.iv, workers=0)
+
+
+class TestEncryptInto(unittest.TestCase):
+    """零拷贝 encrypt_into / update_into 测试用例"""
+
+    def setUp(self):
+        self.key = b"0123456789abcdef"
+        self.iv = b"fedcba9876543210"
+        self.encryptor = SM4Encryptor(self.key, self.iv)
+        self.plain = os.urandom(1000)
+        self.cipher = self.encryptor.encrypt(self.plain)
+
+    def test_encrypt_into_buffers(self):
+        """[测试23] 写入各种缓冲区，包括原地加密"""
+        print("\n[测试23] 零拷贝 - encrypt_into")
+        dst = bytearray(1000)
+        self.assertEqual(1000, self.encryptor.encrypt_into(self.plain, dst))
+        self.assertEqual(self.cipher, bytes(dst))
+
+        buf = bytearray(self.plain)
+        self.encryptor.encrypt_into(memoryview(buf), buf)
+        self.assertEqual(self.cipher, bytes(buf))
+
+        big = bytearray(1100)
+        self.encryptor.decrypt_into(memoryview(self.cipher)[37:], memoryview(big)[50:], offset=37)
+        self.assertEqual(self.plain[37:], bytes(big[50:1013]))
+
+    def test_encrypt_into_python_backend(self):
+        """[测试24] 纯Python后端的原地加密"""
+        print("\n[测试24] 零拷贝 - 纯Python后端")
+        buf = bytearray(self.plain)
+        SM4Encryptor(self.key, self.iv, backend='python').encrypt_into(buf, buf, offset=0)
+        self.assertEqual(self.cipher, bytes(buf))
+
+    @unittest.skipUnless('openssl' in sm4_backends.available_backends(), "OpenSSL 不支持 SM4")
+    def test_encrypt_into_openssl_backend(self):
+        """[测试65] OpenSSL后端原地加密经由暂存区，不分配整帧大小的结果"""
+        print("\n[测试65] 零拷贝 - OpenSSL后端")
+        import tracemalloc
+        encryptor = SM4Encryptor(self.key, self.iv, backend='openssl')
+        data = os.urandom(1024 * 1024 + 37)      # 跨多个暂存区分段，且不按块对齐
+        buf = bytearray(data)
+        tracemalloc.start()
+        try:
+            encryptor.encrypt_into(buf, buf)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(encryptor.encrypt(data), bytes(buf))
+        self.assertLess(peak, 256 * 1024)
+
+    def test_encrypt_into_invalid_dst(self):
+        """[测试25] 输出缓冲区太小或只读"""
+        print("\n[测试25] 零拷贝 - 非法输出缓冲区")
+        with self.assertRaises(ValueError):
+            self.encryptor.encrypt_into(self.plain, bytearray(10))
+        with self.assertRaises(ValueError):
+            self.encryptor.encrypt_into(self.plain, bytes(1000))
+
+    def test_update_into(self):
+        """[测试26] 流式上下文原地处理连续帧"""
+        print("\n[测试26] 零拷贝 - update_into")
+        ctx = self.encryptor.stream_context()
+        buf = bytearray(self.plain)
+        view = memoryview(buf)
+        for start, end in ((0, 7), (7, 300), (300, 333), (333, 1000)):
+            ctx.update_into(view[start:end], view[start:end])
+        self.assertEqual(self.cipher, bytes(buf))
+
+
+class TestStreamPipeline(unittest.TestCase):
+    """encrypt_stream 生成器和 SM4CTRWriter 测试用例"""
+
+    def setUp(self):
+        self.encryptor = SM4Encryptor(b"0123456789abcdef", b"fedcba9876543210")
+        self.plain = os.urandom(300_017)
+        self.cipher = self.encryptor.encrypt(self.plain)
+
+    def test_encrypt_stream_sources(self):
+        """[测试50] 文件对象、列表和生成器分块加密与整段一致"""
+        print("\n[测试50] 流水线 - encrypt_stream")
+        chunks = list(self.encryptor.encrypt_stream(io.BytesIO(self.plain), chunk_size=65536))
+        self.assertEqual(self.cipher, b''.join(chunks))
+        self.assertTrue(all(len(c) <= 65536 for c in chunks))
+
+        pieces = [self.plain[:5], self.plain[5:100_000], self.plain[100_000:]]
+        chunks = list(self.encryptor.encrypt_stream(pieces, chunk_size=4096))
+        self.assertEqual(self.cipher, b''.join(chunks))
+        self.assertTrue(all(len(c) <= 4096 for c in chunks))
+
+        gen = (self.cipher[i:i + 999] for i in range(0, len(self.cipher), 999))
+        self.assertEqual(self.plain, b''.join(sm4_module.decrypt_stream(
+            gen, b"0123456789abcdef", b"fedcba9876543210")))
+
+        tail = b''.join(self.encryptor.encrypt_stream([self.plain[1000:]], offset=1000))
+        self.assertEqual(self.cipher[1000:], tail)
+        with self.assertRaises(ValueError):
+            next(self.encryptor.encrypt_stream([b'x'], chunk_size=0))
+
+    def test_writer_copyfileobj(self):
+        """[测试51] SM4CTRWriter 配合 shutil.copyfileobj 往返"""
+        print("\n[测试51] 流水线 - SM4CTRWriter")
+        import shutil
+        from sm4_io import SM4CTRReader, SM4CTRWriter
+        out = io.BytesIO(b'HEAD')
+        out.seek(4)
+        writer = SM4CTRWriter(out, self.encryptor, chunk_size=10_000)
+        shutil.copyfileobj(io.BytesIO(self.plain), writer)
+        self.assertEqual(len(self.plain), writer.tell())
+        self.assertEqual(b'HEAD' + self.cipher, out.getvalue())
+
+        # 回到中间重写一段，密文与整段加密一致
+        writer.seek(12_345)
+        writer.write(self.plain[12_345:20_000])
+        self.assertEqual(b'HEAD' + self.cipher, out.getvalue())
+
+        out.seek(4)
+        restored = io.BytesIO()
+        shutil.copyfileobj(SM4CTRReader(out, self.encryptor), restored)
+        self.assertEqual(self.plain, restored.getvalue())
+
+        # 底层流先关闭后，flush/close（析构时也会调用）不再去 flush 它
+        out.close()
+        writer.flush()
+        writer.close()
+
+
+class TestBatch(unittest.TestCase):
+    """encrypt_many 批量小消息测试用例"""
+
+    def setUp(self):
+        self.key = b"0123456789abcdef"
+        sizes = (0, 1, 15, 16, 17, 64, 100, 1000)
+        self.items = [(os.urandom(16), os.urandom(sizes[i % len(sizes)])) for i in range(200)]
+        # 计数器低64位进位、128位回绕
+        self.items.append((bytes(7) + b'\x01' + b'\xff' * 8, os.urandom(100)))
+        self.items.append((b'\xff' * 16, os.urandom(100)))
+
+    def test_matches_single_messages(self):
+        """[测试52] 批量结果与逐条 encrypt 一致（各后端、等长/不等长、分批）"""
+        print("\n[测试52] 批量小消息 - encrypt_many")
+        import sm4_batch
+        expected = [encrypt(data, self.key, iv) for iv, data in self.items]
+        for backend in sm4_backends.available_backends():
+            self.assertEqual(expected, sm4_batch.encrypt_many(self.key, self.items, backend))
+        uniform = [(iv, os.urandom(33)) for iv, _ in self.items]
+        encrypted = sm4_batch.encrypt_many(self.key, uniform)
+        self.assertEqual([encrypt(data, self.key, iv) for iv, data in uniform], encrypted)
+        self.assertEqual([data for _, data in uniform], sm4_batch.decrypt_many(
+            self.key, [(iv, ct) for (iv, _), ct in zip(uniform, encrypted)]))
+
+        original = sm4_batch.BATCH_BLOCKS
+        sm4_batch.BATCH_BLOCKS = 7
+        try:
+            self.assertEqual(expected, sm4_batch.encrypt_many(self.key, self.items))
+        finally:
+            sm4_batch.BATCH_BLOCKS = original
+
+    def test_invalid_input(self):
+        """[测试53] 空列表、错误的密钥和IV"""
+        print("\n[测试53] 批量小消息 - 非法输入")
+        from sm4_batch import encrypt_many
+        self.assertEqual([], encrypt_many(self.key, []))
+        with self.assertRaises(ValueError):
+            encrypt_many(b"short", self.items)
+        with self.assertRaises(ValueError):
+            encrypt_many(self.key, self.items + [(b"short", b"data")])
+        # 长度错误但总和恰好是16的倍数
+        with self.assertRaises(ValueError):
+            encrypt_many(self.key, [(b"a" * 15, b"data"), (b"b" * 17, b"data")])
+
+
+class TestPrefetch(unittest.TestCase):
+    """密钥流预取测试用例"""
+
+    def setUp(self):
+        self.key = b"0123456789abcdef"
+        self.iv = b"\xff" * 15 + b"\xf0"  # 预取跨越128位回绕
+        self.encryptor = SM4Encryptor(self.key, self.iv)
+
+    def _wait_full(self, ctx):
+        deadline = time.monotonic() + 5
+        while ctx.available < ctx.pool_size and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_prefetch_matches_stream(self):
+        """[测试29] 预取上下文与普通加密结果一致"""
+        print("\n[测试29] 密钥流预取 - 结果一致")
+        data = os.urandom(20000)
+        with self.encryptor.stream_context(prefetch=1024) as ctx:
+            out = b''.join(ctx.update(data[i:i + 333]) for i in range(0, len(data), 333))
+        self.assertEqual(self.encryptor.encrypt(data), out)
+
+    def test_prefetch_metrics(self):
+        """[测试30] 预取命中与欠载统计"""
+        print("\n[测试30] 密钥流预取 - 统计")
+        data = os.urandom(5000)
+        ctx = self.encryptor.stream_context(offset=7, prefetch=4096)
+        self._wait_full(ctx)
+        out = ctx.update(data[:4096])   # 全部来自预取池
+        out += ctx.update(data[4096:])  # 池已取空，需要当场补算
+        ctx.finalize()
+        self.assertEqual(self.encryptor.encrypt_at(data, 7), out)
+        m = ctx.metrics()
+        print(f"统计: {m}")
+        self.assertEqual(4096, m['pool_size'])
+        self.assertGreaterEqual(m['hits'], 1)
+        self.assertLessEqual(m['underflow_bytes'], 5000 - 4096)
+        with self.assertRaises(ValueError):
+            ctx.update(b"more")
+
+    def test_prefetch_unfinalized_released(self):
+        """[测试64] 没有 finalize 的预取上下文被回收后，后台线程退出"""
+        print("\n[测试64] 密钥流预取 - 未结束的上下文")
+        import gc
+        import threading
+        before = threading.active_count()
+        for _ in range(20):
+            self.encryptor.stream_context(prefetch=1024).update(b"frame")
+        gc.collect()
+        deadline = time.monotonic() + 5
+        while threading.active_count() > before and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(before, threading.active_count())
+
+
+class TestAsyncStreaming(unittest.TestCase):
+    """asyncio 加密流服务器测试用例"""
+
+    def test_concurrent_sessions(self):
+        """[测试31] 多个客户端并发接收并解密"""
+        print("\n[测试31] asyncio - 多会话并发")
+        import asyncio
+        from video_async_demo import load_test
+        result = asyncio.run(load_test(clients=3, frames=5, frame_size=1024))
+        print(f"总帧率: {result['fps']:.1f} 帧/秒, 总吞吐: {result['mb_per_s']:.2f} MB/s")
+        self.assertEqual(15, result['frames'])
+        self.assertEqual(0, result['errors'])
+
+
+class TestFraming(unittest.TestCase):
+    """加密帧协议测试用例"""
+
+    def setUp(self):
+        import socket
+        self.key = b"0123456789abcdef"
+        self.iv = b"fedcba9876543210"
+        self.a, self.b = socket.socketpair()
+
+    def tearDown(self):
+        self.a.close()
+        self.b.close()
+
+    def test_send_recv(self):
+        """[测试32] 帧的加密发送与原地解密接收"""
+        print("\n[测试32] 帧协议 - 收发")
+        from sm4_framing import FrameSender, FrameReceiver
+        frames = [os.urandom(n) for n in (0, 1, 100, 5000)]
+        sender = FrameSender(self.a, SM4Encryptor(self.key, self.iv))
+        receiver = FrameReceiver(self.b, self.key, buffer_size=64)
+        for data in frames:
+            sender.send(bytearray(data))
+        self.a.shutdown(1)
+        received = []
+        while (frame := receiver.recv()) is not None:
+            received.append(bytes(frame.payload))
+        self.assertEqual(frames, received)
+        self.assertEqual(self.iv, receiver.iv)
+        self.assertEqual(0, receiver.dropped)
+
+    def test_resync_after_drop(self):
+        """[测试33] 丢帧后从下一帧恢复解密"""
+        print("\n[测试33] 帧协议 - 丢帧恢复")
+        import socket
+        from sm4_framing import FrameSender, FrameReceiver
+        sender = FrameSender(self.a, SM4Encryptor(self.key, self.iv))
+        receiver = FrameReceiver(self.b, self.key)
+        sender.send(bytearray(b"frame-0"))
+        lost_a, lost_b = socket.socketpair()
+        with lost_a, lost_b:
+            sender._sock = lost_a       # 第1帧“丢失”
+            sender.send(bytearray(b"frame-1" * 100))
+        sender._sock = self.a
+        sender.send(bytearray(b"frame-2"))
+        self.assertEqual(b"frame-0", bytes(receiver.recv().payload))
+        frame = receiver.recv()
+        self.assertEqual((2, b"frame-2"), (frame.seq, bytes(frame.payload)))
+        self.assertEqual(1, receiver.dropped)
+
+    def test_authenticated_frames(self):
+        """[测试44] 认证帧：正常收发，篡改和重放的帧被拒绝，要求认证时拒收CTR帧"""
+        print("\n[测试44] 帧协议 - SM4-GCM 认证帧")
+        import socket
+        from sm4_framing import FrameSender, FrameReceiver, InvalidTag, ReplayedFrame, HEADER
+        sender = FrameSender(self.a, SM4Encryptor(self.key, self.iv), authenticate=True)
+        receiver = FrameReceiver(self.b, self.key, require_auth=True)
+        frames = [os.urandom(n) for n in (0, 17, 5000)]
+        for data in frames:
+            sender.send(bytearray(data))
+        for data in frames:
+            self.assertEqual(data, bytes(receiver.recv().payload))
+
+        # 重放已收过的帧：标签能通过，但按序号拒收，统计不变
+        tap_a, tap_b = socket.socketpair()
+        with tap_a, tap_b:
+            sender._sock = tap_a
+            sender.send(bytearray(b"frame 3"))
+            raw = bytes(tap_b.recv(1024))
+        sender._sock = self.a
+        self.a.sendall(raw)
+        self.assertEqual(b"frame 3", bytes(receiver.recv().payload))
+        sender.send(bytearray(b"frame 4"))
+        self.assertEqual(b"frame 4", bytes(receiver.recv().payload))
+        state = (receiver.expected_seq, receiver.dropped)
+        self.a.sendall(raw)
+        with self.assertRaises(ReplayedFrame):
+            receiver.recv()
+        self.assertEqual((5, 0), state)
+        self.assertEqual(state, (receiver.expected_seq, receiver.dropped))
+
+        # 截获下一帧，改掉帧头里的偏移（AAD）后再转发
+        tap_a, tap_b = socket.socketpair()
+        with tap_a, tap_b:
+            sender._sock = tap_a
+            sender.send(bytearray(b"secret frame"))
+            raw = bytearray(tap_b.recv(1024))
+        raw[8] ^= 1
+        self.a.sendall(raw)
+        with self.assertRaises(InvalidTag):
+            receiver.recv()
+
+        # 换了IV的伪造帧：校验失败，会话和序号统计都不变
+        state = (receiver.iv, receiver.expected_seq, receiver.dropped)
+        tap_a, tap_b = socket.socketpair()
+        with tap_a, tap_b:
+            sender._sock = tap_a
+            sender.send(bytearray(b"forged frame"))
+            raw = bytearray(tap_b.recv(1024))
+        raw[16:32] = os.urandom(16)
+        self.a.sendall(raw)
+        with self.assertRaises(InvalidTag):
+            receiver.recv()
+        self.assertEqual(state, (receiver.iv, receiver.expected_seq, receiver.dropped))
+
+        # 篡改帧之后仍能继续接收
+        sender._sock = self.a
+        sender.send(bytearray(b"next"))
+        self.assertEqual(b"next", bytes(receiver.recv().payload))
+
+        FrameSender(self.a, SM4Encryptor(self.key, self.iv)).send(bytearray(b"plain ctr"))
+        with self.assertRaises(ValueError):
+            receiver.recv()
+
+    def test_bad_header(self):
+        """[测试34] 非法帧头"""
+        print("\n[测试34] 帧协议 - 非法帧头")
+        from sm4_framing import FrameReceiver, HEADER
+        self.a.sendall(b"XX" + bytes(HEADER.size - 2))
+        with self.assertRaises(ValueError):
+            FrameReceiver(self.b, self.key).recv()
+
+
+class TestPipeline(unittest.TestCase):
+    """采集/加密/发送流水线测试用例"""
+
+    key = b"0123456789abcdef"
+
+    def run_pipeline(self, frames, authenticate=False, slow=0.0, **kwargs):
+        """通过 socketpair 发送 frames，返回 (report, 接收方收到的 [(seq, 明文)])"""
+        import socket
+        import threading
+        from sm4_framing import FrameSender, FrameReceiver
+        from sm4_pipeline import PipelinedSender
+        a, b = socket.socketpair()
+        received = []
+
+        def receive():
+            receiver = FrameReceiver(b, self.key)
+            while True:
+                frame = receiver.recv()
+                if frame is None:
+                    break
+                received.append((frame.seq, bytes(frame.payload)))
+        thread = threading.Thread(target=receive)
+        thread.start()
+        try:
+            sender = FrameSender(a, SM4Encryptor(self.key, os.urandom(16)),
+                                 authenticate=authenticate)
+            if slow:
+                seal = sender.seal
+                sender.seal = lambda *args: (time.sleep(slow), seal(*args))[1]
+            source = iter([bytearray(f) for f in frames])
+            report = PipelinedSender(sender, **kwargs).run(lambda: next(source, None))
+        finally:
+            a.close()
+            thread.join()
+            b.close()
+        return report, received
+
+    def test_order_preserved(self):
+        """[测试58] 多线程加密后按序号顺序发出，CTR帧和认证帧都能解密"""
+        print("\n[测试58] 流水线 - 保序")
+        frames = [os.urandom(1000 + 37 * i) for i in range(40)]
+        for authenticate in (False, True):
+            report, received = self.run_pipeline(frames, authenticate,
+                                                 fps=2000, workers=3, drop='block')
+            self.assertEqual(list(enumerate(frames)), received)
+            self.assertEqual((40, 40, 0), (report['captured'], report['sent'], report['dropped']))
+            self.assertGreater(report['fps'], 0)
+            self.assertGreater(report['latency']['p99_us'], 0)
+            self.assertLessEqual(report['queues']['encrypt']['max_depth'], 8)
+
+    def test_drop_policies(self):
+        """[测试59] 加密跟不上时按策略丢帧，收到的帧仍按序且内容正确"""
+        print("\n[测试59] 流水线 - 丢帧策略")
+        from sm4_pipeline import PipelinedSender
+        frames = [os.urandom(500) for _ in range(30)]
+        report, received = self.run_pipeline(frames, slow=0.01, fps=1000,
+                                             workers=1, queue_size=1, drop='oldest')
+        self.assertGreater(report['dropped'], 0)
+        self.assertEqual(30, report['sent'] + report['dropped'])
+        # 'oldest' 丢的是已分配序号的帧：收到的序号有间隔，但仍递增且对应原来的帧
+        seqs = [seq for seq, _ in received]
+        self.assertEqual(sorted(seqs), seqs)
+        for seq, payload in received:
+            self.assertEqual(frames[seq], payload)
+
+        report, received = self.run_pipeline(frames, slow=0.01, fps=1000,
+                                             workers=1, queue_size=1, drop='newest')
+        self.assertGreater(report['dropped'], 0)
+        self.assertEqual(report['sent'], len(received))
+        with self.assertRaises(ValueError):
+            PipelinedSender(None, drop='random')
+
+
+class TestLowMemory(unittest.TestCase):
+    """低内存模式测试用例"""
+
+    key = b"0123456789abcdef"
+
+    def test_matches_normal_mode(self):
+        """[测试60] 低内存模式与普通模式结果一致（各后端、偏移、流式分段、GCM）"""
+        print("\n[测试60] 低内存模式 - 一致性")
+        from sm4_gcm import SM4GCM
+        iv = os.urandom(16)
+        data = os.urandom(20000 + 7)
+        for backend in sm4_backends.available_backends():
+            ref = SM4Encryptor(self.key, iv, backend)
+            low = SM4Encryptor(self.key, iv, backend, scratch_size=1024)
+            self.assertEqual(ref.encrypt(data), low.encrypt(data), backend)
+            buf = bytearray(data)
+            low.encrypt_into(buf, buf, 5)
+            self.assertEqual(ref.encrypt_at(data, 5), bytes(buf), backend)
+            self.assertEqual(ref.encrypt_at(data, 5), bytes(low.encrypt_view(data, 5)), backend)
+            ctx = low.stream_context()
+            out = b"".join(ctx.update(data[i:i + 3001]) for i in range(0, len(data), 3001))
+            self.assertEqual(ref.encrypt(data), out, backend)
+            nonce = os.urandom(12)
+            self.assertEqual(SM4GCM(self.key, backend).encrypt(nonce, data),
+                             SM4GCM(self.key, backend, scratch_size=1024).encrypt(nonce, data))
+        for bad in (0, -16, 1000):
+            with self.assertRaises(ValueError):
+                SM4Encryptor(self.key, iv, scratch_size=bad)
+
+    @unittest.skipUnless(sm4_module.DEFAULT_BACKEND in ('openssl', 'numpy'),
+                         "100MB 需要较快的后端")
+    def test_bounded_allocation(self):
+        """[测试61] 100MB原地加密峰值分配 < 1MB；逐帧 encrypt_view 的分配与帧长无关"""
+        print("\n[测试61] 低内存模式 - 分配上限")
+        import tracemalloc
+        encryptor = SM4Encryptor(self.key, os.urandom(16), scratch_size=64 * 1024)
+        data = bytearray(100 * 1024 * 1024)
+        view = memoryview(data)
+        tracemalloc.start()
+        try:
+            encryptor.encrypt_into(view, view)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        print(f"    100MB 峰值分配: {peak / 1024:.1f} KB")
+        self.assertLess(peak, 1024 * 1024)
+        self.assertEqual(SM4Encryptor(self.key, encryptor.iv).encrypt(bytes(4096)), data[:4096])
+        del view, data
+
+        # 输出缓冲区按最大帧分配一次，之后每帧的临时分配只取决于暂存区大小，与帧长无关
+        peaks = []
+        for frame in (os.urandom(1024 * 1024), os.urandom(4 * 1024 * 1024)):
+            encryptor.encrypt_view(frame)
+            tracemalloc.start()
+            try:
+                for i in range(5):
+                    encryptor.encrypt_view(frame, i * len(frame))
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            peaks.append(peak)
+        print(f"    逐帧峰值分配（1MB/4MB帧）: {peaks[0] / 1024:.1f} / {peaks[1] / 1024:.1f} KB")
+        self.assertLess(max(peaks), 1024 * 1024)
+        self.assertLess(abs(peaks[1] - peaks[0]), 4096)
+
+
+class TestGCM(unittest.TestCase):
+    """SM4-GCM 认证加密测试用例"""
+
+    # RFC 8998 附录A.1 的 SM4-GCM 测试向量
+    KEY = bytes.fromhex("0123456789abcdeffedcba9876543210")
+    NONCE = bytes.fromhex("00001234567800000000abcd")
+    AAD = bytes.fromhex("feedfacedeadbeeffeedfacedeadbeefabaddad2")
+    PLAINTEXT = bytes.fromhex(
+        "aaaaaaaaaaaaaaaabbbbbbbbbbbbbbbbccccccccccccccccdddddddddddddddd"
+        "eeeeeeeeeeeeeeeeffffffffffffffffeeeeeeeeeeeeeeeeaaaaaaaaaaaaaaaa")
+    CIPHERTEXT = bytes.fromhex(
+        "17f399f08c67d5ee19d0dc9969c4bb7d5fd46fd3756489069157b282bb200735"
+        "d82710ca5c22f0ccfa7cbf93d496ac15a56834cbcf98c397b4024a2691233b8d")
+    TAG = bytes.fromhex("83de3541e4c2b58177e065a9bf7b62ec")
+
+    def test_rfc8998_vector(self):
+        """[测试41] RFC 8998 测试向量（每个可用后端）"""
+        print("\n[测试41] SM4-GCM RFC 8998 测试向量")
+        from sm4_gcm import SM4GCM
+        for backend in sm4_backends.available_backends():
+            gcm = SM4GCM(self.KEY, backend)
+            out = gcm.encrypt(self.NONCE, self.PLAINTEXT, self.AAD)
+            self.assertEqual(self.CIPHERTEXT + self.TAG, out, backend)
+            self.assertEqual(self.PLAINTEXT, gcm.decrypt(self.NONCE, out, self.AAD), backend)
+        # OpenSSL 的 SM4-GCM（openssl 后端）与查表GHASH实现（其余后端）逐字节一致
+        data, aad = os.urandom(100000 + 5), os.urandom(33)
+        outputs = {backend: SM4GCM(self.KEY, backend).encrypt(self.NONCE, data, aad)
+                   for backend in sm4_backends.available_backends()}
+        self.assertEqual(1, len(set(outputs.values())), list(outputs))
+
+    def test_streaming_matches_one_shot(self):
+        """[测试42] 任意切分的流式 update（含分段AAD）与一次性结果相同"""
+        print("\n[测试42] SM4-GCM 流式处理")
+        import random
+        from sm4_gcm import SM4GCM
+        gcm = SM4GCM(self.KEY)
+        rng = random.Random(42)
+        for n in (0, 1, 15, 16, 17, 1000, 70000):
+            data = os.urandom(n)
+            aad = os.urandom(rng.randrange(40))
+            expected = gcm.encrypt(self.NONCE, data, aad)
+
+            ctx = gcm.encryptor(self.NONCE)
+            cut = rng.randrange(len(aad) + 1)
+            ctx.authenticate_additional_data(aad[:cut])
+            ctx.authenticate_additional_data(aad[cut:])
+            out, pos = b"", 0
+            while pos < n:
+                step = rng.randrange(1, 40000)
+                out += ctx.update(data[pos:pos + step])
+                pos += step
+            self.assertEqual(expected, out + ctx.finalize(), f"长度={n}")
+
+            # 原地流式解密
+            buf = bytearray(expected[:-16])
+            dec = gcm.decryptor(self.NONCE, aad)
+            dec.update_into(buf, buf)
+            dec.finalize(expected[-16:])
+            self.assertEqual(data, bytes(buf))
+
+    def test_tamper_detected(self):
+        """[测试43] 篡改密文、AAD、标签或用错nonce都会被发现"""
+        print("\n[测试43] SM4-GCM 防篡改")
+        from sm4_gcm import SM4GCM, InvalidTag
+        for backend in {"python", sm4_module.DEFAULT_BACKEND}:
+            gcm = SM4GCM(self.KEY, backend)
+            out = gcm.encrypt(self.NONCE, self.PLAINTEXT, self.AAD)
+            flipped = bytearray(out)
+            flipped[5] ^= 1
+            bad_tag = out[:-1] + bytes([out[-1] ^ 0x80])
+            cases = [
+                (self.NONCE, bytes(flipped), self.AAD),
+                (self.NONCE, bad_tag, self.AAD),
+                (self.NONCE, out, self.AAD[:-1]),
+                (bytes(12), out, self.AAD),
+            ]
+            for nonce, data, aad in cases:
+                with self.assertRaises(InvalidTag, msg=backend):
+                    gcm.decrypt(nonce, data, aad)
+            # 截短的标签（OpenSSL 本身允许）一律拒绝
+            ctx = gcm.decryptor(self.NONCE, self.AAD)
+            ctx.update(out[:-16])
+            with self.assertRaises(InvalidTag, msg=backend):
+                ctx.finalize(out[-16:-8])
+            with self.assertRaises(ValueError):
+                gcm.encrypt(bytes(16), b"data")       # nonce 必须12字节
+            ctx = gcm.encryptor(self.NONCE)
+            ctx.update(b"data")
+            with self.assertRaises(ValueError):
+                ctx.authenticate_additional_data(b"late")   # AAD 必须在数据之前
+
+
+class TestSessions(unittest.TestCase):
+    """多会话分发测试用例"""
+
+    def test_matches_independent_streams(self):
+        """[测试45] 每个会话的密文与各自独立的流式上下文相同（含批量路径）"""
+        from sm4_sessions import SessionManager
+        backends = [b for b in ('numpy', sm4_module.DEFAULT_BACKEND)
+                    if b in sm4_backends.available_backends()]
+        print(f"\n[测试45] 多会话分发: {', '.join(backends)}")
+        shared = os.urandom(16)
+        specs = {i: (shared if i % 2 else os.urandom(16), os.urandom(16)) for i in range(6)}
+        specs[6] = (shared, b"\xff" * 15 + b"\xfe")   # 计数器回绕
+        for backend in backends:
+            manager = SessionManager(backend)
+            contexts = {}
+            for i, (key, iv) in specs.items():
+                manager.add(i, key, iv)
+                contexts[i] = SM4Encryptor(key, iv).stream_context()
+            self.assertEqual(4, len(manager._keys), "同一密钥的会话共享密钥状态")
+            for n in (1, 17, 0, 5000, 33):
+                frame = os.urandom(n)
+                out = manager.encrypt_frame(frame)
+                for i in specs:
+                    self.assertEqual(contexts[i].update(frame), out[i], f"{backend} 会话{i} 长度={n}")
+
+    def test_add_remove_and_stats(self):
+        """[测试46] 会话增删和吞吐统计"""
+        print("\n[测试46] 多会话分发 - 增删与统计")
+        from sm4_sessions import SessionManager
+        manager = SessionManager()
+        key = os.urandom(16)
+        manager.add("a", key, os.urandom(16))
+        manager.add("b", key, os.urandom(16))
+        with self.assertRaises(ValueError):
+            manager.add("a", key, os.urandom(16))
+        with self.assertRaises(ValueError):
+            manager.add("c", b"short", os.urandom(16))
+        manager.encrypt_frame(bytes(1000))
+        manager.remove("b")
+        self.assertNotIn("b", manager)
+        self.assertEqual(1, len(manager._keys))
+        manager.encrypt_frame(bytes(24))
+
+        stats = manager.stats()
+        self.assertEqual({"frames": 2, "bytes": 1024}, {k: stats["sessions"]["a"][k]
+                                                         for k in ("frames", "bytes")})
+        self.assertEqual(2024, stats["aggregate"]["bytes"])
+        self.assertEqual(1024, manager.get("a").position)
+        self.assertGreater(stats["aggregate"]["mb_per_s"], 0)
+
+        # 所有会话都移除后照常加密（批量路径和逐会话路径）
+        for backend in {"numpy", sm4_module.DEFAULT_BACKEND} & set(sm4_backends.available_backends()):
+            manager = SessionManager(backend)
+            manager.add("a", key, os.urandom(16))
+            manager.remove("a")
+            self.assertEqual({}, manager.encrypt_frame(bytes(100)), backend)
+
+
+class TestStats(unittest.TestCase):
+    """热路径统计测试用例"""
+
+    def setUp(self):
+        self.key = b"0123456789abcdef"
+        self.iv = b"fedcba9876543210"
+
+    def test_counters_stages_and_callback(self):
+        """[测试47] 按操作计数、按阶段计时，回调收到每次操作"""
+        print("\n[测试47] 统计 - 计数、阶段与回调")
+        from sm4_stats import CipherStats
+        stats = CipherStats()
+        events = []
+        stats.add_callback(lambda op, n, ns: events.append((op, n)))
+        encryptor = SM4Encryptor(self.key, self.iv, stats=stats)
+        encryptor.encrypt(bytes(100))
+        encryptor.decrypt(bytes(32))
+        buf = bytearray(40)
+        encryptor.encrypt_into(buf, buf, offset=5)   # 块内偏移：内部多算一块，不重复计调用
+        ctx = encryptor.stream_context()
+        ctx.update(bytes(10))
+        ctx.update(bytes(10))
+
+        snap = stats.snapshot()
+        self.assertEqual({"encrypt": 1, "decrypt": 1, "encrypt_into": 1, "update": 2},
+                         {op: v["calls"] for op, v in snap["ops"].items()})
+        self.assertEqual(40, snap["ops"]["encrypt_into"]["bytes"])
+        self.assertEqual([("encrypt", 100), ("decrypt", 32), ("encrypt_into", 40),
+                          ("update", 10), ("update", 10)], events)
+        for stage in ("key_setup", "keystream", "overhead"):
+            self.assertGreater(snap["stages"][stage], 0, stage)
+        self.assertGreaterEqual(snap["keystream_bytes"], 100 + 32 + 40 + 20)
+        self.assertGreaterEqual(snap["keystream_blocks"] * 16, snap["keystream_bytes"])
+
+        encryptor.stats = None          # 关闭后不再记录
+        encryptor.encrypt(bytes(16))
+        self.assertEqual(1, stats.summary("encrypt")["calls"])
+
+        # 流式尾块按整块生成密钥流，调用方字节数只看 summary
+        stats.reset()
+        encryptor.stats = stats
+        ctx = encryptor.stream_context()
+        for _ in range(10):
+            ctx.update(bytes(17))
+        self.assertEqual(170, stats.summary("update")["bytes"])
+        self.assertEqual(176, stats.snapshot()["keystream_bytes"])
+
+    def test_latency_percentiles(self):
+        """[测试48] 延迟直方图的百分位估计"""
+        print("\n[测试48] 统计 - 延迟百分位")
+        from sm4_stats import CipherStats
+        stats = CipherStats()
+        for ns in range(1, 1001):
+            stats.record("op", 0, ns * 1000)      # 1µs .. 1000µs 均匀分布
+        s = stats.summary("op")
+        self.assertEqual(1000, s["calls"])
+        # 桶的相对误差不超过 25%
+        self.assertLessEqual(abs(s["p50_us"] - 500) / 500, 0.25)
+        self.assertLessEqual(abs(s["p99_us"] - 990) / 990, 0.25)
+        self.assertGreaterEqual(s["max_us"], 1000)
+        stats.reset()
+        self.assertEqual(0, stats.summary("op")["calls"])
+
+    def test_frame_stats(self):
+        """[测试49] 帧收发记录 frame_encrypt / frame_decrypt 和 GCM 操作"""
+        print("\n[测试49] 统计 - 帧协议")
+        import socket
+        from sm4_framing import FrameSender, FrameReceiver
+        from sm4_stats import CipherStats
+        send_stats, recv_stats = CipherStats(), CipherStats()
+        a, b = socket.socketpair()
+        with a, b:
+            sender = FrameSender(a, SM4Encryptor(self.key, self.iv, stats=send_stats),
+                                 authenticate=True)
+            receiver = FrameReceiver(b, self.key, stats=recv_stats)
+            for _ in range(3):
+                sender.send(bytearray(1000))
+                receiver.recv()
+        self.assertEqual(3, send_stats.summary("frame_encrypt")["calls"])
+        self.assertEqual(3000, recv_stats.summary("frame_decrypt")["bytes"])
+        self.assertIn("gcm_encrypt", send_stats.ops())
+        self.assertIn("gcm_decrypt", recv_stats.ops())
+        if not sender._gcm.native:   # OpenSSL 的 GCM 里 GHASH 不单独计时
+            self.assertIn("ghash", send_stats.stages)
+
+
+class TestContainer(unittest.TestCase):
+    """加密容器文件测试用例"""
+
+    def setUp(self):
+        self.key = b"0123456789abcdef"
+        self.iv = b"fedcba9876543210"
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'video.sm4c')
+        self.frames = [os.urandom(n) for n in (0, 5, 16, 1000, 70_000, 3, 20_000)]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write_and_random_access(self):
+        """[测试54] 写入容器，按索引读取任意帧和分块范围"""
+        print("\n[测试54] 容器文件 - 随机访问")
+        from sm4_container import SM4ContainerWriter, SM4ContainerReader, HEADER
+        with SM4ContainerWriter(self.path, SM4Encryptor(self.key, self.iv), chunk_size=4096) as w:
+            for frame in self.frames:
+                w.write_frame(frame)
+            w.write(b'tail')
+        plain = b''.join(self.frames) + b'tail'
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        # 文件头之后就是整条CTR流的密文
+        self.assertEqual(SM4Encryptor(self.key, self.iv).encrypt(plain),
+                         raw[HEADER.size:HEADER.size + len(plain)])
+
+        with SM4ContainerReader(self.path, self.key, workers=2) as r:
+            self.assertEqual(self.iv, r.iv)
+            self.assertEqual(len(plain), r.size)
+            self.assertEqual(-(-len(plain) // 4096), len(r.chunks))
+            self.assertEqual(self.frames[4], r.read_frame(4))
+            self.assertEqual(self.frames[2:6], r.read_frames(2, 6))
+            self.assertEqual(plain, r.read_chunks(0, len(r.chunks)))
+            self.assertEqual(plain[3 * 4096:5 * 4096], r.read_chunks(3, 5))
+            self.assertEqual(4, r.chunk_of(4 * 4096 + 7))
+            with self.assertRaises(ValueError):
+                r.read(r.size - 1, 2)
+        self.assertTrue(w._stream.closed)
+
+    def test_invalid_files(self):
+        """[测试55] 截断、非容器文件和损坏的索引"""
+        print("\n[测试55] 容器文件 - 损坏检测")
+        from sm4_container import SM4ContainerWriter, SM4ContainerReader, HEADER
+        with SM4ContainerWriter(self.path, SM4Encryptor(self.key, self.iv), chunk_size=1024) as w:
+            for frame in self.frames:
+                w.write_frame(frame)
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        # 改坏第一个分块记录里的长度
+        index_start = HEADER.size + sum(map(len, self.frames))
+        for data in (raw[:-5], b'not a container' * 10,
+                     raw[:index_start + 10] + b'\xff' + raw[index_start + 11:]):
+            with open(self.path, 'wb') as f:
+                f.write(data)
+            with self.assertRaises(ValueError):
+                SM4ContainerReader(self.path, self.key)
+
+
+class TestKeyCache(unittest.TestCase):
+    """轮密钥缓存测试用例"""
+
+    def setUp(self):
+        self.key = b"0123456789abcdef"
+        self.iv = b"fedcba9876543210"
+        sm4_module.clear_key_cache()
+
+    def test_cache_hits(self):
+        """[测试27] 同一密钥只扩展一次"""
+        print("\n[测试27] 轮密钥缓存 - 命中")
+        expected = encrypt(b"telemetry", self.key, self.iv)
+        for _ in range(5):
+            self.assertEqual(expected, encrypt(b"telemetry", self.key, self.iv))
+        info = sm4_module.key_cache_info()
+        print(f"命中: {info.hits}, 未命中: {info.misses}")
+        self.assertEqual(1, info.misses)
+        self.assertEqual(5, info.hits)
+
+    def test_cache_eviction(self):
+        """[测试28] 缓存有上限，超出后淘汰旧密钥"""
+        print("\n[测试28] 轮密钥缓存 - 淘汰")
+        for i in range(sm4_module.KEY_CACHE_SIZE + 10):
+            SM4Encryptor(i.to_bytes(16, 'big'), self.iv)
+        info = sm4_module.key_cache_info()
+        self.assertEqual(sm4_module.KEY_CACHE_SIZE, info.currsize)
+        # 最早的密钥已被淘汰，再次使用会重新扩展
+        SM4Encryptor((0).to_bytes(16, 'big'), self.iv)
+        self.assertEqual(info.misses + 1, sm4_module.key_cache_info().misses)
+
+
+class TestFileEncryption(unittest.TestCase):
+    """mmap文件加解密测试用例"""
+
+    def setUp(self):
+        self.key = b"0123456789abcdef"
+        self.iv = b"fedcba9876543210"
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.plain_path = os.path.join(self.tmpdir.name, "plain.bin")
+        self.data = os.urandom(10000)
+        with open(self.plain_path, "wb") as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_crypt_file(self):
+        """[测试21] 分窗口加密文件，结果与整段加密一致"""
+        print("\n[测试21] 文件加密 - 分窗口")
+        from sm4_file import crypt_file
+        enc_path = os.path.join(self.tmpdir.name, "plain.enc")
+        encryptor = SM4Encryptor(self.key, self.iv)
+        self.assertEqual(10000, crypt_file(self.plain_path, enc_path, encryptor, window=4096))
+        with open(enc_path, "rb") as f:
+            self.assertEqual(encryptor.encrypt(self.data), f.read())
+
+        # 原地解密
+        crypt_file(enc_path, None, encryptor, window=4096)
+        with open(enc_path, "rb") as f:
+            self.assertEqual(self.data, f.read())
+
+        # 窗口不是映射粒度的倍数；每次只映射当前窗口，不映射整个文件
+        import mmap
+        import sm4_file
+        mapped = []
+        original = sm4_file._map_window
+
+        def spy(f, start, end, write=False):
+            mm, skip = original(f, start, end, write)
+            mapped.append(len(mm))
+            return mm, skip
+        sm4_file._map_window = spy
+        try:
+            crypt_file(self.plain_path, enc_path, encryptor, window=48 * 50)
+            crypt_file(enc_path, None, encryptor, window=48 * 50)
+        finally:
+            sm4_file._map_window = original
+        with open(enc_path, "rb") as f:
+            self.assertEqual(self.data, f.read())
+        self.assertLessEqual(max(mapped), 48 * 50 + mmap.ALLOCATIONGRANULARITY)
+
+    def test_command_line(self):
+        """[测试22] 命令行入口"""
+        print("\n[测试22] 文件加密 - 命令行")
+        import sm4_file
+        enc_path = os.path.join(self.tmpdir.name, "plain.enc")
+        args = ["--key", self.key.hex(), "--iv", self.iv.hex()]
+        self.assertEqual(0, sm4_file.main(["encrypt", self.plain_path, "-o", enc_path] + args))
+        self.assertEqual(0, sm4_file.main(["decrypt", enc_path, "--in-place"] + args))
+        with open(enc_path, "rb") as f:
+            self.assertEqual(self.data, f.read())
+        with self.assertRaises(SystemExit):   # parser.error，而不是 ValueError 回溯
+            sm4_file.main(["encrypt", self.plain_path, "-o", enc_path, "--window", "0"] + args)
+
+        # 输入文件不存在：打印错误返回1，不抛 FileNotFoundError
+        missing = os.path.join(self.tmpdir.name, "missing.bin")
+        with contextlib.redirect_stderr(io.StringIO()) as err:
+            self.assertEqual(1, sm4_file.main(["encrypt", missing, "-o", enc_path] + args))
+        self.assertIn("错误", err.getvalue())
+
+
+class TestBackends(unittest.TestCase):
+    """CTR后端注册表测试用例"""
+
+    def setUp(self):
+        self.key = b"0123456789abcdef"
+        self.iv = b"fedcba9876543210"
+
+    def test_standard_vector(self):
+        """[测试9] 每个可用后端都符合 GB/T 32907 标准测试向量"""
+        print("\n[测试9] GB/T 32907 标准测试向量")
+        key = bytes.fromhex("0123456789abcdeffedcba9876543210")
+        # 以明文作为计数器、对全零数据加密，得到的就是单块ECB密文
+        for backend in sm4_backends.available_backends():
+            encryptor = SM4Encryptor(key, iv=key, backend=backend)
+            self.assertEqual(encryptor.encrypt(bytes(16)).hex(),
+                             "681edf34d206965e86b3e94f536e4246", backend)
+
+    def test_matches_python_backend(self):
+        """[测试10] 所有后端与纯Python后端输出一致"""
+        print(f"\n[测试10] 后端一致性: {', '.join(sm4_backends.available_backends())}")
+        ivs = [
+            self.iv,
+            bytes(8) + b"\xff" * 7 + b"\xfe",  # 低64位进位
+            b"\xff" * 15 + b"\xfd",             # 128位回绕
+        ]
+        for backend in sm4_backends.available_backends():
+            for iv in ivs:
+                for n in (0, 1, 15, 16, 17, 100, 1000):
+                    data = os.urandom(n)
+                    expected = SM4Encryptor(self.key, iv, backend='python').encrypt(data)
+                    actual = SM4Encryptor(self.key, iv, backend=backend).encrypt(data)
+                    self.assertEqual(expected, actual, f"{backend} IV={iv.hex()} 长度={n}")
+
+    def test_invalid_backend(self):
+        """[测试11] 非法后端"""
+        print("\n[测试11] 非法后端测试")
+        with self.assertRaises(ValueError):
+            SM4Encryptor(self.key, self.iv, backend='gpu')
+
+    def test_default_is_fastest_available(self):
+        """[测试38] 默认后端为最快的可用后端，可用环境变量覆盖"""
+        print(f"\n[测试38] 默认后端: {sm4_module.DEFAULT_BACKEND}")
+        from unittest import mock
+        if not os.environ.get(sm4_backends.ENV_VAR):
+            self.assertEqual(sm4_backends.available_backends()[0], sm4_module.DEFAULT_BACKEND)
+        with mock.patch.dict(os.environ, {sm4_backends.ENV_VAR: 'python'}):
+            self.assertEqual('python', sm4_backends.default_backend_name())
+
+    def test_broken_backend_rejected(self):
+        """[测试39] 自检不通过的后端不会被使用"""
+        print("\n[测试39] 后端自检")
+
+        class BrokenBackend(sm4_backends.PythonBackend):
+            name = 'broken'
+            priority = 1000
+
+            def ctr_xor(self, state, counter, data, out=None):
+                return super().ctr_xor(state, counter + 1, data, out)
+
+        sm4_backends.register(BrokenBackend())
+        try:
+            self.assertNotIn('broken', sm4_backends.available_backends())
+            with self.assertRaises(ValueError):
+                SM4Encryptor(self.key, self.iv, backend='broken')
+        finally:
+            sm4_backends._registry.pop('broken')
+            sm4_backends._status.pop('broken')
+
+
+class TestCtrUtil(unittest.TestCase):
+    """计数器块生成和整段XOR测试用例"""
+
+    MASK = (1 << 128) - 1
+    # 低64位回绕（向高位进位）和128位整体回绕附近的起点
+    STARTS = ([(1 << 64) + d for d in range(-20, 4)] + [(1 << 128) + d for d in range(-20, 0)]
+              + [(5 << 64) - 3, (0x1234 << 64) | 0xFFFFFFFFFFFFFFFF])
+
+    def expected(self, counter, nblocks):
+        return b''.join(((counter + i) & self.MASK).to_bytes(16, 'big') for i in range(nblocks))
+
+    def test_counter_wraparound(self):
+        """[测试56] 2^64 进位和 2^128 回绕附近，所有起点/长度的计数器块"""
+        print("\n[测试56] 计数器 - 回绕")
+        import sm4_ctrutil
+        for start in self.STARTS:
+            start &= self.MASK
+            for nblocks in range(0, 41):
+                expected = self.expected(start, nblocks)
+                self.assertEqual(expected, sm4_ctrutil.counter_blocks(start, nblocks))
+                if sm4_ctrutil.load_numpy() is None:
+                    continue
+                hi, lo = sm4_ctrutil.counter_array(start, nblocks)
+                self.assertEqual(expected, bytes(sm4_ctrutil.pack_counters(hi, lo)))
+        self.assertEqual(0, sm4_ctrutil.counter_add(self.MASK, 1))
+
+        if sm4_ctrutil.load_numpy() is None:
+            return
+        starts = [s & self.MASK for s in self.STARTS]
+        hi0, lo0 = sm4_ctrutil.split_counters(starts)
+        # 各条块数相同（二维）和各不相同（一维拼接）两种形式
+        packed = sm4_ctrutil.pack_counters(*sm4_ctrutil.multi_counter_array(hi0, lo0, 25))
+        self.assertEqual(b''.join(self.expected(s, 25) for s in starts), bytes(packed))
+        counts = [i % 30 for i in range(len(starts))]
+        packed = sm4_ctrutil.pack_counters(*sm4_ctrutil.multi_counter_array(hi0, lo0, counts))
+        self.assertEqual(b''.join(self.expected(s, n) for s, n in zip(starts, counts)), bytes(packed))
+
+        # 后端和向量化引擎在回绕处的CTR结果与纯Python后端一致
+        data = os.urandom(40 * 16 + 5)
+        key = b"0123456789abcdef"
+        for start in (starts[0], starts[-3]):
+            iv = start.to_bytes(16, 'big')
+            expected = SM4Encryptor(key, iv, backend='python').encrypt(data)
+            for backend in sm4_backends.available_backends():
+                self.assertEqual(expected, SM4Encryptor(key, iv, backend=backend).encrypt(data))
+
+    def test_xor(self):
+        """[测试57] 整段XOR：各种长度、未对齐视图、原地、有无NumPy"""
+        print("\n[测试57] 计数器 - 整段XOR")
+        import sm4_ctrutil
+        a, b = os.urandom(1100), os.urandom(1100)
+        original = sm4_ctrutil.load_numpy()
+        try:
+            for np_module in {original, None}:
+                sm4_ctrutil.np = np_module
+                for n in (0, 1, 7, 8, 15, 255, 256, 257, 1000):
+                    for skip in (0, 3):
+                        x, y = memoryview(a)[skip:skip + n], memoryview(b)[skip:skip + n + 5]
+                        expected = bytes(p ^ q for p, q in zip(x, y))
+                        self.assertEqual(expected, sm4_ctrutil.xor_bytes(x, y))
+                        buf = bytearray(x)
+                        sm4_ctrutil.xor_into(buf, y, buf)
+                        self.assertEqual(expected, bytes(buf))
+        finally:
+            sm4_ctrutil.np = original
+
+
+class TestStartup(unittest.TestCase):
+    """导入耗时与延迟加载测试用例"""
+
+    # 导入 SM4_Encryptor 的耗时上限（微秒）。延迟加载前约 190ms（大半是 NumPy），
+    # 之后约 9ms，几乎都是标准库
+    IMPORT_BUDGET_US = 50000
+    HEAVY_MODULES = ('numpy', 'cryptography', 'gmssl', 'multiprocessing', 'concurrent.futures')
+
+    def import_time(self):
+        """在新进程里用 -X importtime 导入 SM4_Encryptor，返回 (总耗时微秒, 导入的模块名)"""
+        import subprocess
+        here = os.path.dirname(os.path.abspath(__file__))
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import SM4_Encryptor"],
+                                cwd=here, capture_output=True, text=True, check=True)
+        total, modules = None, set()
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if not cumulative.strip().isdigit():
+                continue   # 表头
+            modules.add(name.strip())
+            if name.strip() == "SM4_Encryptor":
+                total = int(cumulative)
+        return total, modules
+
+    def test_import_budget(self):
+        """[测试62] 导入不加载后端依赖，耗时在预算以内"""
+        print("\n[测试62] 启动 - 导入耗时")
+        # 第一次可能要编译 .pyc，取多次中最快的一次
+        runs = [self.import_time() for _ in range(3)]
+        total = min(t for t, _ in runs)
+        print(f"    import SM4_Encryptor: {total / 1000:.1f} ms（预算 {self.IMPORT_BUDGET_US / 1000:.0f} ms）")
+        for heavy in self.HEAVY_MODULES:
+            self.assertFalse(any(m == heavy or m.startswith(heavy + ".") for m in runs[0][1]), heavy)
+        self.assertLess(total, self.IMPORT_BUDGET_US)
+
+    def test_tables_blob(self):
+        """[测试63] 随包的查表文件与现算结果一致，缺失时退回现算"""
+        print("\n[测试63] 启动 - 预生成查表")
+        import sm4_core
+        import zlib
+        with open(sm4_core.TABLES_PATH, "rb") as f:
+            self.assertEqual(sm4_core._TABLES_CRC, zlib.crc32(f.read()))
+        self.assertEqual(sm4_core.build_tables(), sm4_core._load_tables())
+        original = sm4_core.TABLES_PATH
+        try:
+            sm4_core.TABLES_PATH = os.path.join(tempfile.gettempdir(), "sm4_tables_missing.bin")
+            self.assertEqual(sm4_core.build_tables(), sm4_core._load_tables())
+        finally:
+            sm4_core.TABLES_PATH = original
+        key = bytes.fromhex("0123456789abcdeffedcba9876543210")
+        self.assertEqual("681edf34d206965e86b3e94f536e4246", sm4_core.encrypt_block(key, key).hex())
+
+
+class TestBenchmark(unittest.TestCase):
+    """基准脚本冒烟测试（只跑极小的规模）"""
+
+    def test_json_and_regression(self):
+        """[测试40] 基准结果写成JSON，吞吐退化超过阈值时返回非0"""
+        print("\n[测试40] 基准脚本")
+        import json
+        import benchmark_sm4
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.json')
+            rc = benchmark_sm4.main(['--backends', sm4_module.DEFAULT_BACKEND,
+                                     '--modes', 'single,stream', '--sizes', '16,4096',
+                                     '--repeat', '1', '--skip', 'video', '--json', path])
+            self.assertEqual(0, rc)
+            with open(path, encoding='utf-8') as f:
+                results = json.load(f)['results']
+        names = [r['name'] for r in results]
+        self.assertIn(f"ctr/single/{sm4_module.DEFAULT_BACKEND}/4KiB", names)
+        self.assertIn('keysetup/expand_key', names)
+        self.assertIn('many/batch/64B', names)
+
+        # 基线快一倍 → 退化；基线相同 → 不算退化
+        faster = [dict(r, mb_per_s=r.get('mb_per_s', 0) * 2, median_ns=r['median_ns'] / 2)
+                  for r in results]
+        self.assertEqual(len(results), len(benchmark_sm4.compare(results, faster, 0.1)))
+        self.assertEqual([], benchmark_sm4.compare(results, results, 0.1))
+
+
 def run_interactive_test():
     """交互式测试"""
     print("=" * 60)
@@ -192,7 +1467,6 @@ if __name__ == "__main__":
 
     # 运行单元测试
     # 修改了unittest.main()的调用方式，以便在IDLE或notebook中正常运行
-    suite = unittest.TestSuite()
-    suite.addTest(unittest.makeSuite(TestSM4Encryptor))
+    suite = unittest.defaultTestLoader.loadTestsFromModule(sys.modules[__name__])
     runner = unittest.TextTestRunner(verbosity=2)
     runner.run(suite)
\ No newline at end of file
@@ -0,0 +1,208 @@
+"""
+SM4-CTR 视频流加密演示（asyncio 版）
+
+使用最简单的协议：先发16字节IV，之后是若干个 “4字节长度 + 密文帧”
+（带帧头、可断点恢复的协议见 sm4_framing.py）。服务器基于 asyncio：
+-   同时服务任意多个客户端，每个连接有自己的随机IV和流式加密上下文；
+-   加解密放到线程池执行，事件循环始终保持响应；
+-   按截止时间控制帧率，而不是固定 sleep；
+-   客户端用 StreamReader.readexactly 接收，不再逐次拼接 bytearray。
+
+还带了一个本机回环压测：启动服务器并发起 N 个客户端，统计总帧率和吞吐。
+
+运行方式:
+    python video_async_demo.py server
+    python video_async_demo.py client
+    python video_async_demo.py bench [客户端数]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+from SM4_Encryptor import SM4Encryptor
+from video_encrypt_demo import SECRET_KEY, HOST, PORT
+
+FRAME_COUNT = 200         # 每个会话发送的帧数
+FRAME_SIZE = 50 * 1024    # 每帧随机数据大小（约50KB）
+FPS = 30                  # 帧率，0表示不限速（压测用）
+
+
+def make_frame(i: int, size: int = FRAME_SIZE) -> bytearray:
+    """模拟一帧视频数据"""
+    return bytearray(f"这是第 {i} 帧视频数据: ".encode('utf-8') + os.urandom(size))
+
+
+async def serve_session(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                        key: bytes = SECRET_KEY, frames: int = FRAME_COUNT,
+                        frame_size: int = FRAME_SIZE, fps: float = FPS):
+    """
+    服务一个客户端会话：发送IV，然后加密并发送 frames 帧
+
+    Args:
+        reader, writer: asyncio 连接
+        key: 16字节密钥
+        frames: 发送的帧数
+        frame_size: 每帧随机数据大小
+        fps: 帧率，0表示不限速
+    """
+    loop = asyncio.get_running_loop()
+    addr = writer.get_extra_info('peername')
+    try:
+        # 每个会话独立的随机IV和流式上下文
+        iv = os.urandom(16)
+        writer.write(iv)
+        ctx = SM4Encryptor(key, iv).stream_context()
+
+        interval = 1 / fps if fps else 0
+        deadline = loop.time()
+        for i in range(1, frames + 1):
+            frame = make_frame(i, frame_size)
+            # 加密放到线程池，不阻塞事件循环
+            await loop.run_in_executor(None, ctx.update_into, frame, frame)
+            writer.write(len(frame).to_bytes(4, 'big'))
+            writer.write(frame)
+            await writer.drain()
+
+            if interval:
+                deadline += interval
+                delay = deadline - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+    except ConnectionError:
+        print(f"[服务器] 客户端 {addr} 提前断开。")
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def start_server(host: str = HOST, port: int = PORT, **session_args) -> asyncio.AbstractServer:
+    """
+    启动加密流服务器
+
+    Args:
+        host, port: 监听地址，port=0 时由系统分配
+        session_args: 传给 serve_session 的参数（key/frames/frame_size/fps）
+
+    Returns:
+        asyncio 服务器对象
+    """
+    async def handler(reader, writer):
+        await serve_session(reader, writer, **session_args)
+    return await asyncio.start_server(handler, host, port)
+
+
+async def receive_stream(host: str = HOST, port: int = PORT, key: bytes = SECRET_KEY,
+                         on_frame=None) -> tuple:
+    """
+    连接服务器，接收并解密整个视频流
+
+    Args:
+        host, port: 服务器地址
+        key: 16字节密钥
+        on_frame: 每解密一帧调用一次 on_frame(序号, 明文帧)
+
+    Returns:
+        (帧数, 字节数)
+    """
+    loop = asyncio.get_running_loop()
+    reader, writer = await asyncio.open_connection(host, port)
+    frames = total = 0
+    try:
+        iv = await reader.readexactly(16)
+        ctx = SM4Encryptor(key, iv).stream_context()
+        while True:
+            try:
+                header = await reader.readexactly(4)
+            except asyncio.IncompleteReadError:
+                break  # 服务器关闭了连接
+            frame = bytearray(await reader.readexactly(int.from_bytes(header, 'big')))
+            await loop.run_in_executor(None, ctx.update_into, frame, frame)
+            frames += 1
+            total += len(frame)
+            if on_frame is not None:
+                on_frame(frames, frame)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return frames, total
+
+
+async def load_test(clients: int = 8, frames: int = 100, frame_size: int = FRAME_SIZE,
+                    fps: float = 0) -> dict:
+    """
+    本机回环压测：启动服务器，N个客户端并发接收
+
+    Args:
+        clients: 并发客户端数
+        frames: 每个客户端接收的帧数
+        frame_size: 每帧随机数据大小
+        fps: 每个会话的帧率，0表示不限速
+
+    Returns:
+        包含 clients、frames、bytes、errors、seconds、fps、mb_per_s 的字典
+    """
+    server = await start_server(HOST, 0, frames=frames, frame_size=frame_size, fps=fps)
+    port = server.sockets[0].getsockname()[1]
+    errors = 0
+
+    def check(i, frame):
+        nonlocal errors
+        if not frame.startswith(f"这是第 {i} 帧".encode('utf-8')):
+            errors += 1
+
+    async with server:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(receive_stream(HOST, port, on_frame=check)
+                                         for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    total_frames = sum(f for f, _ in results)
+    total_bytes = sum(b for _, b in results)
+    return {
+        'clients': clients,
+        'frames': total_frames,
+        'bytes': total_bytes,
+        'errors': errors,
+        'seconds': elapsed,
+        'fps': total_frames / elapsed,
+        'mb_per_s': total_bytes / (1024 * 1024) / elapsed,
+    }
+
+
+async def _run_server():
+    server = await start_server()
+    print(f"--- asyncio SM4-CTR加密服务器，监听 {HOST}:{PORT} ---")
+    async with server:
+        await server.serve_forever()
+
+
+async def _run_client():
+    def report(i, frame):
+        if i % 20 == 0:
+            print(f"[客户端] 成功解密第 {i} 帧 (大小: {len(frame)/1024:.1f} KB)")
+    frames, _ = await receive_stream(on_frame=report)
+    print(f"[客户端] 视频流结束。共成功接收并解密 {frames} 帧。")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ['server', 'client', 'bench']:
+        print("用法: python video_async_demo.py [server|client|bench [客户端数]]")
+        sys.exit(1)
+
+    if sys.argv[1] == 'server':
+        try:
+            asyncio.run(_run_server())
+        except KeyboardInterrupt:
+            pass
+    elif sys.argv[1] == 'client':
+        asyncio.run(_run_client())
+    else:
+        n = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+        r = asyncio.run(load_test(clients=n))
+        print(f"{r['clients']} 个客户端, 共 {r['frames']} 帧, 耗时 {r['seconds']:.2f} 秒")
+        print(f"总帧率: {r['fps']:.1f} 帧/秒, 总吞吐: {r['mb_per_s']:.2f} MB/s, 校验失败: {r['errors']}")
@@ -7,8 +7,13 @@ SM4-CTR 实时视频流加密最终演示
 
 演示了CTR模式在流式加密中的核心要点：
 -   服务器为每个会话生成一个【随机】的 IV (初始化向量)。
--   服务器【必须】先把这个IV无加密地发送给客户端。
--   客户端首先接收IV，然后双方使用相同的 密钥(Key) 和 IV 进行加解密。
+-   服务器【必须】把这个IV无加密地告诉客户端：每一帧的帧头里都带着IV
+    和本帧的计数器偏移（协议见 sm4_framing.py），双方使用相同的 密钥(Key) 和 IV 进行加解密。
+-   整个会话共用一个流式上下文，计数器在帧与帧之间持续递增，
+    保证每一帧使用不同的密钥流（同一密钥流加密两帧会泄露明文）。
+-   因为帧头带偏移，客户端丢帧或中途加入后，下一帧照样能解密。
+-   AUTHENTICATE = True 时发送 SM4-GCM 认证帧：帧头和密文被篡改时客户端会发现并丢弃该帧
+    （OpenSSL 支持 SM4-GCM 时很快，否则退回纯Python的GHASH，在树莓派上跟不上30帧/秒）。
 
 运行方式 (需要打开两个终端):
 1.  在第一个终端运行服务器: python video_encrypt_demo.py server
@@ -20,23 +25,32 @@ import time
 import os
 import sys
 from SM4_Encryptor import SM4Encryptor
+from sm4_framing import FrameSender, FrameReceiver, InvalidTag, ReplayedFrame
+from sm4_stats import CipherStats
+from sm4_container import SM4ContainerWriter
+from sm4_pipeline import PipelinedSender
 
 # --- 配置 ---
 # 密钥必须是16字节，且服务器和客户端必须完全一致
 SECRET_KEY = b'0123456789abcdef'
 HOST = '127.0.0.1'       # 本机IP地址。实际部署时，服务器端应设为树莓派的IP
 PORT = 12345             # 任意未被占用的端口号
+PREFETCH_SIZE = 256 * 1024  # 发送端密钥流预取池大小，内存紧张时调小，0表示关闭（仅CTR帧）
+AUTHENTICATE = False     # True: SM4-GCM认证帧（OpenSSL支持SM4-GCM时推荐）；False: 纯CTR帧（不防篡改，可用预取池）
+SHOW_STATS = True        # 每20帧打印一次加解密的帧率、吞吐和p99延迟
+PIPELINE_WORKERS = 2     # 采集/加密/发送流水线的加密线程数，0 表示逐帧加密发送（见 sm4_pipeline.py）
+FPS = 30                 # 目标帧率
+RECORD_PATH = None       # 设为文件名时服务器同时把视频录成加密容器文件（见 sm4_container.py）
+SCRATCH_SIZE = None      # 低内存模式的暂存区大小，如 64 * 1024（树莓派），None 表示关闭
 # ----------------
 
-def recv_all(sock, n):
-    """一个辅助函数，确保从socket中接收到n个字节的数据"""
-    data = bytearray()
-    while len(data) < n:
-        packet = sock.recv(n - len(data))
-        if not packet:
-            return None
-        data.extend(packet)
-    return data
+
+def format_stats(stats: CipherStats, op: str) -> str:
+    """一行实时统计：帧率、吞吐（按墙钟时间）和单帧加解密延迟"""
+    s = stats.summary(op)
+    return (f"{s['calls_per_s']:.1f} 帧/秒, {s['mb_per_s']:.2f} MB/s, "
+            f"延迟 p50 {s['p50_us']:.0f} µs / p99 {s['p99_us']:.0f} µs")
+
 
 def run_server():
     """
@@ -53,40 +67,71 @@ def run_server():
         with conn:
             print(f"[服务器] 客户端 {addr} 已连接。")
 
-            # 1. 【核心】生成随机IV并发送
-            # 每次连接都必须使用新的随机IV
+            # 1. 【核心】生成随机IV
+            # 每次连接都必须使用新的随机IV，它会随每一帧的帧头发给客户端
             iv = os.urandom(16)
             print(f"[服务器] 为本次会话生成随机IV: {iv.hex()}")
-            conn.sendall(iv)
-            print("[服务器] IV已发送至客户端。")
 
-            # 2. 初始化加密器
-            encryptor = SM4Encryptor(key=SECRET_KEY, iv=iv)
+            # 2. 初始化加密器：认证帧每帧一个GCM上下文；
+            #    逐帧发送的CTR帧整个会话使用同一个流式上下文，后台预取密钥流，加密一帧时只剩XOR
+            #    （流水线按帧偏移随机访问并行加密，用不上预取）
+            stats = CipherStats() if SHOW_STATS else None
+            prefetch = 0 if AUTHENTICATE or PIPELINE_WORKERS else PREFETCH_SIZE
+            sender = FrameSender(conn, SM4Encryptor(key=SECRET_KEY, iv=iv, stats=stats,
+                                                       scratch_size=SCRATCH_SIZE),
+                                 prefetch=prefetch, authenticate=AUTHENTICATE)
+
+            # 录像用单独的随机IV，IV和每帧位置都写在容器文件里
+            recorder = None
+            if RECORD_PATH:
+                recorder = SM4ContainerWriter(RECORD_PATH, SM4Encryptor(SECRET_KEY, os.urandom(16)))
+                print(f"[服务器] 录像写入 {RECORD_PATH}")
 
             print("[服务器] 开始模拟视频流并加密发送...")
 
-            # 模拟发送200帧视频数据
-            for i in range(1, 201):
+            def capture(i):
                 # 模拟一帧大小不一的视频数据
                 # 实际应用中，这里会是 camera.read() 得到的真实数据
-                frame_data = f"这是第 {i} 帧视频数据: ".encode('utf-8') + os.urandom(50 * 1024) # 约50KB
-
-                # 3. 加密数据帧
-                encrypted_frame = encryptor.encrypt(frame_data)
-
-                # 4. 发送数据帧 (使用简单的 长度-数据 协议)
-                #   a. 发送4字节的帧长度
-                frame_len_bytes = len(encrypted_frame).to_bytes(4, 'big')
-                conn.sendall(frame_len_bytes)
-                #   b. 发送加密后的帧数据
-                conn.sendall(encrypted_frame)
-
-                if i % 20 == 0:
-                    print(f"[服务器] 已加密并发送 {i}/200 帧...")
-
-                time.sleep(1/30) # 模拟30 FPS的帧率
-
+                frame_data = bytearray(f"这是第 {i} 帧视频数据: ".encode('utf-8') + os.urandom(50 * 1024)) # 约50KB
+                if recorder is not None:
+                    recorder.write_frame(frame_data)   # 发送会原地加密，所以先录
+                return frame_data
+
+            def progress(count):
+                if count % 20 == 0:
+                    print(f"[服务器] 已加密并发送 {count}/200 帧...")
+                    if stats is not None:
+                        print(f"    加密: {format_stats(stats, 'frame_encrypt')}")
+
+            try:
+                if PIPELINE_WORKERS:
+                    # 3. 流水线：采集按截止时间节拍进行，加密线程池并行加密，发送线程按序号顺序发出
+                    pipeline = PipelinedSender(sender, fps=FPS, workers=PIPELINE_WORKERS)
+                    report = pipeline.run(lambda: capture(pipeline.captured + 1), frames=200,
+                                          on_frame=lambda seq, latency: progress(pipeline.sent))
+                    q = report['queues']
+                    print(f"[服务器] 流水线: 发送 {report['sent']} 帧, 丢弃 {report['dropped']} 帧, "
+                          f"{report['fps']:.1f} 帧/秒, 端到端延迟 p50 {report['latency']['p50_us']:.0f} µs / "
+                          f"p99 {report['latency']['p99_us']:.0f} µs, 队列最大深度 加密 "
+                          f"{q['encrypt']['max_depth']}/{q['encrypt']['capacity']} 发送 "
+                          f"{q['send']['max_depth']}/{q['send']['capacity']}")
+                else:
+                    # 模拟发送200帧视频数据
+                    for i in range(1, 201):
+                        # 3. 原地加密并发送数据帧（帧头+密文一次 sendmsg 发出）
+                        sender.send(capture(i))
+                        progress(i)
+                        time.sleep(1/FPS) # 模拟30 FPS的帧率
+            finally:
+                # 发送出错时也要停掉预取线程、写完录像
+                sender.close()
+                if recorder is not None:
+                    recorder.close()
             print("[服务器] 视频流发送完毕。")
+            if prefetch:
+                m = sender.context.metrics()
+                print(f"[服务器] 密钥流预取: 命中 {m['hits']} 帧, 欠载 {m['underflows']} 帧 "
+                      f"(补算 {m['underflow_bytes'] / 1024:.1f} KB)")
 
 def run_client():
     """
@@ -100,42 +145,40 @@ def run_client():
             s.connect((HOST, PORT))
             print("[客户端] 已成功连接到服务器。")
 
-            # 1. 【核心】接收16字节的IV
-            iv = recv_all(s, 16)
-            if not iv:
-                print("[客户端] 错误：未能从服务器接收到IV。")
-                return
-            print(f"[客户端] 成功收到会话IV: {iv.hex()}")
-
-            # 2. 初始化解密器 (使用收到的IV)
-            decryptor = SM4Encryptor(key=SECRET_KEY, iv=iv)
+            # 1. 初始化接收器：帧头里带IV，接收缓冲区预先分配并复用
+            stats = CipherStats() if SHOW_STATS else None
+            receiver = FrameReceiver(s, SECRET_KEY, require_auth=AUTHENTICATE, stats=stats,
+                                     scratch_size=SCRATCH_SIZE)
 
             print("[客户端] 准备接收和解密视频流...")
 
             frame_count = 0
+            rejected = 0
             while True:
-                # 3. 接收数据帧
-                #   a. 接收4字节的长度信息
-                len_data = recv_all(s, 4)
-                if not len_data:
+                # 2. 接收并原地解密数据帧（认证帧先校验标签）
+                try:
+                    frame = receiver.recv()
+                except (InvalidTag, ReplayedFrame):
+                    rejected += 1   # 被篡改或重放的帧直接丢弃，继续收下一帧
+                    continue
+                if frame is None:
                     break # 服务器关闭了连接
-
-                frame_len = int.from_bytes(len_data, 'big')
-
-                #   b. 根据长度接收完整的加密帧数据
-                encrypted_frame = recv_all(s, frame_len)
-                if not encrypted_frame:
-                    break
-
-                # 4. 解密数据帧
-                decrypted_frame = decryptor.decrypt(encrypted_frame)
+                decrypted_frame = frame.payload
 
                 frame_count += 1
+                if frame_count == 1:
+                    print(f"[客户端] 会话IV: {receiver.iv.hex()}")
                 if frame_count % 20 == 0:
                     print(f"[客户端] 成功解密第 {frame_count} 帧 (大小: {len(decrypted_frame)/1024:.1f} KB)")
                     # 打印解密后内容的前50个字节以验证
-                    print(f"    内容预览: {decrypted_frame[:50]}...")
-
+                    print(f"    内容预览: {bytes(decrypted_frame[:50])}...")
+                    if stats is not None:
+                        print(f"    解密: {format_stats(stats, 'frame_decrypt')}")
+
+            if receiver.dropped:
+                print(f"[客户端] 检测到丢帧 {receiver.dropped} 帧。")
+            if rejected:
+                print(f"[客户端] 认证失败丢弃 {rejected} 帧。")
             print(f"\n[客户端] 视频流结束。共成功接收并解密 {frame_count} 帧。")
 
     except ConnectionRefusedError: